@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import numpy as np
+
+sys.path.insert(0, '..')
+
+# Training throughput of every model in the repo over a grid of batch sizes,
+# widths and BLAS thread counts. Each grid point runs in its own process so
+# the thread count is fixed before numpy/theano load and peak memory is
+# that of one model. Data is random with the shapes of the real sets.
+#
+#   python main.py --models sat_mlp:3 cnn --batch-sizes 32,128 --threads 1,4
+#
+# width is the first hidden layer for the MLPs and regressors, the dense
+# layer for the CNN and the hidden layer for the autoencoder.
+
+default_widths = {'sat_mlp': [10, 25, 50], 'housing': [30, 60], 'cnn': [100], 'dae': [900]}
+default_batch_sizes = {'sat_mlp': [4, 16, 64, 256], 'housing': [32, 128, 256],
+                       'cnn': [32, 128], 'dae': [32, 128]}
+default_models = ['sat_mlp:3', 'sat_mlp:4', 'sat_mlp:5', 'housing:3', 'housing:4', 'housing:5', 'cnn', 'dae']
+thread_vars = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+
+def init(rng, n_in, n_out):
+    bound = np.sqrt(6. / (n_in + n_out))
+    return rng.uniform(-bound, bound, (n_in, n_out))
+
+def sgd(cost, params, lr):
+    import theano.tensor as T
+    return [(p, p - lr*g) for p, g in zip(params, T.grad(cost, params))]
+
+# sigmoid hidden layers of width, 20, 20... as in project_1
+def mlp(x, rng, n_in, width, depth, n_out):
+    import theano.tensor as T
+    from nnutils import precision
+    params, h, n = [], x, n_in
+    for i in range(depth - 2):
+        m = width if i == 0 else 20
+        w, b = precision.shared(init(rng, n, m)), precision.shared(np.zeros(m))
+        h, n = T.nnet.sigmoid(T.dot(h, w) + b), m
+        params += [w, b]
+    w, b = precision.shared(init(rng, n, n_out)), precision.shared(np.zeros(n_out))
+    return T.dot(h, w) + b, params + [w, b]
+
+# (inputs, cost, params, input shapes) for one model; an int shape is an
+# int32 label vector with that many classes
+def build(model, depth, width, rng):
+    import theano
+    import theano.tensor as T
+    from nnutils import precision, losses
+    if model == 'sat_mlp':
+        x, d = T.matrix('x'), T.ivector('d')
+        out, params = mlp(x, rng, 36, width, depth, 6)
+        cost = T.mean(losses.softmax_cross_entropy(out, d))
+        return [x, d], cost, params, [(36,), 6]
+    if model == 'housing':
+        x, d = T.matrix('x'), T.matrix('d')
+        out, params = mlp(x, rng, 8, width, depth, 1)
+        cost = T.mean(T.sqr(d - out))
+        return [x, d], cost, params, [(8,), (1,)]
+    if model == 'cnn':
+        from theano.tensor.nnet import conv2d
+        from theano.tensor.signal import pool
+        x, d = T.tensor4('x'), T.ivector('d')
+        w1 = precision.shared(rng.uniform(-.1, .1, (15, 1, 9, 9)))
+        w2 = precision.shared(rng.uniform(-.1, .1, (20, 15, 5, 5)))
+        b1, b2 = precision.shared(np.zeros(15)), precision.shared(np.zeros(20))
+        w3, b3 = precision.shared(init(rng, 20*3*3, width)), precision.shared(np.zeros(width))
+        w4, b4 = precision.shared(init(rng, width, 10)), precision.shared(np.zeros(10))
+        o1 = pool.pool_2d(T.nnet.relu(conv2d(x, w1) + b1.dimshuffle('x', 0, 'x', 'x')), (2, 2), ignore_border=True)
+        o2 = pool.pool_2d(T.nnet.relu(conv2d(o1, w2) + b2.dimshuffle('x', 0, 'x', 'x')), (2, 2), ignore_border=True)
+        y3 = T.nnet.sigmoid(T.dot(T.flatten(o2, outdim=2), w3) + b3)
+        cost = T.mean(losses.softmax_cross_entropy(T.dot(y3, w4) + b4, d))
+        return [x, d], cost, [w1, b1, w2, b2, w3, b3, w4, b4], [(1, 28, 28), 10]
+    if model == 'dae':
+        from theano.sandbox.rng_mrg import MRG_RandomStreams
+        x = T.matrix('x')
+        theano_rng = MRG_RandomStreams(rng.randint(2 ** 30))
+        w = precision.shared(4*init(rng, 784, width))
+        b, b_prime = precision.shared(np.zeros(width)), precision.shared(np.zeros(784))
+        tilde_x = theano_rng.binomial(size=x.shape, n=1, p=0.9, dtype=theano.config.floatX)*x
+        y = T.nnet.sigmoid(T.dot(tilde_x, w) + b)
+        cost = T.mean(losses.sigmoid_cross_entropy(T.dot(y, w.T) + b_prime, x))
+        return [x], cost, [w, b, b_prime], [(784,)]
+    raise ValueError('unknown model %r' % (model,))
+
+def percentile(ms, q):
+    return float(np.percentile(ms, q)) if len(ms) else None
+
+# one grid point, run in the worker process
+def measure(config):
+    from nnutils import compiled
+    rng = np.random.RandomState(0)
+    inputs, cost, params, shapes = build(config['model'], config['depth'], config['width'], rng)
+    t = time.time()
+    train = compiled.function(inputs, cost, updates=sgd(cost, params, 0.01), mode=config['mode'], cache=False)
+    compile_s = time.time() - t
+
+    bs = config['batch_size']
+    data = [[rng.randint(0, shape, bs).astype(np.int32) if isinstance(shape, int)
+             else rng.rand(bs, *shape).astype(params[0].dtype) for shape in shapes]
+            for i in range(config['distinct_batches'])]
+
+    t = time.time()
+    train(*data[0])
+    first_ms = 1000*(time.time() - t)
+    warmup_ms = []
+    for i in range(config['warmup']):
+        t = time.time()
+        train(*data[i % len(data)])
+        warmup_ms.append(1000*(time.time() - t))
+    steady_ms = []
+    start = time.time()
+    for i in range(config['steps']):
+        t = time.time()
+        train(*data[i % len(data)])
+        steady_ms.append(1000*(time.time() - t))
+    total = time.time() - start
+
+    # ru_maxrss is in kilobytes on linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = rss / (1024.*1024.) if sys.platform == 'darwin' else rss / 1024.
+    return {'compile_s': compile_s,
+            'first_update_ms': first_ms,
+            'warmup_update_ms': float(np.mean(warmup_ms)) if warmup_ms else None,
+            'update_ms_median': percentile(steady_ms, 50),
+            'update_ms_p90': percentile(steady_ms, 90),
+            'update_ms_mean': float(np.mean(steady_ms)),
+            'samples_per_s': bs*config['steps'] / total,
+            'peak_rss_mb': peak_mb}
+
+def environment():
+    import theano
+    env = {'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+           'platform': platform.platform(),
+           'machine': platform.machine(),
+           'processor': platform.processor(),
+           'cpu_count': os.cpu_count(),
+           'python': platform.python_version(),
+           'numpy': np.__version__,
+           'theano': theano.__version__,
+           'floatX': theano.config.floatX,
+           'device': theano.config.device,
+           'blas_ldflags': theano.config.blas.ldflags,
+           'cxx': theano.config.cxx}
+    try:
+        env['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        env['commit'] = None
+    return env
+
+def run_worker(config):
+    env = dict(os.environ)
+    for var in thread_vars:
+        env[var] = str(config['threads'])
+    p = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', json.dumps(config)],
+                       env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if p.returncode != 0:
+        return {'error': p.stderr.strip().splitlines()[-1:] or ['exit status %d' % p.returncode]}
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+def ints(s):
+    return [int(v) for v in s.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+', default=default_models, help='name or name:depth')
+    parser.add_argument('--batch-sizes', type=ints, help='default depends on the model')
+    parser.add_argument('--widths', type=ints, help='default depends on the model')
+    parser.add_argument('--threads', type=ints, default=sorted(set([1, os.cpu_count() or 1])))
+    parser.add_argument('--mode', default='FAST_RUN')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--distinct-batches', type=int, default=8)
+    parser.add_argument('--out', default='results.json')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(json.loads(args.worker))))
+        return
+
+    results = []
+    for spec in args.models:
+        model, _, depth = spec.partition(':')
+        depth = int(depth) if depth else 3
+        for threads in args.threads:
+            for width in args.widths or default_widths[model]:
+                for bs in args.batch_sizes or default_batch_sizes[model]:
+                    config = {'model': model, 'depth': depth, 'width': width, 'batch_size': bs,
+                              'threads': threads, 'mode': args.mode, 'warmup': args.warmup,
+                              'steps': args.steps, 'distinct_batches': args.distinct_batches}
+                    result = run_worker(config)
+                    print(spec, 'threads', threads, 'width', width, 'batch', bs, result)
+                    results.append({'config': config, 'result': result})
+
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=1)
+    print('wrote', args.out)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import numpy as np
+
+# Iterating over a Minibatches object runs one epoch. Only a permutation
+# index is shuffled; each batch is gathered into buffers that are allocated
+# once and reused, so a batch is only valid until the next one is drawn.
+#
+# tail decides what happens to the last n % batch_size samples:
+#   'keep' yields a shorter batch, 'drop' skips it and 'pad' fills it up
+#   with samples from the start of the permutation.
+class Minibatches(object):
+
+    def __init__(self, arrays, batch_size, tail='keep', shuffle=True):
+        if tail not in ('keep', 'drop', 'pad'):
+            raise ValueError("tail must be 'keep', 'drop' or 'pad', got %r" % (tail,))
+        self.arrays = arrays
+        self.n = len(arrays[0])
+        for a in arrays:
+            if len(a) != self.n:
+                raise ValueError('arrays have different lengths')
+        self.batch_size = min(batch_size, self.n)
+        self.tail = tail
+        self.shuffle = shuffle
+        self.idx = np.arange(self.n)
+        self.buffers = [np.empty((self.batch_size,) + a.shape[1:], dtype=a.dtype) for a in arrays]
+
+    def __len__(self):
+        if self.tail == 'drop':
+            return self.n // self.batch_size
+        return -(-self.n // self.batch_size)
+
+    def __iter__(self):
+        if self.shuffle:
+            np.random.shuffle(self.idx)
+        bs = self.batch_size
+        for start in range(0, self.n, bs):
+            batch_idx = self.idx[start:start+bs]
+            if len(batch_idx) < bs:
+                if self.tail == 'drop':
+                    return
+                if self.tail == 'pad':
+                    batch_idx = np.concatenate((batch_idx, self.idx[:bs-len(batch_idx)]))
+            k = len(batch_idx)
+            # mode='clip' lets take() write straight into out without a temporary
+            yield [np.take(a, batch_idx, axis=0, out=buf[:k], mode='clip')
+                   for a, buf in zip(self.arrays, self.buffers)]
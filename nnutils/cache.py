@@ -0,0 +1,41 @@
+import os
+import glob
+import hashlib
+import numpy as np
+
+# cache entries are keyed on the source file, so editing or replacing it
+# invalidates every array derived from it
+def fingerprint(path):
+    st = os.stat(path)
+    key = '%s|%d|%d' % (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def cache_file(path, name, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.npycache')
+    return os.path.join(cache_dir, '%s.%s.%s.npy' % (os.path.basename(path), fingerprint(path), name))
+
+# return compute() for this source file, computing and saving it only once
+def cached(path, name, compute, cache_dir=None, mmap_mode='r'):
+    fn = cache_file(path, name, cache_dir)
+    if not os.path.exists(fn):
+        arr = np.ascontiguousarray(compute())
+        d = os.path.dirname(fn)
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        # drop entries left over from older versions of the source file; another
+        # process may have written fn meanwhile or removed the same stale entry
+        for stale in glob.glob(os.path.join(d, '%s.*.%s.npy' % (os.path.basename(path), name))):
+            if stale != fn:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+        tmp = '%s.%d.tmp' % (fn, os.getpid())
+        with open(tmp, 'wb') as fd:
+            np.save(fd, arr)
+        os.rename(tmp, fn)
+    return np.load(fn, mmap_mode=mmap_mode)
+
+def loadtxt(path, delimiter=None, cache_dir=None, mmap_mode='r'):
+    return cached(path, 'raw', lambda: np.loadtxt(path, delimiter=delimiter), cache_dir, mmap_mode)
@@ -0,0 +1,140 @@
+import os
+import json
+import shutil
+import threading
+import numpy as np
+
+# A checkpoint is a directory of .npy arrays plus manifest.json, which
+# records the epoch, the metric history, the numpy RNG state and the name,
+# shape and dtype of every array. Arrays are loaded memory-mapped, so
+# opening a checkpoint only reads the manifest.
+MANIFEST = 'manifest.json'
+VERSION = 1
+
+# Optimizer state lives in shared variables created inside sgd_momentum and
+# RMSprop (v, acc); they are the update targets that are not params.
+def slots(updates, params):
+    return [p for p, u in updates if not any(p is q for q in params)]
+
+def _to_json(o):
+    if hasattr(o, 'tolist'):
+        return o.tolist()
+    raise TypeError('%r is not JSON serializable' % (o,))
+
+# Copy everything a checkpoint needs out of the live variables. streams are
+# theano RandomStreams (MRG or shared), whose state is in shared variables.
+def snapshot(params, slots=(), streams=(), epoch=0, history=None, meta=None):
+    arrays = {}
+    for i, p in enumerate(params):
+        arrays['param%d' % i] = p.get_value()
+    for i, s in enumerate(slots):
+        arrays['slot%d' % i] = s.get_value()
+    for i, rng in enumerate(streams):
+        for j, (state, _) in enumerate(rng.state_updates):
+            arrays['stream%d_%d' % (i, j)] = state.get_value()
+    kind, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    arrays['np_random'] = keys
+    manifest = {
+        'version': VERSION,
+        'epoch': epoch,
+        'history': history or {},
+        'meta': meta or {},
+        'np_random': [kind, int(pos), int(has_gauss), float(cached_gaussian)],
+        'counts': {'params': len(params), 'slots': len(slots)},
+        'arrays': dict((name, {'file': name + '.npy', 'shape': list(a.shape), 'dtype': str(a.dtype)})
+                       for name, a in arrays.items()),
+    }
+    # serialize now, the history lists keep growing after the snapshot
+    return arrays, json.dumps(manifest, indent=1, default=_to_json)
+
+# Write into a temporary directory next to path and swap it in, so a crash
+# mid-write leaves the previous checkpoint intact.
+def write(path, snap):
+    arrays, manifest = snap
+    path = os.path.abspath(path)
+    tmp = '%s.tmp%d' % (path, os.getpid())
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    for name, a in arrays.items():
+        np.save(os.path.join(tmp, name + '.npy'), a)
+    with open(os.path.join(tmp, MANIFEST), 'w') as f:
+        f.write(manifest)
+    old = None
+    if os.path.exists(path):
+        old = '%s.old%d' % (path, os.getpid())
+        os.rename(path, old)
+    os.rename(tmp, path)
+    if old is not None:
+        shutil.rmtree(old)
+
+def save(path, params, slots=(), streams=(), epoch=0, history=None, meta=None):
+    write(path, snapshot(params, slots, streams, epoch, history, meta))
+
+def exists(path):
+    return os.path.exists(os.path.join(path, MANIFEST))
+
+# Saves in a background thread. The snapshot is taken in the caller, so
+# training can update the params right away; a save waits for the previous
+# one, and a failed write is raised by the next save, wait or close.
+class Writer(object):
+
+    def __init__(self):
+        self.thread = None
+        self.error = None
+
+    def _write(self, path, snap):
+        try:
+            write(path, snap)
+        except Exception as e:
+            self.error = e
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, path, params, slots=(), streams=(), epoch=0, history=None, meta=None):
+        snap = snapshot(params, slots, streams, epoch, history, meta)
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(path, snap))
+        self.thread.daemon = False
+        self.thread.start()
+
+    close = wait
+
+class Checkpoint(object):
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest['version'] != VERSION:
+            raise ValueError('%s: checkpoint version %r, expected %d' % (path, self.manifest['version'], VERSION))
+        self.epoch = self.manifest['epoch']
+        self.history = self.manifest['history']
+        self.meta = self.manifest['meta']
+        self.arrays = dict((name, np.load(os.path.join(path, entry['file']), mmap_mode=mmap_mode))
+                           for name, entry in self.manifest['arrays'].items())
+        counts = self.manifest['counts']
+        self.params = [self.arrays['param%d' % i] for i in range(counts['params'])]
+        self.slots = [self.arrays['slot%d' % i] for i in range(counts['slots'])]
+
+    # copy the stored values into live shared variables and the numpy RNG
+    def restore(self, params, slots=(), streams=()):
+        if len(params) != len(self.params) or len(slots) != len(self.slots):
+            raise ValueError('%s: has %d params and %d slots, got %d and %d'
+                             % (self.path, len(self.params), len(self.slots), len(params), len(slots)))
+        for p, v in zip(list(params) + list(slots), self.params + self.slots):
+            p.set_value(np.array(v, dtype=p.dtype))
+        for i, rng in enumerate(streams):
+            for j, (state, _) in enumerate(rng.state_updates):
+                state.set_value(np.array(self.arrays['stream%d_%d' % (i, j)]))
+        kind, pos, has_gauss, cached_gaussian = self.manifest['np_random']
+        np.random.set_state((kind, np.array(self.arrays['np_random']), pos, has_gauss, cached_gaussian))
+
+def load(path, mmap_mode='r'):
+    return Checkpoint(path, mmap_mode)
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import pickle
+import hashlib
+import warnings
+import theano
+from theano.compile.sharedvalue import SharedVariable
+from nnutils import precision
+
+# seconds spent building functions, reported apart from the training time
+compile_time = 0.
+
+# FAST_COMPILE skips most graph optimizations and runs the python
+# implementations, which only pays off when a function is called a few times
+def mode_for(calls, threshold=1000):
+    return 'FAST_COMPILE' if calls < threshold else 'FAST_RUN'
+
+def _roots(outputs, updates, givens):
+    roots = list(outputs) if isinstance(outputs, (list, tuple)) else [outputs]
+    roots += [u for p, u in (updates or [])]
+    roots += [g for v, g in (givens or [])]
+    return roots
+
+# the shared variables of a graph, in an order that only depends on its structure
+def shared_inputs(outputs, updates=None, givens=None):
+    found = []
+    for r in theano.gof.graph.inputs(_roots(outputs, updates, givens)):
+        if isinstance(r, SharedVariable) and r not in found:
+            found.append(r)
+    for p, u in (updates or []):
+        if p not in found:
+            found.append(p)
+    return found
+
+# position of each variable of the graph in a topological order, so a key
+# can tell which variable of the graph an input or update target is
+def _positions(outputs, updates, givens):
+    roots = _roots(outputs, updates, givens)
+    ins = theano.gof.graph.inputs(roots)
+    order = list(ins)
+    for node in theano.gof.graph.io_toposort(ins, roots):
+        order.extend(node.outputs)
+    order += [v for v in shared_inputs(outputs, updates, givens) if not any(v is o for o in order)]
+    return dict((id(v), i) for i, v in enumerate(order))
+
+def graph_key(inputs, outputs, updates=None, givens=None, mode=None, **kwargs):
+    h = hashlib.sha1()
+    h.update(theano.printing.debugprint(_roots(outputs, updates, givens), file='str').encode())
+    for v in list(inputs) + shared_inputs(outputs, updates, givens):
+        h.update(str(v.type).encode())
+        if isinstance(v, SharedVariable):
+            h.update(str(v.get_value(borrow=True).shape).encode())
+    # the printed graph shows unnamed inputs of one type alike, so swapping
+    # two inputs, update targets or givens would not change the key otherwise
+    positions = _positions(outputs, updates, givens)
+    h.update(repr([positions.get(id(v), -1) for v in inputs]).encode())
+    h.update(repr([positions[id(p)] for p, u in (updates or [])]).encode())
+    h.update(repr([positions.get(id(v), -1) for v, g in (givens or [])]).encode())
+    h.update(repr((mode, theano.__version__, theano.config.floatX, sorted(kwargs.items()))).encode())
+    return h.hexdigest()
+
+def cache_dir():
+    return os.path.join(theano.config.compiledir, 'nnutils_functions')
+
+# Drop-in for theano.function. Compiled functions are pickled under a key
+# built from the graph, the input and shared variable types and shapes and
+# the mode, and later runs unpickle them without re-optimizing the graph. The
+# unpickled function comes with its own copies of the shared variables, so
+# they are swapped back for the ones of the calling script.
+def function(inputs, outputs, updates=None, givens=None, mode=None, cache=True, **kwargs):
+    global compile_time
+    t = time.time()
+    fn = None
+    # a profiled function carries its own ProfileStats, it is never shared
+    if kwargs.get('profile'):
+        cache = False
+    if cache:
+        path = os.path.join(cache_dir(), graph_key(inputs, outputs, updates, givens, mode, **kwargs) + '.pkl')
+        live = shared_inputs(outputs, updates, givens)
+        if os.path.exists(path):
+            try:
+                reoptimize = theano.config.reoptimize_unpickled_function
+                theano.config.reoptimize_unpickled_function = False
+                try:
+                    with open(path, 'rb') as f:
+                        stored_fn, stored = pickle.load(f)
+                finally:
+                    theano.config.reoptimize_unpickled_function = reoptimize
+                fn = stored_fn.copy(swap=dict(zip(stored, live)))
+            except Exception as e:
+                warnings.warn('ignoring unreadable function cache %s: %s' % (path, e))
+                fn = None
+    if fn is None:
+        fn = theano.function(inputs, outputs, updates=updates, givens=givens, mode=mode, **kwargs)
+        if cache:
+            limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(max(limit, 50000))
+            try:
+                if not os.path.isdir(cache_dir()):
+                    os.makedirs(cache_dir())
+                tmp = '%s.%d.tmp' % (path, os.getpid())
+                with open(tmp, 'wb') as f:
+                    pickle.dump((fn, live), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.rename(tmp, path)
+            except Exception as e:
+                warnings.warn('could not cache compiled function: %s' % e)
+            finally:
+                sys.setrecursionlimit(limit)
+    compile_time += time.time() - t
+    if precision.debug:
+        precision.report(fn)
+    return fn
@@ -0,0 +1,48 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+# arrays shared with the workers, in the order they were passed to run()
+data = []
+_handles = []
+
+def job_seed(seed, *key):
+    return int(np.random.SeedSequence([seed] + list(key)).generate_state(1)[0])
+
+def _share(arr):
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def _attach(specs):
+    del data[:], _handles[:]
+    for name, shape, dtype in specs:
+        shm = shared_memory.SharedMemory(name=name)
+        _handles.append(shm)
+        data.append(np.ndarray(shape, dtype, buffer=shm.buf))
+
+# Calls job(*args) for every tuple in jobs on a pool of processes and
+# returns the results in the order of jobs. arrays are copied once into
+# shared memory and exposed read-only-by-convention as crossval.data.
+# Workers are forked, so they inherit the compiled theano functions and
+# shared variables of the script and train on their own copies of them.
+def run(job, jobs, arrays, processes=None):
+    shared = [_share(a) for a in arrays]
+    specs = [spec for shm, spec in shared]
+    try:
+        if processes == 1:
+            _attach(specs)
+            return [job(*args) for args in jobs]
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(processes, initializer=_attach, initargs=(specs,)) as pool:
+            return pool.starmap(job, jobs, chunksize=1)
+    finally:
+        if processes == 1:
+            del data[:]
+            for shm in _handles:
+                shm.close()
+            del _handles[:]
+        for shm, spec in shared:
+            shm.close()
+            shm.unlink()
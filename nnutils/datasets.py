@@ -0,0 +1,53 @@
+import numpy as np
+from nnutils import cache
+
+# min-max scaling per feature
+def scale(X):
+    X_max = np.max(X, axis=0)
+    X_min = np.min(X, axis=0)
+    return (X - X_min)/(X_max - X_min)
+
+# standard score over the whole matrix
+def scaleN(X):
+    return (X - np.mean(X))/np.std(X)
+
+# standard score per feature
+def normalize(X):
+    X_mean = np.mean(X, axis=0)
+    X_std = np.std(X, axis=0)
+    return (X - X_mean)/X_std
+
+scalers = {'scale': scale, 'scaleN': scaleN, 'normalize': normalize}
+
+# sat_train.txt / sat_test.txt: 36 features then the class 1..7 (6 is unused)
+def sat_labels(data):
+    labels = data[:, -1].astype(int)
+    labels[labels == 7] = 6
+    return labels - 1
+
+def sat_onehot(data, dtype=np.float32):
+    labels = sat_labels(data)
+    Y = np.zeros((labels.shape[0], 6), dtype=dtype)
+    Y[np.arange(labels.shape[0]), labels] = 1
+    return Y
+
+# the text files are parsed in float64, scaled, then stored in dtype; the
+# targets are one-hot rows, or int32 class numbers with onehot=False
+def sat(path, scaling=None, cache_dir=None, dtype=np.float32, onehot=True):
+    data = cache.loadtxt(path, ' ', cache_dir)
+    suffix = np.dtype(dtype).name
+    if scaling is None:
+        X = cache.cached(path, 'X-' + suffix, lambda: data[:, :36].astype(dtype), cache_dir)
+    else:
+        X = cache.cached(path, '%s-%s' % (scaling, suffix),
+                         lambda: scalers[scaling](data[:, :36]).astype(dtype), cache_dir)
+    if onehot:
+        Y = cache.cached(path, 'onehot-' + suffix, lambda: sat_onehot(data, dtype), cache_dir)
+    else:
+        Y = cache.cached(path, 'labels', lambda: sat_labels(data).astype(np.int32), cache_dir)
+    return X, Y
+
+# cal_housing.data: 8 features then the median house value
+def cal_housing(path, cache_dir=None, dtype=np.float32):
+    data = cache.loadtxt(path, ',', cache_dir)
+    return data[:, :8].astype(dtype), data[:, -1].astype(dtype)
@@ -0,0 +1,103 @@
+import numpy as np
+
+# Stops a training loop once the monitored value has not improved by more
+# than min_delta for patience epochs, and keeps a copy of the theano shared
+# params from the best epoch so they can be restored afterwards.
+class EarlyStopping(object):
+
+    def __init__(self, params, patience=50, min_delta=0., mode='min'):
+        if mode not in ('min', 'max'):
+            raise ValueError("mode must be 'min' or 'max', got %r" % (mode,))
+        self.params = params
+        self.patience = patience
+        self.min_delta = min_delta
+        self.sign = 1. if mode == 'min' else -1.
+        self.reset()
+
+    def reset(self):
+        self.best = None
+        self.best_epoch = None
+        self.best_values = None
+        self.wait = 0
+        self.stopped = False
+        # number of epochs run so far, the stop epoch once stopped
+        self.stop_epoch = 0
+
+    # call once per epoch, returns True when the loop should stop
+    def step(self, epoch, value):
+        self.stop_epoch = epoch + 1
+        if self.best is None or self.sign*(self.best - value) > self.min_delta:
+            self.best = value
+            self.best_epoch = epoch
+            self.best_values = [p.get_value() for p in self.params]
+            self.wait = 0
+        else:
+            self.wait += 1
+            if self.wait >= self.patience:
+                self.stopped = True
+        return self.stopped
+
+    def restore(self):
+        if self.best_values is not None:
+            for p, v in zip(self.params, self.best_values):
+                p.set_value(v)
+
+# EarlyStopping for M models stacked on the leading axis of every param
+# (see stacked.shared_stack): step takes the (M,) vector of monitored
+# values and each model stops on its own. stopped is the per-model stop
+# mask, e.g. to zero the learning rates of the stopped models so that the
+# stacked train call no longer moves them; step returns True once all
+# models have stopped.
+class StackedEarlyStopping(object):
+
+    def __init__(self, params, models, patience=50, min_delta=0., mode='min'):
+        if mode not in ('min', 'max'):
+            raise ValueError("mode must be 'min' or 'max', got %r" % (mode,))
+        self.params = params
+        self.models = models
+        self.patience = patience
+        self.min_delta = min_delta
+        self.sign = 1. if mode == 'min' else -1.
+        self.reset()
+
+    def reset(self):
+        self.best = np.full(self.models, np.nan)
+        self.best_epoch = np.full(self.models, -1)
+        self.best_values = [p.get_value() for p in self.params]
+        self.wait = np.zeros(self.models, dtype=int)
+        self.stopped = np.zeros(self.models, dtype=bool)
+        self.stop_epoch = np.zeros(self.models, dtype=int)
+
+    def step(self, epoch, values):
+        values = np.asarray(values, dtype=float)
+        active = ~self.stopped
+        self.stop_epoch[active] = epoch + 1
+        improved = active & (np.isnan(self.best) | (self.sign*(self.best - values) > self.min_delta))
+        if improved.any():
+            for best, p in zip(self.best_values, self.params):
+                best[improved] = p.get_value()[improved]
+            self.best[improved] = values[improved]
+            self.best_epoch[improved] = epoch
+        self.wait[improved] = 0
+        self.wait[active & ~improved] += 1
+        self.stopped |= self.wait >= self.patience
+        return bool(self.stopped.all())
+
+    def restore(self):
+        for p, v in zip(self.params, self.best_values):
+            p.set_value(v)
+
+# training and validation rows of a training set of n samples, with a
+# random fraction of it held out to stop on instead of the test set
+def holdout(n, fraction=0.2, seed=0):
+    if not 0 < fraction < 1:
+        raise ValueError('fraction must be between 0 and 1, got %r' % (fraction,))
+    rows = np.random.RandomState(seed).permutation(n)
+    k = int(round(n*fraction))
+    return np.sort(rows[k:]), np.sort(rows[:k])
+
+# extend a curve cut short by early stopping with its last value, so that
+# runs of different lengths can still be averaged epoch by epoch
+def fill(curve, epochs):
+    curve = np.asarray(curve)
+    return np.append(curve, np.repeat(curve[-1:], epochs - len(curve), axis=0), axis=0)
@@ -0,0 +1,100 @@
+import math
+import numpy as np
+
+# n indices drawn from every class in proportion to its frequency,
+# labels are class numbers or one-hot rows
+def stratified_subsample(labels, n, seed=0):
+    labels = np.asarray(labels)
+    if labels.ndim == 2:
+        labels = np.argmax(labels, axis=1)
+    rng = np.random.RandomState(seed)
+    n = min(n, len(labels))
+    idx = []
+    for c in np.unique(labels):
+        members = np.flatnonzero(labels == c)
+        k = int(round(n * len(members) / float(len(labels))))
+        idx.append(rng.choice(members, min(k, len(members)), replace=False))
+    return np.sort(np.concatenate(idx))
+
+# mean of per-sample scores and its normal-approximation confidence interval
+def mean_ci(scores, z=1.96):
+    scores = np.asarray(scores, dtype=float)
+    mean = np.mean(scores)
+    half = z * np.std(scores) / np.sqrt(len(scores))
+    return mean, mean - half, mean + half
+
+# Decides when and on what a training loop evaluates.
+#
+# evaluate(rows) returns one score per sample of test set[rows], e.g. a
+# boolean "correct" vector; rows is an index array or slice(None).
+# step(epoch) evaluates every `every` epochs and on the last one, either on
+# the full set or, when subsample is given, on those fixed rows with a
+# confidence interval. With full_on_improve a full pass is also run each
+# time the subsample estimate improves and on the last epoch. curve() and band() interpolate the
+# evaluated epochs and their intervals so learning-curve plots still get
+# one value per epoch, and report() prints the final estimate with its
+# interval and the best full-pass value.
+class Evaluator(object):
+
+    def __init__(self, evaluate, epochs, every=1, subsample=None, full_on_improve=False,
+                 mode='max', z=1.96):
+        self.evaluate = evaluate
+        self.epochs = epochs
+        self.every = every
+        self.subsample = subsample
+        self.full_on_improve = full_on_improve and subsample is not None
+        self.sign = 1. if mode == 'max' else -1.
+        self.z = z
+        self.reset()
+
+    def reset(self):
+        self.evaluated = []
+        self.values = []
+        self.intervals = []
+        self.full = {}
+        self.best = None
+
+    def due(self, epoch):
+        return (epoch + 1) % self.every == 0 or epoch == self.epochs - 1
+
+    # returns the new estimate, or None when this epoch is not evaluated
+    def step(self, epoch):
+        if not self.due(epoch):
+            return None
+        rows = self.subsample if self.subsample is not None else slice(None)
+        value, lo, hi = mean_ci(self.evaluate(rows), self.z)
+        self.evaluated.append(epoch)
+        self.values.append(value)
+        self.intervals.append((lo, hi))
+        improved = self.best is None or self.sign*(value - self.best) > 0
+        if improved:
+            self.best = value
+        if self.full_on_improve and (improved or epoch == self.epochs - 1):
+            self.full[epoch] = np.mean(self.evaluate(slice(None)))
+        return value
+
+    def curve(self):
+        return np.interp(np.arange(self.epochs), self.evaluated, self.values)
+
+    # (lo, hi) curves of the confidence interval, e.g. for plt.fill_between
+    def band(self):
+        lo, hi = zip(*self.intervals)
+        epochs = np.arange(self.epochs)
+        return np.interp(epochs, self.evaluated, lo), np.interp(epochs, self.evaluated, hi)
+
+    def report(self, name):
+        if not self.evaluated:
+            return
+        lo, hi = self.intervals[-1]
+        n = 'all' if self.subsample is None else '%d' % len(self.subsample)
+        print('%s: %.4f after epoch %d on %s test samples, %d%% CI %.4f - %.4f'
+              % (name, self.values[-1], self.evaluated[-1] + 1, n, round(100*_coverage(self.z)), lo, hi))
+        if self.full:
+            best = max(self.full, key=lambda e: self.sign*self.full[e])
+            last = max(self.full)
+            print('  full test set: %.4f after epoch %d, best %.4f after epoch %d'
+                  % (self.full[last], last + 1, self.full[best], best + 1))
+
+# two-sided coverage of +-z standard errors
+def _coverage(z):
+    return math.erf(z / math.sqrt(2))
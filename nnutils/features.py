@@ -0,0 +1,33 @@
+import os
+import tempfile
+import numpy as np
+
+# feature stores for greedy layer-wise pretraining: the frozen lower layers
+# are run once over the training set and the next layer trains on the result
+
+def store_path(name, store_dir=None):
+    if store_dir is None:
+        store_dir = tempfile.gettempdir()
+    fd, path = tempfile.mkstemp(prefix=name + '.', suffix='.npy', dir=store_dir)
+    os.close(fd)
+    return path
+
+# run encode over X in chunks into a float32 .npy file, returned memory-mapped
+def encode_to_store(encode, X, name='features', store_dir=None, chunk=1000, dtype=np.float32):
+    if len(X) == 0:
+        raise ValueError('no rows to encode')
+    first = np.asarray(encode(X[:chunk]))
+    path = store_path(name, store_dir)
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                    shape=(len(X),) + first.shape[1:])
+    out[:len(first)] = first
+    for start in range(chunk, len(X), chunk):
+        out[start:start+chunk] = encode(X[start:start+chunk])
+    out.flush()
+    del out
+    return np.load(path, mmap_mode='r')
+
+# drop the file behind a store returned by encode_to_store
+def release(store):
+    if os.path.exists(store.filename):
+        os.remove(store.filename)
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+import numpy as np
+import theano
+import theano.tensor as T
+
+# Many SGD steps in one call of a compiled function. A scan loops over K
+# minibatches and applies the updates after each of them, as K separate
+# train calls would, and the costs are summed in the graph, so python and
+# theano call overhead is paid once per K updates instead of once per update.
+
+# one scan step for inputs replaced by what replace(step_input) gives
+def _scan(step_inputs, replace, cost, updates):
+    params = [p for p, u in updates]
+
+    def step(*args):
+        rows, total = args[:-1], args[-1]
+        outputs = theano.clone([cost] + [u for p, u in updates], replace=replace(*rows))
+        return total + outputs[0], OrderedDict(zip(params, outputs[1:]))
+
+    total = T.as_tensor_variable(np.asarray(0., dtype=cost.dtype))
+    totals, scan_updates = theano.scan(step, sequences=step_inputs, outputs_info=[total])
+    return totals[-1], scan_updates
+
+# f(*stacked) with every input stacked on a new leading axis, x of shape
+# (K, batch_size, n) for K minibatches; returns the summed cost
+def function(inputs, cost, updates, **kwargs):
+    stacked = [T.TensorType(v.dtype, (False,) + v.broadcastable)(v.name) for v in inputs]
+    total, scan_updates = _scan(stacked, lambda *batch: dict(zip(inputs, batch)), cost, updates)
+    return theano.function(stacked, total, updates=scan_updates, **kwargs)
+
+# f(idx) for data held in shared variables (see resident.to_shared), with
+# idx an int32 matrix of K rows of sample indices, e.g. batch_rows(perm, b)
+def index_function(inputs, data, cost, updates, **kwargs):
+    idx = T.imatrix('idx')
+    total, scan_updates = _scan([idx], lambda rows: dict((v, d[rows]) for v, d in zip(inputs, data)),
+                                cost, updates)
+    return theano.function([idx], total, updates=scan_updates, **kwargs)
+
+# the minibatches of zip(range(0, n, b), range(b, n, b)) in the scripts,
+# which leave out the last one, as a (K, batch_size) matrix
+def batch_rows(perm, batch_size):
+    k = max(len(perm) - 1, 0) // batch_size
+    return np.asarray(perm[:k*batch_size], dtype=np.int32).reshape(k, batch_size)
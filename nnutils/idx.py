@@ -0,0 +1,67 @@
+import os
+import numpy as np
+
+# IDX type codes, payload is stored big-endian
+idx_dtypes = {0x08: np.uint8, 0x09: np.int8, 0x0B: '>i2',
+              0x0C: '>i4', 0x0D: '>f4', 0x0E: '>f8'}
+
+def read_header(path):
+    with open(path, 'rb') as fd:
+        magic = bytearray(fd.read(4))
+        if len(magic) != 4 or magic[0] != 0 or magic[1] != 0 or magic[2] not in idx_dtypes:
+            raise ValueError('%s: bad IDX magic number' % path)
+        ndim = magic[3]
+        dims = bytearray(fd.read(4*ndim))
+    if len(dims) != 4*ndim:
+        raise ValueError('%s: truncated IDX header' % path)
+    shape = tuple(int(d) for d in np.frombuffer(bytes(dims), dtype='>i4'))
+    dtype = np.dtype(idx_dtypes[magic[2]])
+    offset = 4 + 4*ndim
+    if os.path.getsize(path) < offset + int(np.prod(shape))*dtype.itemsize:
+        raise ValueError('%s: payload shorter than header %s' % (path, shape))
+    return dtype, shape, offset
+
+# memory-map the payload, nothing is read until it is indexed
+def open_idx(path):
+    dtype, shape, offset = read_header(path)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+# copy only the first n rows, in the requested dtype
+def load_idx(path, n=None, dtype=None, scale=None, flatten=False):
+    data = open_idx(path)
+    if n is not None:
+        if n > data.shape[0]:
+            raise ValueError('%s: asked for %d rows, file has %d' % (path, n, data.shape[0]))
+        data = data[:n]
+    if flatten:
+        data = data.reshape((data.shape[0], -1))
+    out = np.array(data, dtype=dtype if dtype is not None else data.dtype.newbyteorder('='))
+    if scale is not None:
+        out /= scale
+    return out
+
+def one_hot(x, n, dtype=float):
+    if type(x) == list:
+        x = np.array(x)
+    x = x.flatten()
+    o_h = np.zeros((len(x),n), dtype=dtype)
+    o_h[np.arange(len(x)),x] = 1
+    return o_h
+
+def mnist(datasets_dir, ntrain=None, ntest=None, onehot=True, dtype=np.float32):
+    data_dir = os.path.join(datasets_dir, 'mnist/')
+
+    trX = load_idx(os.path.join(data_dir, 'train-images.idx3-ubyte'), ntrain, dtype, 255., flatten=True)
+    trY = load_idx(os.path.join(data_dir, 'train-labels.idx1-ubyte'), ntrain, np.int32)
+    teX = load_idx(os.path.join(data_dir, 't10k-images.idx3-ubyte'), ntest, dtype, 255., flatten=True)
+    teY = load_idx(os.path.join(data_dir, 't10k-labels.idx1-ubyte'), ntest, np.int32)
+
+    if len(trX) != len(trY) or len(teX) != len(teY):
+        raise ValueError('%s: image and label counts differ' % data_dir)
+
+    # without onehot the labels are int32 class numbers, as T.ivector takes them
+    if onehot:
+        trY = one_hot(trY, 10, dtype)
+        teY = one_hot(teY, 10, dtype)
+
+    return trX,teX,trY,teY
@@ -0,0 +1,175 @@
+import os
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from nnutils import checkpoint
+
+# Forward passes of the trained models in plain numpy, so scoring does not
+# import theano or compile anything. Inputs are scored in chunks and every
+# intermediate result lives in a Workspace that is allocated on the first
+# chunk and reused afterwards.
+
+def save(path, arrays):
+    np.savez(path, *arrays)
+
+# the arrays written by save, in order, or the memory-mapped params of a
+# checkpoint directory
+def load(path):
+    if os.path.isdir(path):
+        return checkpoint.load(path).params
+    with np.load(path) as f:
+        return [f['arr_%d' % i] for i in range(len(f.files))]
+
+# named scratch buffers that only grow, views are handed out per chunk
+class Workspace(object):
+
+    def __init__(self, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.buffers = {}
+
+    def get(self, name, shape):
+        size = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = self.buffers[name] = np.empty(size, dtype=self.dtype)
+        return buf[:size].reshape(shape)
+
+# in place; exp overflowing to inf still gives the right limit of 0
+def sigmoid_(a):
+    np.negative(a, out=a)
+    with np.errstate(over='ignore'):
+        np.exp(a, out=a)
+    a += 1
+    np.reciprocal(a, out=a)
+    return a
+
+def softmax_(a):
+    a -= a.max(axis=1, keepdims=True)
+    np.exp(a, out=a)
+    a /= a.sum(axis=1, keepdims=True)
+    return a
+
+# sigmoid hidden layers and a softmax output: the sat MLPs of project_1
+# and the stacked autoencoder encoder + softmax of project_2 part_b
+class MLP(object):
+
+    def __init__(self, weights, biases, dtype=np.float32):
+        if len(weights) != len(biases):
+            raise ValueError('%d weight matrices but %d biases' % (len(weights), len(biases)))
+        self.weights = [np.ascontiguousarray(w, dtype=dtype) for w in weights]
+        self.biases = [np.asarray(b, dtype=dtype) for b in biases]
+        self.n_in = self.weights[0].shape[0]
+        self.n_out = self.weights[-1].shape[1]
+        self.ws = Workspace(dtype)
+
+    # rows of x must already be in self.ws dtype, the result is a workspace view
+    def forward(self, x):
+        h = x
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            out = self.ws.get('h%d' % i, (len(h), w.shape[1]))
+            np.dot(h, w, out=out)
+            out += b
+            h = softmax_(out) if i == last else sigmoid_(out)
+        return h
+
+    def _input(self, X):
+        X = X.reshape((len(X), -1))
+        if X.shape[1] != self.n_in:
+            raise ValueError('expected %d input features, got %d' % (self.n_in, X.shape[1]))
+        if X.dtype == self.ws.dtype and X.flags.c_contiguous:
+            return X
+        x = self.ws.get('x', X.shape)
+        x[...] = X
+        return x
+
+    def predict_proba(self, X, chunk=1024, out=None):
+        if out is None:
+            out = np.empty((len(X), self.n_out), dtype=self.ws.dtype)
+        for start in range(0, len(X), chunk):
+            out[start:start+chunk] = self.forward(self._input(X[start:start+chunk]))
+        return out
+
+    def predict(self, X, chunk=1024):
+        out = np.empty(len(X), dtype=np.int64)
+        for start in range(0, len(X), chunk):
+            out[start:start+chunk] = np.argmax(self.forward(self._input(X[start:start+chunk])), axis=1)
+        return out
+
+# conv2d + relu + max-pool blocks followed by an MLP, as model() in
+# project_2/src/part_a. theano's conv2d flips the filters and works on
+# NCHW; here images are NHWC so each convolution is one matrix product
+# over the (kh, kw, C) patches, and the first dense layer is reordered to
+# match theano's flattening of the NCHW maps.
+class ConvNet(object):
+
+    def __init__(self, convs, weights, biases, image_shape=(1, 28, 28), pool=(2, 2), dtype=np.float32):
+        self.pool = pool
+        self.image_shape = image_shape
+        self.ws = Workspace(dtype)
+        self.convs = []
+        c, h, w = image_shape
+        for W, b in convs:
+            W = np.asarray(W)
+            F, C, kh, kw = W.shape
+            if C != c:
+                raise ValueError('filter expects %d channels, input has %d' % (C, c))
+            W = W[:, :, ::-1, ::-1].transpose(2, 3, 1, 0).reshape(kh*kw*C, F)
+            self.convs.append((np.ascontiguousarray(W, dtype=dtype), np.asarray(b, dtype=dtype), kh, kw))
+            c, h, w = F, (h - kh + 1) // pool[0], (w - kw + 1) // pool[1]
+        W = np.asarray(weights[0])
+        if W.shape[0] != c*h*w:
+            raise ValueError('first dense layer has %d inputs, conv output is %d' % (W.shape[0], c*h*w))
+        W = W.reshape(c, h, w, -1).transpose(1, 2, 0, 3).reshape(c*h*w, -1)
+        self.mlp = MLP([W] + list(weights[1:]), biases, dtype)
+        self.mlp.ws = self.ws
+        self.n_out = self.mlp.n_out
+
+    def forward(self, x):
+        ph, pw = self.pool
+        for i, (W, b, kh, kw) in enumerate(self.convs):
+            k, h, w, c = x.shape
+            oh, ow = h - kh + 1, w - kw + 1
+            s = x.strides
+            patches = as_strided(x, (k, oh, ow, kh, kw, c), (s[0], s[1], s[2], s[1], s[2], s[3]))
+            cols = self.ws.get('cols%d' % i, (k, oh, ow, kh, kw, c))
+            cols[...] = patches
+            y = self.ws.get('conv%d' % i, (k, oh, ow, W.shape[1]))
+            np.dot(cols.reshape(k*oh*ow, -1), W, out=y.reshape(k*oh*ow, -1))
+            y += b
+            np.maximum(y, 0, out=y)
+            y = y[:, :oh - oh % ph, :ow - ow % pw]
+            x = self.ws.get('pool%d' % i, (k, oh // ph, ow // pw, W.shape[1]))
+            np.max(y.reshape(k, oh // ph, ph, ow // pw, pw, -1), axis=(2, 4), out=x)
+        return self.mlp.forward(x.reshape(len(x), -1))
+
+    # NCHW or flattened images in, NHWC workspace view out
+    def _input(self, X):
+        c, h, w = self.image_shape
+        X = X.reshape((len(X), c, h, w))
+        x = self.ws.get('x', (len(X), h, w, c))
+        x[...] = X.transpose(0, 2, 3, 1)
+        return x
+
+    def predict_proba(self, X, chunk=256, out=None):
+        if out is None:
+            out = np.empty((len(X), self.n_out), dtype=self.ws.dtype)
+        for start in range(0, len(X), chunk):
+            out[start:start+chunk] = self.forward(self._input(X[start:start+chunk]))
+        return out
+
+    def predict(self, X, chunk=256):
+        out = np.empty(len(X), dtype=np.int64)
+        for start in range(0, len(X), chunk):
+            out[start:start+chunk] = np.argmax(self.forward(self._input(X[start:start+chunk])), axis=1)
+        return out
+
+# models from a file of [w1, b1, w2, b2, ...] as saved by the training scripts
+def load_mlp(path, dtype=np.float32):
+    arrays = load(path)
+    return MLP(arrays[0::2], arrays[1::2], dtype)
+
+def load_convnet(path, n_convs=2, dtype=np.float32, **kwargs):
+    arrays = load(path)
+    convs = list(zip(arrays[0:2*n_convs:2], arrays[1:2*n_convs:2]))
+    dense = arrays[2*n_convs:]
+    return ConvNet(convs, dense[0::2], dense[1::2], dtype=dtype, **kwargs)
@@ -0,0 +1,40 @@
+import numpy as np
+import theano.tensor as T
+
+# Losses computed from the pre-activations (logits) of the output layer
+# instead of from softmax or sigmoid probabilities. The forms below never
+# take the log of a probability, so they stay finite for saturated units
+# and need no epsilon, and the graph has no full-size probability matrix
+# and log pass between the last dot and the cost.
+
+def log_softmax(logits):
+    shifted = logits - T.max(logits, axis=1, keepdims=True)
+    return shifted - T.log(T.sum(T.exp(shifted), axis=1, keepdims=True))
+
+# per-row cross-entropy of softmax(logits) against int class labels (ivector)
+# or one-hot / probability rows
+def softmax_cross_entropy(logits, targets):
+    logp = log_softmax(logits)
+    if targets.ndim == 1:
+        return -logp[T.arange(targets.shape[0]), targets]
+    return -T.sum(targets * logp, axis=1)
+
+# per-row binary cross-entropy of sigmoid(logits) against targets in [0, 1]:
+# -x*log(sigmoid(a)) - (1-x)*log(1-sigmoid(a)) = softplus(a) - x*a
+def sigmoid_cross_entropy(logits, targets):
+    return T.sum(T.nnet.softplus(logits) - targets * logits, axis=1)
+
+# log(mean(exp(a), axis)) without overflow
+def log_mean_exp(a, axis=0):
+    m = T.max(a, axis=axis)
+    return m + T.log(T.mean(T.exp(a - T.shape_padaxis(m, axis)), axis=axis))
+
+# Sparsity penalty sum_j KL(rho || rho_j) of sigmoid units, rho_j the mean
+# activation of unit j over the batch. log(rho_j) and log(1 - rho_j) are
+# taken from the logits (log sigmoid(a) = -softplus(-a)), so a unit that
+# is never or always on gives a large finite penalty instead of log(0).
+def kl_sparsity(logits, rho):
+    log_on = log_mean_exp(-T.nnet.softplus(-logits), axis=0)
+    log_off = log_mean_exp(-T.nnet.softplus(logits), axis=0)
+    entropy = rho*np.log(rho) + (1 - rho)*np.log(1 - rho)
+    return T.sum(entropy - rho*log_on - (1 - rho)*log_off)
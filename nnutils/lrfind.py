@@ -0,0 +1,83 @@
+import numpy as np
+
+# Learning-rate range test: one short training pass in which the learning
+# rate, a shared variable the update rule reads, grows geometrically from
+# lo to hi with every batch. The smoothed loss falls while the rate is
+# useful and blows up once it is too large; a good rate lies on the
+# steepest part of the descent, well below the one with the lowest loss.
+
+class RangeTest(object):
+
+    def __init__(self, lrs, losses, smoothed, diverged):
+        self.lrs = np.asarray(lrs)
+        self.losses = np.asarray(losses)
+        self.smoothed = np.asarray(smoothed)
+        self.diverged = diverged
+
+    # rate with the steepest descent of the smoothed loss over log(lr), and
+    # the range between it and a tenth of the rate with the lowest loss;
+    # points with a loss that is not finite are left out
+    def suggest(self, skip=5):
+        finite = np.isfinite(self.smoothed)
+        lrs, smoothed = self.lrs[finite][skip:], self.smoothed[finite][skip:]
+        if len(lrs) < 3:
+            raise ValueError('range test stopped after %d steps, too few to suggest a rate' % len(self.lrs))
+        slope = np.gradient(smoothed, np.log(lrs))
+        steepest = lrs[np.argmin(slope)]
+        lowest = lrs[np.argmin(smoothed)]
+        low, high = sorted([steepest, lowest / 10])
+        return steepest, (low, high)
+
+    def report(self):
+        lr, (low, high) = self.suggest()
+        finite = np.isfinite(self.smoothed)
+        lowest = np.argmin(np.where(finite, self.smoothed, np.inf))
+        print('lr range test: %d steps from %.2g to %.2g%s' % (len(self.lrs), self.lrs[0], self.lrs[-1],
+                                                               ', stopped on divergence' if self.diverged else ''))
+        print('  lowest loss %.4g at lr %.2g, suggested lr %.2g, range %.2g - %.2g'
+              % (self.smoothed[lowest], self.lrs[lowest], lr, low, high))
+
+# batches again and again, for an iterable that can be iterated more than once
+def _repeat(batches):
+    while True:
+        empty = True
+        for batch in batches:
+            empty = False
+            yield batch
+        if empty:
+            return
+
+# train(*batch) runs one update with the rate in lr and returns the loss;
+# batches is an iterable of argument tuples and is cycled for steps batches.
+# params and slots (optimizer state such as momentum velocities) are put
+# back afterwards, as is lr, so training can start from scratch after it.
+# The loss is an exponential moving average with bias correction, and the
+# test stops once it is diverge times the lowest value seen or not finite;
+# the step that diverged is not recorded.
+def range_test(train, lr, batches, params, slots=(), lo=1e-7, hi=1., steps=100, beta=0.98, diverge=4.):
+    if not 0 < lo < hi:
+        raise ValueError('need 0 < lo < hi, got %r and %r' % (lo, hi))
+    saved = [p.get_value() for p in list(params) + list(slots)]
+    saved_lr = lr.get_value()
+    factor = (hi / lo) ** (1. / max(steps - 1, 1))
+    lrs, losses, smoothed = [], [], []
+    avg, best, diverged = 0., np.inf, False
+    try:
+        for i, batch in zip(range(steps), _repeat(batches)):
+            rate = lo * factor**i
+            lr.set_value(np.asarray(rate, dtype=lr.dtype))
+            loss = float(train(*batch))
+            avg = beta*avg + (1 - beta)*loss
+            value = avg / (1 - beta**(i + 1))
+            if not np.isfinite(value) or value > diverge*best:
+                diverged = True
+                break
+            lrs.append(rate)
+            losses.append(loss)
+            smoothed.append(value)
+            best = min(best, value)
+    finally:
+        for p, v in zip(list(params) + list(slots), saved):
+            p.set_value(v)
+        lr.set_value(saved_lr)
+    return RangeTest(lrs, losses, smoothed, diverged)
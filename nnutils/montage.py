@@ -0,0 +1,63 @@
+import zlib
+import struct
+import numpy as np
+
+# Packs N weight vectors, feature maps or images into one 2D array, so a
+# grid of them is drawn with a single imshow (or written straight to PNG)
+# instead of one subplot per tile.
+
+# images is (N, h, w), or (N, h*w) with shape=(h, w). Each tile is scaled
+# to [0, 1] on its own with scale='tile', which is what one imshow per
+# subplot did, or together with scale='global'; scale=None keeps values.
+def tile(images, shape=None, grid=None, pad=1, scale='tile', pad_value=0.):
+    images = np.asarray(images, dtype=np.float32)
+    if shape is not None:
+        images = images.reshape((len(images),) + tuple(shape))
+    if images.ndim != 3:
+        raise ValueError('expected (N, h, w) images or a shape for flat ones, got %s' % (images.shape,))
+    n, h, w = images.shape
+    if scale == 'tile':
+        lo = images.min(axis=(1, 2), keepdims=True)
+        hi = images.max(axis=(1, 2), keepdims=True)
+    elif scale == 'global':
+        lo, hi = images.min(), images.max()
+    elif scale is not None:
+        raise ValueError("scale must be 'tile', 'global' or None, got %r" % (scale,))
+    if scale is not None:
+        images = (images - lo) / np.where(hi > lo, hi - lo, 1.)
+    if grid is None:
+        cols = int(np.ceil(np.sqrt(n)))
+        grid = (-(-n // cols), cols)
+    rows, cols = grid
+    if rows*cols < n:
+        raise ValueError('%d images do not fit a %dx%d grid' % (n, rows, cols))
+    cells = np.full((rows*cols, h + pad, w + pad), pad_value, dtype=np.float32)
+    cells[:n, :h, :w] = images
+    out = cells.reshape(rows, cols, h + pad, w + pad).transpose(0, 2, 1, 3)
+    out = out.reshape(rows*(h + pad), cols*(w + pad))
+    return out[:out.shape[0] - pad, :out.shape[1] - pad]
+
+# one imshow of a tiled array on the current figure
+def imshow(mosaic, title=None):
+    import matplotlib.pyplot as plt
+    plt.imshow(mosaic, cmap='gray', interpolation='nearest', vmin=0, vmax=1)
+    plt.axis('off')
+    if title is not None:
+        plt.title(title)
+
+def _chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+# 8-bit grayscale PNG of an array in [0, 1], each pixel repeated zoom times
+def write_png(path, mosaic, zoom=1):
+    a = np.clip(np.asarray(mosaic, dtype=np.float32)*255 + .5, 0, 255).astype(np.uint8)
+    if zoom > 1:
+        a = np.repeat(np.repeat(a, zoom, axis=0), zoom, axis=1)
+    h, w = a.shape
+    raw = np.zeros((h, w + 1), dtype=np.uint8)  # filter type 0 before each row
+    raw[:, 1:] = a
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(_chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 0, 0, 0, 0)))
+        f.write(_chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(_chunk(b'IEND', b''))
@@ -0,0 +1,124 @@
+import os
+import atexit
+import multiprocessing
+
+# Figures are described as plain specs (curves, bar charts, tiled images)
+# and rendered with the Agg backend in worker processes, so saving them
+# never blocks training and nothing waits on a window. Pending figures are
+# flushed at exit. NNUTILS_PLOT_PROCESSES=0 renders in the calling process.
+# Windows are opt-in: with show=True or NNUTILS_PLOT_SHOW=1 the figures are
+# drawn again on the interactive backend once everything is saved.
+
+def _axes(plt, spec):
+    if spec.get('xlabel') is not None:
+        plt.xlabel(spec['xlabel'])
+    if spec.get('ylabel') is not None:
+        plt.ylabel(spec['ylabel'])
+    if spec.get('title') is not None:
+        plt.title(spec['title'])
+    if spec.get('legend') is not None:
+        plt.legend(loc=spec['legend'])
+
+def draw(plt, spec):
+    if spec['kind'] == 'plot':
+        for s in spec['series']:
+            x, y, label = s[:3]
+            line, = plt.plot(x, y, label=label)
+            if len(s) > 3 and s[3] is not None:
+                plt.fill_between(x, s[3][0], s[3][1], color=line.get_color(), alpha=0.2)
+    elif spec['kind'] == 'bar':
+        plt.bar(spec['x'], spec['height'], yerr=spec.get('yerr'))
+    elif spec['kind'] == 'image':
+        plt.imshow(spec['image'], cmap='gray', interpolation='nearest', vmin=0, vmax=1)
+        plt.axis('off')
+    else:
+        raise ValueError('unknown figure kind %r' % (spec['kind'],))
+    if spec.get('xticks') is not None:
+        plt.xticks(*spec['xticks'])
+    _axes(plt, spec)
+
+def render(spec):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+    fig = plt.figure()
+    try:
+        draw(plt, spec)
+        fig.savefig(spec['path'])
+    finally:
+        plt.close(fig)
+    return spec['path']
+
+# draw the specs on the default backend and block until the windows are closed
+def show(specs):
+    import matplotlib.pyplot as plt
+    for spec in specs:
+        plt.figure(spec['path'])
+        draw(plt, spec)
+    plt.show()
+
+class Sink(object):
+
+    def __init__(self, processes=None, show=None):
+        if processes is None:
+            processes = int(os.environ.get('NNUTILS_PLOT_PROCESSES', 2))
+        if show is None:
+            show = os.environ.get('NNUTILS_PLOT_SHOW', '0') == '1'
+        self.pending = []
+        self.shown = [] if show else None
+        self.pool = None
+        # forked now, before the training loops start their threads
+        if processes > 0:
+            self.pool = multiprocessing.get_context('fork').Pool(processes)
+        atexit.register(self.close)
+
+    def submit(self, spec):
+        if self.shown is not None:
+            self.shown.append(spec)
+        if self.pool is None:
+            render(spec)
+            return
+        # finished figures are checked here so a failing spec shows up early,
+        # and an earlier figure for the same file has to be written first
+        pending = []
+        for path, r in self.pending:
+            if path == spec['path']:
+                r.wait()
+            if r.ready():
+                r.get()
+            else:
+                pending.append((path, r))
+        pending.append((spec['path'], self.pool.apply_async(render, (spec,))))
+        self.pending = pending
+
+    # series is a list of (x, y, label) or (x, y, label, (lo, hi)), the band
+    # shaded in the curve's color; label None leaves a curve out of the legend
+    def plot(self, path, series, xlabel=None, ylabel=None, title=None, legend=None, xticks=None):
+        self.submit({'kind': 'plot', 'path': path, 'series': series, 'xlabel': xlabel,
+                     'ylabel': ylabel, 'title': title, 'legend': legend, 'xticks': xticks})
+
+    def bar(self, path, x, height, yerr=None, xticks=None, xlabel=None, ylabel=None, title=None):
+        self.submit({'kind': 'bar', 'path': path, 'x': x, 'height': height, 'yerr': yerr,
+                     'xticks': xticks, 'xlabel': xlabel, 'ylabel': ylabel, 'title': title})
+
+    # image is a montage.tile array in [0, 1]
+    def image(self, path, image, title=None):
+        self.submit({'kind': 'image', 'path': path, 'image': image, 'title': title})
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        for path, r in pending:
+            r.get()
+
+    def close(self):
+        if self.pool is not None:
+            try:
+                self.flush()
+            finally:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+        if self.shown:
+            specs, self.shown = self.shown, []
+            show(specs)
@@ -0,0 +1,62 @@
+import os
+import sys
+import numpy as np
+import theano
+
+# Precision policy: data, shared variables and graphs all use float32.
+# Theano defaults to floatX=float64, so importing this module sets floatX
+# to float32 unless THEANO_FLAGS names a floatX itself, e.g. floatX=float64
+# to check a run in double precision. NNUTILS_PRECISION=debug warns when a
+# float64 variable is created (and when floatX is float64) and lists the
+# float64 inputs and ops of every function built with compiled.function;
+# NNUTILS_PRECISION=strict makes either an error.
+policy = os.environ.get('NNUTILS_PRECISION', '')
+if policy not in ('', 'debug', 'strict'):
+    raise ValueError('NNUTILS_PRECISION must be debug or strict, got %r' % policy)
+debug = policy != ''
+
+def _flagged_floatX():
+    return any(flag.split('=')[0].strip() == 'floatX'
+               for flag in os.environ.get('THEANO_FLAGS', '').split(','))
+
+if not _flagged_floatX():
+    theano.config.floatX = 'float32'
+floatX = theano.config.floatX
+if policy == 'debug':
+    theano.config.warn_float64 = 'warn'
+    if floatX == 'float64':
+        print('precision: floatX is float64, shared variables and graphs will not be float32', file=sys.stderr)
+elif policy == 'strict':
+    theano.config.warn_float64 = 'raise'
+    if floatX == 'float64':
+        raise ValueError('NNUTILS_PRECISION=strict needs floatX=float32, THEANO_FLAGS sets %s' % floatX)
+
+def cast(value):
+    return np.asarray(value, dtype=floatX)
+
+# theano.shared(value, floatX) passes floatX as the name and keeps the
+# dtype of value; this casts the value instead
+def shared(value, name=None, borrow=True):
+    return theano.shared(cast(value), name=name, borrow=borrow)
+
+def set_value(p, value):
+    p.set_value(cast(value))
+
+# inputs and apply nodes of a compiled function that hold float64
+def float64_report(fn):
+    fgraph = fn.maker.fgraph
+    inputs = [v for v in fgraph.inputs if getattr(v, 'dtype', None) == 'float64']
+    nodes = [node for node in fgraph.toposort()
+             if any(getattr(out, 'dtype', None) == 'float64' for out in node.outputs)]
+    return inputs, nodes
+
+def report(fn, name=None, file=sys.stderr):
+    inputs, nodes = float64_report(fn)
+    if not inputs and not nodes:
+        return
+    name = name or fn.name or 'function'
+    print('%s: %d float64 inputs, %d float64 ops' % (name, len(inputs), len(nodes)), file=file)
+    for v in inputs:
+        print('  input %s %s' % (v, v.type), file=file)
+    for node in nodes:
+        print('  op %s' % node, file=file)
@@ -0,0 +1,72 @@
+import queue
+import threading
+import numpy as np
+
+# default transform: copy, so a batch survives the reuse of Minibatches buffers
+def copy_batch(batch):
+    return [np.array(a) for a in batch]
+
+# cast every float array of a batch into a fresh array of the given dtype,
+# integer class labels are copied as they are
+def cast(dtype):
+    def transform(batch):
+        return [a.astype(dtype) if a.dtype.kind == 'f' else np.array(a) for a in batch]
+    return transform
+
+class _Failure(object):
+    def __init__(self, exc):
+        self.exc = exc
+
+_end = object()
+
+# Iterates over batches (e.g. a Minibatches object) in a background thread.
+# Each batch goes through transform (gather, cast, reshape, augmentation)
+# and up to depth prepared batches wait in a bounded queue while the
+# compiled theano function runs. transform must return new arrays, not
+# views of its input. Errors in the thread are raised in the consumer.
+class Prefetcher(object):
+
+    def __init__(self, batches, depth=2, transform=copy_batch):
+        self.batches = batches
+        self.depth = depth
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __iter__(self):
+        q = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self.batches:
+                    if not put(self.transform(batch)):
+                        return
+                put(_end)
+            except Exception as e:
+                put(_Failure(e))
+
+        thread = threading.Thread(target=produce)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = q.get()
+                if item is _end:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+        finally:
+            stop.set()
+            thread.join()
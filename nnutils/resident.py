@@ -0,0 +1,37 @@
+import numpy as np
+import theano
+import theano.tensor as T
+from nnutils import precision
+
+floatX = precision.floatX
+
+# copy a data set into theano storage once, so that compiled functions
+# only receive row indices instead of a fresh array on every call
+def to_shared(data, dtype=floatX, name=None):
+    return theano.shared(np.asarray(data, dtype=dtype), name=name, borrow=True)
+
+# f(index) runs on rows [index*batch_size, (index+1)*batch_size) of the shared data
+def batch_function(inputs, data, outputs, batch_size, updates=None, **kwargs):
+    index = T.lscalar('index')
+    givens = [(v, d[index*batch_size:(index+1)*batch_size]) for v, d in zip(inputs, data)]
+    return theano.function([index], outputs, updates=updates, givens=givens, **kwargs)
+
+# f(idx) runs on the rows listed in the int32 vector idx, e.g. a slice of a permutation
+def index_function(inputs, data, outputs, updates=None, **kwargs):
+    idx = T.ivector('idx')
+    givens = [(v, d[idx]) for v, d in zip(inputs, data)]
+    return theano.function([idx], outputs, updates=updates, givens=givens, **kwargs)
+
+# f() runs on the whole shared data, e.g. predict on the test set
+def full_function(inputs, data, outputs, updates=None, **kwargs):
+    givens = list(zip(inputs, data))
+    return theano.function([], outputs, updates=updates, givens=givens, **kwargs)
+
+def permutation(n):
+    return np.random.permutation(n).astype(np.int32)
+
+# copy new arrays, e.g. the next fold, into variables made by to_shared;
+# functions compiled on them keep working with the new rows
+def set_data(data, arrays):
+    for d, a in zip(data, arrays):
+        d.set_value(np.asarray(a, dtype=d.dtype))
@@ -0,0 +1,36 @@
+import numpy as np
+import theano
+import theano.tensor as T
+from nnutils import precision
+
+floatX = precision.floatX
+
+# M independent models trained by one compiled function: every parameter
+# gets a leading model axis, w_h1 of shape (8, 30) becomes (M, 8, 30).
+
+def shared_stack(values, name=None):
+    return theano.shared(np.asarray(np.stack(values), dtype=floatX), name=name, borrow=True)
+
+def set_stack(p, values):
+    p.set_value(np.asarray(np.stack(values), dtype=floatX))
+
+# (b, n) or (M, b, n) activations times (M, n, k) or (M, n) weights
+def dot(h, W):
+    if h.ndim == 2:
+        # same input batch for every model
+        out = T.tensordot(h, W, axes=[[1], [1]])
+        return out.dimshuffle([1, 0] + list(range(2, out.ndim)))
+    return T.batched_dot(h, W)
+
+# (M, k) or (M,) bias broadcast over the batch axis
+def bias(b):
+    return b.dimshuffle([0, 'x'] + list(range(1, b.ndim)))
+
+# costs is the (M,) vector of per-model costs and lr a shared (M,) vector,
+# models share no parameters so the gradient of the sum is per model
+def sgd(costs, params, lr):
+    grads = T.grad(cost=T.sum(costs), wrt=params)
+    updates = []
+    for p, g in zip(params, grads):
+        updates.append([p, p - lr.dimshuffle([0] + ['x']*(p.ndim-1)) * g])
+    return updates
@@ -0,0 +1,203 @@
+import os
+import io
+import json
+import inspect
+import hashlib
+import itertools
+import numpy as np
+
+from nnutils import crossval
+
+# A sweep is a list of configs (dicts of keyword arguments for the job).
+# Each config is hashed together with the settings the script holds fixed,
+# the job's name, a fingerprint of the data and the source of the job and
+# the script functions it calls; finished results are stored under that
+# hash, so rerunning a sweep only trains the configs that are new or whose
+# inputs changed.
+
+# grid(exp=range(3), fold=range(5)) -> one config per combination, last axis fastest
+def grid(**axes):
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*[list(axes[n]) for n in names])]
+
+def _to_json(o):
+    if hasattr(o, 'tolist'):
+        return o.tolist()
+    raise TypeError('%r is not JSON serializable' % (o,))
+
+def digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=_to_json).encode()).hexdigest()
+
+def data_fingerprint(arrays):
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(('%s|%s|' % (a.shape, a.dtype.str)).encode())
+        h.update(a.data)
+    return h.hexdigest()[:16]
+
+# functions of the job's module that fn refers to, directly or through the
+# functions and nested defs it calls, sorted by name
+def _callees(fn, seen=None):
+    seen = {} if seen is None else seen
+    codes = [fn.__code__]
+    while codes:
+        code = codes.pop()
+        codes.extend(c for c in code.co_consts if inspect.iscode(c))
+        for name in code.co_names:
+            f = fn.__globals__.get(name)
+            if inspect.isfunction(f) and f.__module__ == fn.__module__ and f.__qualname__ not in seen:
+                seen[f.__qualname__] = f
+                _callees(f, seen)
+    return [seen[name] for name in sorted(seen)]
+
+# The graph a job trains is built at the top of the script, so its shape
+# has to be described by the settings. The code version hashes the source
+# of the job and of the script functions it calls (data splits, epoch
+# loops, initialization), so editing those retrains while editing plot
+# code or the list of configs does not.
+def code_version(job):
+    h = hashlib.sha1(job.__qualname__.encode())
+    for fn in [job] + [f for f in _callees(job) if f is not job]:
+        try:
+            source = inspect.getsource(fn)
+        except (OSError, TypeError):
+            source = fn.__module__ + '.' + fn.__qualname__
+        h.update(source.encode())
+    return h.hexdigest()[:16]
+
+# A store is a directory of <key>.npz, with the job's returned tuple as
+# r0, r1, ..., and <key>.json with what went into the key.
+class Store(object):
+
+    def __init__(self, root):
+        self.root = root
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key + ext)
+
+    def done(self, key):
+        return os.path.exists(self._path(key, '.npz'))
+
+    def get(self, key):
+        with np.load(self._path(key, '.npz')) as f:
+            return tuple(f['r%d' % i] for i in range(len(f.files)))
+
+    # the .npz is renamed into place last, it marks the job as done
+    def put(self, key, record, result):
+        if not isinstance(result, tuple):
+            result = (result,)
+        buf = io.BytesIO()
+        np.savez(buf, **dict(('r%d' % i, np.asarray(r)) for i, r in enumerate(result)))
+        for ext, data in (('.json', json.dumps(record, indent=1, sort_keys=True, default=_to_json).encode()),
+                          ('.npz', buf.getvalue())):
+            fn = self._path(key, ext)
+            tmp = '%s.%d.tmp' % (fn, os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.rename(tmp, fn)
+
+thread_vars = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']
+_limited = []
+
+# Workers are forked after numpy has loaded its BLAS, so the environment
+# only reaches libraries loaded later; threadpoolctl, if installed, also
+# limits the ones already running.
+def limit_threads(threads):
+    if _limited:
+        return
+    _limited.append(threads)
+    for var in thread_vars:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    _limited.append(threadpool_limits(threads))
+
+class _Task(object):
+
+    def __init__(self, job, store, threads, stacked):
+        self.job = job
+        self.store = store
+        self.threads = threads
+        self.stacked = stacked
+
+    # each worker stores its own results, so an interrupted sweep keeps every
+    # finished job; a stacked job's results are split into one per config
+    def __call__(self, keys, config, records):
+        limit_threads(self.threads)
+        result = self.job(**config)
+        if not self.stacked:
+            self.store.put(keys[0], records[0], result)
+            return
+        if not isinstance(result, tuple):
+            result = (result,)
+        for i, (key, record) in enumerate(zip(keys, records)):
+            self.store.put(key, record, tuple(np.asarray(r)[i] for r in result))
+
+# Runs job(**config) for the configs that have no stored result and returns
+# the stored results in the order of configs. arrays are passed on to
+# crossval.run and are part of the key; threads is the BLAS thread budget
+# of one job, and by default as many jobs run at once as fit the cores.
+#
+# stack=(name, names) trains several configs in one job, e.g. the models
+# of a stacked network: configs that differ only in config[name] and have
+# no stored result go to one call with the list of their values as
+# names=[...], and the job returns a tuple of arrays with one row per
+# value. Each row is stored under its own config, so adding a value to
+# the sweep only trains that value.
+def run(job, configs, arrays, store, settings=None, threads=1, processes=None, code=None, stack=None):
+    base = {'job': job.__qualname__,
+            'settings': settings or {},
+            'data': data_fingerprint(arrays),
+            'code': code or code_version(job)}
+    keys, todo, queued = [], [], set()
+    for config in configs:
+        record = dict(base, config=config)
+        key = digest(record)
+        keys.append(key)
+        if not store.done(key) and key not in queued:
+            queued.add(key)
+            todo.append((key, config, record))
+    print('sweep: training %d of %d jobs, results in %s' % (len(todo), len(configs), store.root))
+    if stack is None:
+        tasks = [([key], config, [record]) for key, config, record in todo]
+    else:
+        name, names = stack
+        groups = {}
+        for key, config, record in todo:
+            rest = dict((k, v) for k, v in config.items() if k != name)
+            group = groups.setdefault(digest(rest), (rest, [], [], []))
+            group[1].append(key)
+            group[2].append(record)
+            group[3].append(config[name])
+        tasks = [(group_keys, dict(rest, **{names: values}), records)
+                 for rest, group_keys, records, values in groups.values()]
+    if tasks:
+        if processes is None:
+            processes = max(1, (os.cpu_count() or 1) // threads)
+        crossval.run(_Task(job, store, threads, stack is not None), tasks, arrays, processes)
+    return [store.get(key) for key in keys]
+
+# Successive halving over candidates 0..n-1: advance(alive, epochs) trains
+# the alive candidates up to epochs in total and returns their validation
+# costs, then the better 1/eta of them go on to the next, longer rung.
+# Returns each candidate's cost from the last rung it reached and the
+# epochs it was given.
+def successive_halving(n, advance, rungs, eta=2):
+    if list(rungs) != sorted(set(rungs)) or not len(rungs):
+        raise ValueError('rungs must be increasing epoch budgets, got %r' % (rungs,))
+    alive = list(range(n))
+    costs = np.full(n, np.inf)
+    budgets = np.zeros(n, dtype=int)
+    for i, epochs in enumerate(rungs):
+        rung_costs = np.asarray(advance(alive, epochs), dtype=float)
+        costs[alive] = rung_costs
+        budgets[alive] = epochs
+        if i + 1 < len(rungs):
+            keep = max(1, len(alive) // eta)
+            alive = [alive[j] for j in np.argsort(rung_costs, kind='stable')[:keep]]
+    return costs, budgets
@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+
+# Opt-in instrumentation. NNUTILS_TIMING=1 splits the training loops into
+# phases (data, train, eval, ...) and prints where the time went;
+# NNUTILS_PROFILE=train,predict compiles the named functions with theano's
+# per-op profiler and summarizes their top ops. Both are off by default and
+# then cost one attribute lookup per phase.
+enabled = os.environ.get('NNUTILS_TIMING', '') not in ('', '0')
+profiled = set(n for n in os.environ.get('NNUTILS_PROFILE', '').split(',') if n)
+
+class _Null(object):
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_null = _Null()
+
+class _Timer(object):
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+    def __enter__(self):
+        self.t = time.time()
+        return self
+    def __exit__(self, *exc):
+        self.phases.add(self.name, time.time() - self.t)
+        return False
+
+# with phases('train'): ... accumulates wall time per phase name
+class Phases(object):
+
+    def __init__(self, enabled=enabled):
+        self.enabled = enabled
+        self.totals = {}
+        self.calls = {}
+        self.order = []
+        self.start = time.time()
+
+    def __call__(self, name):
+        if not self.enabled:
+            return _null
+        return _Timer(self, name)
+
+    def add(self, name, seconds):
+        if name not in self.totals:
+            self.order.append(name)
+            self.totals[name] = 0.
+            self.calls[name] = 0
+        self.totals[name] += seconds
+        self.calls[name] += 1
+
+    # time spent waiting for each item of an iterable, e.g. a Prefetcher
+    def iterate(self, name, iterable):
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iterable)
+
+    def _iterate(self, name, iterable):
+        it = iter(iterable)
+        while True:
+            t = time.time()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.add(name, time.time() - t)
+            yield item
+
+    def report(self, file=sys.stdout):
+        if not self.enabled:
+            return
+        wall = time.time() - self.start
+        print('phase            seconds   calls  %% of %.1fs' % wall, file=file)
+        for name in self.order:
+            print('%-15s %8.2f %7d %6.1f%%' % (name, self.totals[name], self.calls[name],
+                                              100*self.totals[name]/wall), file=file)
+        rest = wall - sum(self.totals.values())
+        print('%-15s %8.2f %7s %6.1f%%' % ('(untimed)', rest, '', 100*rest/wall), file=file)
+
+# value for the profile argument of theano.function / compiled.function
+def profile(name):
+    if name not in profiled:
+        return False
+    from theano.compile.profiling import ProfileStats
+    return ProfileStats(atexit_print=False, message=name)
+
+# op classes grouped under the names used when building the graphs; the
+# first match wins, so the fused CrossentropySoftmax* ops count as crossentropy
+op_groups = [('conv2d', ('Corr', 'Conv')),
+             ('pool_2d', ('Pool',)),
+             ('dot', ('Dot', 'Gemm', 'Gemv', 'Ger')),
+             ('categorical_crossentropy', ('Crossentropy',)),
+             ('softmax', ('Softmax',))]
+
+def op_group(node):
+    op = type(node.op).__name__
+    if op == 'Elemwise' or op == 'GpuElemwise':
+        op = type(node.op.scalar_op).__name__
+    for group, markers in op_groups:
+        if any(m in op for m in markers):
+            return group, op
+    return 'other', op
+
+def op_times(fn):
+    stats = fn.profile
+    by_op = {}
+    by_group = {}
+    for key, t in stats.apply_time.items():
+        # (fgraph, node) in newer theano, node in older
+        node = key[1] if isinstance(key, tuple) else key
+        group, op = op_group(node)
+        by_op[op] = by_op.get(op, 0.) + t
+        by_group[group] = by_group.get(group, 0.) + t
+    return by_op, by_group
+
+def profile_summary(fn, top=10, file=sys.stdout):
+    if not getattr(fn, 'profile', None):
+        return
+    by_op, by_group = op_times(fn)
+    total = sum(by_op.values()) or 1.
+    name = fn.profile.message or fn.name or 'function'
+    print('%s: %d calls, %.2fs in %.2fs of ops' % (name, fn.profile.fct_callcount,
+                                                  fn.profile.fct_call_time, total), file=file)
+    for group, t in sorted(by_group.items(), key=lambda kv: -kv[1]):
+        print('  %-26s %8.3fs %5.1f%%' % (group, t, 100*t/total), file=file)
+    print('  top ops:', file=file)
+    for op, t in sorted(by_op.items(), key=lambda kv: -kv[1])[:top]:
+        print('    %-24s %8.3fs %5.1f%%' % (op, t, 100*t/total), file=file)
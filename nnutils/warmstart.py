@@ -0,0 +1,40 @@
+import json
+import numpy as np
+
+# Starting a run from the weights of a finished neighbouring run instead of
+# from scratch. Every run records where its starting point came from, so
+# warm and cold results can be told apart afterwards.
+
+# init is 'cold', 'warm' (the converged weights of source) or 'widened'
+# (source grown with widen); details are e.g. the width or rate of source
+def provenance(init, source=None, **details):
+    if init not in ('cold', 'warm', 'widened'):
+        raise ValueError("init must be 'cold', 'warm' or 'widened', got %r" % (init,))
+    record = {'init': init, 'source': source}
+    record.update(details)
+    return record
+
+# a list of provenance records as one string array, which a sweep store can keep
+def encode(records):
+    return np.asarray(json.dumps(records))
+
+def decode(array):
+    return json.loads(str(array))
+
+# Net2WiderNet: a hidden layer of n units grows to width units by copying
+# randomly chosen ones. The outgoing weights of a unit that now appears k
+# times are divided by k, so the wider network computes the same function.
+# w_in is (inputs, n), b_in (n,) and w_out (n,) or (n, outputs); noise,
+# relative to the spread of w_in, goes on the incoming weights of the
+# copies so that they do not stay identical during training.
+def widen(w_in, b_in, w_out, width, rng=np.random, noise=1e-2):
+    n = w_in.shape[1]
+    if width < n:
+        raise ValueError('cannot widen a layer of %d units to %d' % (n, width))
+    mapping = np.concatenate([np.arange(n), rng.randint(0, n, width - n)])
+    counts = np.bincount(mapping, minlength=n)[mapping]
+    new_in = w_in[:, mapping].copy()
+    if noise and width > n:
+        new_in[:, n:] += noise * np.std(w_in) * rng.randn(w_in.shape[0], width - n)
+    new_out = w_out[mapping] / counts.reshape((-1,) + (1,)*(w_out.ndim - 1))
+    return new_in.astype(w_in.dtype), b_in[mapping].copy(), new_out.astype(w_out.dtype)
@@ -1,14 +1,21 @@
 import numpy as np
 import theano
 import theano.tensor as T
-import matplotlib.pyplot as plt
 import time
 
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, precision, resident, fused, timing, losses, earlystop, crossval, sweep, plots, inference
+from nnutils.earlystop import EarlyStopping
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
+
 def init_bias(n = 1):
-    return(np.zeros(n))
+    return(np.zeros(n, dtype=theano.config.floatX))
 
 def create_bias(n = 1):
-    return(theano.shared(init_bias(n), theano.config.floatX))
+    return(theano.shared(init_bias(n), borrow=True))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.asarray(
@@ -26,13 +33,6 @@ def create_weights(n_in=1, n_out=1, logistic=True):
     W_values = init_weights(n_in, n_out, logistic)
     return (theano.shared(value=W_values, name='W', borrow=True))
 
-# scale data
-def scale(X, X_min, X_max):
-    return (X - X_min)/(X_max-np.min(X, axis=0))
-
-#do scale 2, with standard dev and mean value
-def scaleN(X):
-    return (X - np.mean(X)) / np.std(X)
 # update parameters
 def sgd(cost, params, lr=0.01):
     grads = T.grad(cost=cost, wrt=params)
@@ -41,138 +41,132 @@ def sgd(cost, params, lr=0.01):
         updates.append([p, p - g * lr])
     return updates
 
-def shuffle_data (samples, labels):
-    idx = np.arange(samples.shape[0])
-    np.random.shuffle(idx)
-    #print  (samples.shape, labels.shape)
-    samples, labels = samples[idx], labels[idx]
-    return samples, labels
-
 decay = 1e-6
 learning_rate = 0.01
 epochs = 1000
+patience = 100 # epochs without a better validation accuracy before a run stops
+fused_epochs = True # one train call per epoch, its updates run in a scan instead of one call per minibatch
 
 # theano expressions
 X = T.matrix() #features
-Y = T.matrix() #output
+Y = T.ivector() #class labels
 
 w1, b1 = create_weights(36, 10), create_bias(10) #weights and biases from input to hidden layer
 w2, b2 = create_weights(10, 6, logistic=False), create_bias(6) #weights and biases from hidden to output layer
 
 h1 = T.nnet.sigmoid(T.dot(X, w1) + b1)
-py = T.nnet.softmax(T.dot(h1, w2) + b2)
+logits = T.dot(h1, w2) + b2 # softmax is folded into the loss
 
-y_x = T.argmax(py, axis=1)
+y_x = T.argmax(logits, axis=1)
 
-cost = T.mean(T.nnet.categorical_crossentropy(py, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))))
+cost = T.mean(losses.softmax_cross_entropy(logits, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))))
 params = [w1, b1, w2, b2]
 updates = sgd(cost, params, learning_rate)
 
-# compile
-train = theano.function(inputs=[X, Y], outputs=cost, updates=updates, allow_input_downcast=True)
-predict = theano.function(inputs=[X], outputs=y_x, allow_input_downcast=True)
-
-
-#read train data
-train_input = np.loadtxt('../../data/sat_train.txt',delimiter=' ')
-trainX, train_Y = train_input[:,:36], train_input[:,-1].astype(int)
-trainX_min, trainX_max = np.min(trainX, axis=0), np.max(trainX, axis=0)
-trainX = scaleN(trainX)
-#train X is the data matrix
-#this is the desired output
-train_Y[train_Y == 7] = 6
-trainY = np.zeros((train_Y.shape[0], 6))
-#this is the K matrix
-trainY[np.arange(train_Y.shape[0]), train_Y-1] = 1
-
 
-#read test data
-test_input = np.loadtxt('../../data/sat_test.txt',delimiter=' ')
-testX, test_Y = test_input[:,:36], test_input[:,-1].astype(int)
+#read train and test data
+trainX, trainY = datasets.sat('../../data/sat_train.txt', 'scaleN', onehot=False)
+testX, testY = datasets.sat('../../data/sat_test.txt', 'scaleN', onehot=False)
 
-testX_min, testX_max = np.min(testX, axis=0), np.max(testX, axis=0)
-testX = scaleN(testX)
-
-test_Y[test_Y == 7] = 6
-testY = np.zeros((test_Y.shape[0], 6))
-testY[np.arange(test_Y.shape[0]), test_Y-1] = 1
+# runs stop on a fifth of the training set held out for validation, never on the test set
+train_rows, valid_rows = earlystop.holdout(len(trainX))
+trainX, trainY, validX, validY = trainX[train_rows], trainY[train_rows], trainX[valid_rows], trainY[valid_rows]
 
 print(trainX.shape, trainY.shape)
 print(testX.shape, testY.shape)
 
+# compile, the data sets stay in theano storage and train only receives row indices
+trainX_s, trainY_s, testX_s = resident.to_shared(trainX), resident.to_shared(trainY, 'int32'), resident.to_shared(testX)
+validX_s = resident.to_shared(validX)
+if fused_epochs:
+    train = fused.index_function([X, Y], [trainX_s, trainY_s], cost, updates, profile=timing.profile('train'))
+else:
+    train = resident.index_function([X, Y], [trainX_s, trainY_s], cost, updates, profile=timing.profile('train'))
+predict = resident.full_function([X], [testX_s], y_x, profile=timing.profile('predict'))
+predict_valid = resident.full_function([X], [validX_s], y_x)
+
 
 # train and test
+# NNUTILS_TIMING=1 reports the time per phase, NNUTILS_PROFILE=train,predict the top ops
+phases = timing.Phases()
 n = len(trainX)
-result = dict()
-result["test_accuracy"] = []
-result["train_cost"] = []
 
+# one run from scratch with one batch size; returns the test accuracy and
+# training cost per epoch, the time per update in ms and the stop epoch
+def run_batch_size(batch_size):
+    np.random.seed(crossval.job_seed(10, batch_size))
+    w1.set_value(init_weights(36, 10))
+    b1.set_value(init_bias(10)) #weights and biases from input to hidden layer
 
-time_for_update = np.zeros(n)
-
-batch_size_list = [4, 8, 16, 32, 64]
-
+    w2.set_value(init_weights(10, 6, logistic=False))
+    b2.set_value(init_bias(6)) #weights and biases from hidden to output layer
 
-for batch_size in batch_size_list:
     print(batch_size)
     test_accuracy = []
     train_cost = []
     t = time.time()
-    result["times"] = []
+    stopper = EarlyStopping(params, patience, mode='max')
     for i in range(epochs):
-        trainX, trainY = shuffle_data(trainX, trainY)
+        with phases('shuffle'):
+            perm = resident.permutation(n)
         cost = 0.0
 
-        for start, end in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            t0 = time.time()
-            cost += train(trainX[start:end], trainY[start:end])
-            result["times"].append(1000*(time.time()-t0))
+        if fused_epochs:
+            with phases('train'):
+                cost = train(fused.batch_rows(perm, batch_size))
+        else:
+            for start, end in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
+                with phases('train'):
+                    cost += train(perm[start:end])
 
         train_cost.append(cost/(n // batch_size))
 
-        test_accuracy.append(np.mean(np.argmax(testY, axis=1) == predict(testX)))
+        with phases('eval'):
+            test_accuracy.append(np.mean(testY == predict()))
+            stop = stopper.step(i, np.mean(validY == predict_valid()))
         # print(test_accuracy)
+        if stop:
+            break
+    time_for_update = (1000*(time.time()-t)) / (stopper.stop_epoch * (n // batch_size))
+    # the best weights, for scoring without theano via inference.load_mlp
+    stopper.restore()
+    inference.save('weights_batch%d.npz' % batch_size, [p.get_value() for p in params])
+    return (earlystop.fill(test_accuracy, epochs), earlystop.fill(train_cost, epochs),
+            time_for_update, stopper.stop_epoch)
 
+batch_size_list = [4, 8, 16, 32, 64]
 
-    w1.set_value(init_weights(36, 10))
-    b1.set_value(init_bias(10)) #weights and biases from input to hidden layer
+# finished runs are kept in sweeps/, a rerun only trains new or changed batch sizes;
+# the runs go one after another in this process so that their update times compare
+settings = {'epochs': epochs, 'patience': patience, 'learning_rate': learning_rate, 'decay': decay,
+            'fused_epochs': fused_epochs}
+results = sweep.run(run_batch_size, sweep.grid(batch_size=batch_size_list),
+                    [trainX, trainY, validX, validY, testX, testY], sweep.Store('sweeps/batch_sizes'), settings,
+                    processes=1)
+result = dict()
+result["test_accuracy"] = [r[0] for r in results]
+result["train_cost"] = [r[1] for r in results]
+result["stop_epoch"] = [int(r[3]) for r in results]
 
-    w2.set_value(init_weights(10, 6, logistic=False))
-    b2.set_value(init_bias(6)) #weights and biases from hidden to output layer
+time_for_update = np.zeros(max(batch_size_list) + 1)
+time_for_update[batch_size_list] = [r[2] for r in results]
 
-    result["test_accuracy"].append(test_accuracy)
-    result["train_cost"].append(train_cost)
+print("stop epochs: ", result["stop_epoch"])
 
+#Plots
+figures.plot('p2a_sample_cost.png',
+             [(range(epochs), curve, "batch size = " + str(label)) for label, curve in zip(batch_size_list, result["train_cost"])],
+             xlabel='iterations', ylabel='cross-entropy', title='training cost', legend='upper right')
 
+figures.plot('p2a_sample_accuracy.png',
+             [(range(epochs), curve, "batch size = " + str(label)) for label, curve in zip(batch_size_list, result["test_accuracy"])],
+             xlabel='iterations', ylabel='accuracy', title='test accuracy', legend='lower right')
 
-    time_for_update[batch_size] = (1000*(time.time()-t)) / (epochs * (n // batch_size))
+figures.plot('p2b3_time_update.png', [(batch_size_list, time_for_update[batch_size_list], None)],
+             xlabel='batch-size', ylabel='time in ms', title='time to update parameters', xticks=(batch_size_list,))
 
-#Plots
-plt.figure()
-for label, curve in zip(batch_size_list, result["train_cost"]):
-    plt.plot(range(epochs), curve, label="batch size = " + str(label))
-plt.legend(loc = 'upper right')
-plt.xlabel('iterations')
-plt.ylabel('cross-entropy')
-plt.title('training cost')
-plt.savefig('p2a_sample_cost.png')
-
-plt.figure()
-for label, curve in zip(batch_size_list, result["test_accuracy"]):
-    plt.plot(range(epochs), curve, label="batch size = " + str(label))
-plt.legend(loc = 'lower right')
-plt.xlabel('iterations')
-plt.ylabel('accuracy')
-plt.title('test accuracy')
-plt.savefig('p2a_sample_accuracy.png')
-
-
-plt.figure()
-plt.plot(batch_size_list, time_for_update[batch_size_list])
-plt.xlabel('batch-size')
-plt.ylabel('time in ms')
-plt.title('time to update parameters')
-plt.xticks(batch_size_list)
-plt.savefig('p2b3_time_update.png')
-
-plt.show()
+phases.report()
+timing.profile_summary(train)
+timing.profile_summary(predict)
+
+figures.close()
@@ -1,14 +1,21 @@
 import numpy as np
 import theano
 import theano.tensor as T
-import matplotlib.pyplot as plt
 import time
 
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, precision, resident, warmstart, losses, earlystop, crossval, sweep, plots, inference
+from nnutils.earlystop import EarlyStopping
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
+
 def init_bias(n = 1):
-    return(np.zeros(n))
+    return(np.zeros(n, dtype=theano.config.floatX))
 
 def create_bias(n = 1):
-    return(theano.shared(init_bias(n), theano.config.floatX))
+    return(theano.shared(init_bias(n), borrow=True))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.asarray(
@@ -26,13 +33,6 @@ def create_weights(n_in=1, n_out=1, logistic=True):
     W_values = init_weights(n_in, n_out, logistic)
     return (theano.shared(value=W_values, name='W', borrow=True))
 
-# scale data
-def scale(X, X_min, X_max):
-    return (X - X_min)/(X_max-np.min(X, axis=0))
-
-#do scale 2, with standard dev and mean value
-def scaleN(X):
-    return (X - np.mean(X)) / np.std(X)
 # update parameters
 def sgd(cost, params, lr=0.01):
     grads = T.grad(cost=cost, wrt=params)
@@ -41,127 +41,154 @@ def sgd(cost, params, lr=0.01):
         updates.append([p, p - g * lr])
     return updates
 
-def shuffle_data (samples, labels):
-    idx = np.arange(samples.shape[0])
-    np.random.shuffle(idx)
-    #print  (samples.shape, labels.shape)
-    samples, labels = samples[idx], labels[idx]
-    return samples, labels
-
 decay = 1e-6
 learning_rate = 0.01
 epochs = 1000
+patience = 100 # epochs without a better validation accuracy before a run stops
 batch_size = 32
+warm_start = False # grow each network from the trained one before it instead of starting from scratch
 # theano expressions
 X = T.matrix() #features
-Y = T.matrix() #output
+Y = T.ivector() #class labels
 
 w1, b1 = create_weights(36, 10), create_bias(10) #weights and biases from input to hidden layer
 w2, b2 = create_weights(10, 6, logistic=False), create_bias(6) #weights and biases from hidden to output layer
 
 h1 = T.nnet.sigmoid(T.dot(X, w1) + b1)
-py = T.nnet.softmax(T.dot(h1, w2) + b2)
+logits = T.dot(h1, w2) + b2 # softmax is folded into the loss
 
-y_x = T.argmax(py, axis=1)
+y_x = T.argmax(logits, axis=1)
 
-cost = T.mean(T.nnet.categorical_crossentropy(py, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))))
+cost = T.mean(losses.softmax_cross_entropy(logits, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))))
 params = [w1, b1, w2, b2]
 updates = sgd(cost, params, learning_rate)
 
-# compile
-train = theano.function(inputs=[X, Y], outputs=cost, updates=updates, allow_input_downcast=True)
-predict = theano.function(inputs=[X], outputs=y_x, allow_input_downcast=True)
-
-
-#read train data
-train_input = np.loadtxt('../../data/sat_train.txt',delimiter=' ')
-trainX, train_Y = train_input[:,:36], train_input[:,-1].astype(int)
-trainX_min, trainX_max = np.min(trainX, axis=0), np.max(trainX, axis=0)
-trainX = scaleN(trainX)
-#train X is the data matrix
-#this is the desired output
-train_Y[train_Y == 7] = 6
-trainY = np.zeros((train_Y.shape[0], 6))
-#this is the K matrix
-trainY[np.arange(train_Y.shape[0]), train_Y-1] = 1
-
-
-#read test data
 
-test_input = np.loadtxt('../../data/sat_test.txt',delimiter=' ')
-testX, test_Y = test_input[:,:36], test_input[:,-1].astype(int)
+#read train and test data
+trainX, trainY = datasets.sat('../../data/sat_train.txt', 'scaleN', onehot=False)
+testX, testY = datasets.sat('../../data/sat_test.txt', 'scaleN', onehot=False)
 
-testX_min, testX_max = np.min(testX, axis=0), np.max(testX, axis=0)
-testX = scaleN(testX)
-
-test_Y[test_Y == 7] = 6
-testY = np.zeros((test_Y.shape[0], 6))
-testY[np.arange(test_Y.shape[0]), test_Y-1] = 1
+# runs stop on a fifth of the training set held out for validation, never on the test set
+train_rows, valid_rows = earlystop.holdout(len(trainX))
+trainX, trainY, validX, validY = trainX[train_rows], trainY[train_rows], trainX[valid_rows], trainY[valid_rows]
 
 print(trainX.shape, trainY.shape)
 print(testX.shape, testY.shape)
 
+# compile, the data sets stay in theano storage and train only receives row indices
+trainX_s, trainY_s, testX_s = resident.to_shared(trainX), resident.to_shared(trainY, 'int32'), resident.to_shared(testX)
+validX_s = resident.to_shared(validX)
+train = resident.index_function([X, Y], [trainX_s, trainY_s], cost, updates)
+predict = resident.full_function([X], [testX_s], y_x)
+predict_valid = resident.full_function([X], [validX_s], y_x)
+
 # train and test
 n = len(trainX)
-time_for_update = np.zeros(n)
-result = dict()
-result["test_accuracy"] = []
-result["train_cost"] = []
-
-hidden_neruon_list = [5,10,15,20,25]
 
-for hidden_neruon in hidden_neruon_list:
+def init_network(hidden_neruon):
+    w1.set_value(init_weights(36, hidden_neruon))
+    b1.set_value(init_bias(hidden_neruon)) #weights and biases from input to hidden layer
 
-    print(hidden_neruon)
+    w2.set_value(init_weights(hidden_neruon, 6, logistic=False))
+    b2.set_value(init_bias(6)) #weights and biases from hidden to output layer
 
+# trains the network in w1, b1, w2, b2 until it stops and restores its best
+# weights; returns the test accuracy and training cost per epoch, the time
+# per update in ms and the stop epoch
+def train_run():
     test_accuracy = []
     train_cost = []
     t = time.time()
+    stopper = EarlyStopping(params, patience, mode='max')
     for i in range(epochs):
-        trainX, trainY = shuffle_data(trainX, trainY)
+        perm = resident.permutation(n)
         cost = 0.0
 
         for start, end in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            cost += train(trainX[start:end], trainY[start:end])
+            cost += train(perm[start:end])
         train_cost.append(cost/(n // batch_size))
 
-        test_accuracy.append(np.mean(np.argmax(testY, axis=1) == predict(testX)))
+        test_accuracy.append(np.mean(testY == predict()))
 
-    w1.set_value(init_weights(36, hidden_neruon))
-    b1.set_value(init_bias(hidden_neruon)) #weights and biases from input to hidden layer
+        if stopper.step(i, np.mean(validY == predict_valid())):
+            break
+    # with warm_start the next, wider network grows from the best weights
+    stopper.restore()
+    time_for_update = (1000*(time.time()-t)) / (stopper.stop_epoch * (n // batch_size))
+    # for scoring without theano via inference.load_mlp
+    inference.save('weights_%d.npz' % w1.get_value().shape[1], [p.get_value() for p in params])
+    return earlystop.fill(test_accuracy, epochs), earlystop.fill(train_cost, epochs), time_for_update, stopper.stop_epoch
 
-    w2.set_value(init_weights(hidden_neruon, 6, logistic=False))
-    b2.set_value(init_bias(6)) #weights and biases from hidden to output layer
+# one run from scratch
+def run_hidden_size(hidden_neruon):
+    np.random.seed(crossval.job_seed(10, hidden_neruon))
+    print(hidden_neruon)
+    init_network(hidden_neruon)
+    return train_run() + (warmstart.encode([warmstart.provenance('cold', width=hidden_neruon)]),)
+
+# all sizes in one run, smallest first, each network grown from the network
+# the run before trained, widened by Net2Net to compute what it does
+def run_warm(hidden_neruons):
+    np.random.seed(crossval.job_seed(10))
+    runs, provenance = [], []
+    for hidden_neruon in sorted(hidden_neruons):
+        print(hidden_neruon)
+        trained = w1.get_value().shape[1]
+        if runs and hidden_neruon > trained:
+            w1_values, b1_values, w2_values = warmstart.widen(w1.get_value(), b1.get_value(), w2.get_value(), hidden_neruon)
+            w1.set_value(w1_values), b1.set_value(b1_values), w2.set_value(w2_values)
+            provenance.append(warmstart.provenance('widened', trained, width=hidden_neruon))
+        elif runs and hidden_neruon == trained:
+            provenance.append(warmstart.provenance('warm', trained, width=hidden_neruon))
+        else:
+            init_network(hidden_neruon)
+            provenance.append(warmstart.provenance('cold', width=hidden_neruon))
+        runs.append(train_run())
+    order = np.argsort(np.argsort(hidden_neruons))
+    return tuple(np.array([runs[i][k] for i in order]) for k in range(4)) + (
+        warmstart.encode([provenance[i] for i in order]),)
 
-    result["test_accuracy"].append(test_accuracy)
-    result["train_cost"].append(train_cost)
+hidden_neruon_list = [5,10,15,20,25]
 
-    time_for_update[hidden_neruon] = (1000*(time.time()-t)) / (epochs * (n // batch_size))
+# finished runs are kept in sweeps/, a rerun only trains new or changed sizes;
+# the runs go one after another in this process so that their update times compare
+settings = {'epochs': epochs, 'patience': patience, 'batch_size': batch_size, 'learning_rate': learning_rate,
+            'decay': decay, 'warm_start': warm_start}
+arrays = [trainX, trainY, validX, validY, testX, testY]
+store = sweep.Store('sweeps/hidden_sizes')
+if warm_start:
+    r = sweep.run(run_warm, [{'hidden_neruons': hidden_neruon_list}], arrays, store, settings, processes=1)[0]
+    runs = [tuple(r[k][i] for k in range(4)) for i in range(len(hidden_neruon_list))]
+    provenance = warmstart.decode(r[4])
+else:
+    results = sweep.run(run_hidden_size, sweep.grid(hidden_neruon=hidden_neruon_list), arrays, store, settings,
+                        processes=1)
+    runs = [r[:4] for r in results]
+    provenance = [warmstart.decode(r[4])[0] for r in results]
+
+result = dict()
+result["test_accuracy"] = [r[0] for r in runs]
+result["train_cost"] = [r[1] for r in runs]
+result["provenance"] = provenance
+result["stop_epoch"] = [int(r[3]) for r in runs]
+
+time_for_update = np.zeros(max(hidden_neruon_list) + 1)
+time_for_update[hidden_neruon_list] = [r[2] for r in runs]
+
+print("initialization of each run: ", result["provenance"])
+print("stop epochs: ", result["stop_epoch"])
 
 #Plots
-plt.figure()
-for label, curve in zip(hidden_neruon_list, result["train_cost"]):
-    plt.plot(range(epochs), curve, label="hidden neurons size = " + str(label))
-plt.legend(loc = 'upper right')
-plt.xlabel('iterations')
-plt.ylabel('cross-entropy')
-plt.title('training cost')
-plt.savefig('p2a_sample_cost.png')
-
-plt.figure()
-for label, curve in zip(hidden_neruon_list, result["test_accuracy"]):
-    plt.plot(range(epochs), curve, label="hidden neurons size = " + str(label))
-plt.legend(loc = 'lower right')
-plt.xlabel('iterations')
-plt.ylabel('accuracy')
-plt.title('test accuracy')
-plt.savefig('p2a_sample_accuracy.png')
-
-plt.figure()
-plt.plot(hidden_neruon_list, time_for_update[hidden_neruon_list])
-plt.xlabel('hidden neuron size')
-plt.ylabel('time for update in ms')
-plt.title('time to update parameters')
-plt.xticks(hidden_neruon_list)
-plt.savefig('figure_t4q2_4.png')
-plt.show()
+figures.plot('p2a_sample_cost.png',
+             [(range(epochs), curve, "hidden neurons size = " + str(label)) for label, curve in zip(hidden_neruon_list, result["train_cost"])],
+             xlabel='iterations', ylabel='cross-entropy', title='training cost', legend='upper right')
+
+figures.plot('p2a_sample_accuracy.png',
+             [(range(epochs), curve, "hidden neurons size = " + str(label)) for label, curve in zip(hidden_neruon_list, result["test_accuracy"])],
+             xlabel='iterations', ylabel='accuracy', title='test accuracy', legend='lower right')
+
+figures.plot('figure_t4q2_4.png', [(hidden_neruon_list, time_for_update[hidden_neruon_list], None)],
+             xlabel='hidden neuron size', ylabel='time for update in ms', title='time to update parameters',
+             xticks=(hidden_neruon_list,))
+
+figures.close()
@@ -1,14 +1,21 @@
 import numpy as np
 import theano
 import theano.tensor as T
-import matplotlib.pyplot as plt
 import time
 
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, precision, evaluation, losses, earlystop, crossval, sweep, resident, plots, inference
+from nnutils.earlystop import EarlyStopping
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
+
 def init_bias(n = 1):
-    return(np.zeros(n))
+    return(np.zeros(n, dtype=theano.config.floatX))
 
 def create_bias(n = 1):
-    return(theano.shared(init_bias(n), theano.config.floatX))
+    return(theano.shared(init_bias(n), borrow=True))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.asarray(
@@ -26,13 +33,6 @@ def create_weights(n_in=1, n_out=1, logistic=True):
     W_values = init_weights(n_in, n_out, logistic)
     return (theano.shared(value=W_values, name='W', borrow=True))
 
-# scale data
-def scale(X, X_min, X_max):
-    return (X - X_min)/(X_max-np.min(X, axis=0))
-
-#do scale 2, with standard dev and mean value
-def scaleN(X):
-    return (X - np.mean(X)) / np.std(X)
 # update parameters
 def sgd(cost, params, lr=0.01):
     grads = T.grad(cost=cost, wrt=params)
@@ -41,122 +41,112 @@ def sgd(cost, params, lr=0.01):
         updates.append([p, p - g * lr])
     return updates
 
-def shuffle_data (samples, labels):
-    idx = np.arange(samples.shape[0])
-    np.random.shuffle(idx)
-    #print  (samples.shape, labels.shape)
-    samples, labels = samples[idx], labels[idx]
-    return samples, labels
-
-decay = 0
+decay = precision.shared(0., 'decay') # set by each run of the sweep below
 learning_rate = 0.01
 epochs = 1000
+patience = 100 # epochs without a better validation accuracy before a run stops
 batch_size = 32
 no_hidden = 25
 
 # theano expressions
 X = T.matrix() #features
-Y = T.matrix() #output
+Y = T.ivector() #class labels
 
 w1, b1 = create_weights(36, no_hidden), create_bias(no_hidden) #weights and biases from input to hidden layer
 w2, b2 = create_weights(no_hidden, 6, logistic=False), create_bias(6) #weights and biases from hidden to output layer
 
 h1 = T.nnet.sigmoid(T.dot(X, w1) + b1)
-py = T.nnet.softmax(T.dot(h1, w2) + b2)
+logits = T.dot(h1, w2) + b2 # softmax is folded into the loss
 
-y_x = T.argmax(py, axis=1)
+y_x = T.argmax(logits, axis=1)
 
-cost = T.mean(T.nnet.categorical_crossentropy(py, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))))
+cost = T.mean(losses.softmax_cross_entropy(logits, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))))
 params = [w1, b1, w2, b2]
 updates = sgd(cost, params, learning_rate)
 
-# compile
-train = theano.function(inputs=[X, Y], outputs=cost, updates=updates, allow_input_downcast=True)
-predict = theano.function(inputs=[X], outputs=y_x, allow_input_downcast=True)
-
-
-#read train data
-train_input = np.loadtxt('../../data/sat_train.txt',delimiter=' ')
-trainX, train_Y = train_input[:,:36], train_input[:,-1].astype(int)
-trainX_min, trainX_max = np.min(trainX, axis=0), np.max(trainX, axis=0)
-trainX = scaleN(trainX)
-#train X is the data matrix
-#this is the desired output
-train_Y[train_Y == 7] = 6
-trainY = np.zeros((train_Y.shape[0], 6))
-#this is the K matrix
-trainY[np.arange(train_Y.shape[0]), train_Y-1] = 1
-
+#read train and test data
+trainX, trainY = datasets.sat('../../data/sat_train.txt', 'scaleN', onehot=False)
+testX, testY = datasets.sat('../../data/sat_test.txt', 'scaleN', onehot=False)
 
-#read test data
-
-test_input = np.loadtxt('../../data/sat_test.txt',delimiter=' ')
-testX, test_Y = test_input[:,:36], test_input[:,-1].astype(int)
-
-testX_min, testX_max = np.min(testX, axis=0), np.max(testX, axis=0)
-testX = scaleN(testX)
-
-test_Y[test_Y == 7] = 6
-testY = np.zeros((test_Y.shape[0], 6))
-testY[np.arange(test_Y.shape[0]), test_Y-1] = 1
+# runs stop on a fifth of the training set held out for validation, never on the test set
+train_rows, valid_rows = earlystop.holdout(len(trainX))
+trainX, trainY, validX, validY = trainX[train_rows], trainY[train_rows], trainX[valid_rows], trainY[valid_rows]
 
 print(trainX.shape, trainY.shape)
 print(testX.shape, testY.shape)
 
+# compile, the data sets stay in theano storage and train and predict only receive row indices
+trainX_s, trainY_s, testX_s = resident.to_shared(trainX), resident.to_shared(trainY, 'int32'), resident.to_shared(testX)
+validX_s = resident.to_shared(validX)
+train = resident.index_function([X, Y], [trainX_s, trainY_s], cost, updates)
+predict = resident.index_function([X], [testX_s], y_x)
+predict_valid = resident.full_function([X], [validX_s], y_x)
+
 # train and test
 n = len(trainX)
+no_batches = -(-n // batch_size)
 
-result = dict()
-result["test_accuracy"] = []
-result["train_cost"] = []
-
+# test accuracy every 10 epochs on a fixed stratified half of the test set
+evaluator = evaluation.Evaluator(lambda rows: testY[rows] == predict(np.arange(len(testY), dtype=np.int32)[rows]),
+                                 epochs, every=10, subsample=evaluation.stratified_subsample(testY, len(testY) // 2))
 
+# one run from scratch with one weight decay; returns the training cost and
+# the test accuracy with its confidence band per epoch and the stop epoch
+def run_decay(decay_value):
+    np.random.seed(crossval.job_seed(10, int(np.float64(decay_value).view(np.uint64))))
+    precision.set_value(decay, decay_value)
+    w1.set_value(init_weights(36, no_hidden))
+    b1.set_value(init_bias(no_hidden)) #weights and biases from input to hidden layer
 
-decay_list = [0, 1e-3,1e-6,1e-9,1e-12] # 1e-9 is the best
+    w2.set_value(init_weights(no_hidden, 6, logistic=False))
+    b2.set_value(init_bias(6)) #weights and biases from hidden to output layer
 
-for decay in decay_list:
-    test_accuracy = []
+    evaluator.reset()
     train_cost = []
-    t = time.time()
+    stopper = EarlyStopping(params, patience, mode='max')
     for i in range(epochs):
-        trainX, trainY = shuffle_data(trainX, trainY)
+        perm = resident.permutation(n)
         cost = 0.0
 
-        for start, end in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            cost += train(trainX[start:end], trainY[start:end])
-        train_cost.append(cost/(n // batch_size))
+        for start in range(0, n, batch_size):
+            cost += train(perm[start:start+batch_size])
+        train_cost.append(cost/no_batches)
 
-        test_accuracy.append(np.mean(np.argmax(testY, axis=1) == predict(testX)))
-        # print(test_accuracy)
+        evaluator.step(i)
+        if stopper.step(i, np.mean(validY == predict_valid())):
+            break
+    evaluator.report('decay %g' % decay_value)
+    # the best weights, for scoring without theano via inference.load_mlp
+    stopper.restore()
+    inference.save('weights_decay%g.npz' % decay_value, [p.get_value() for p in params])
+    lo, hi = evaluator.band()
+    return earlystop.fill(train_cost, epochs), evaluator.curve(), lo, hi, stopper.stop_epoch
 
+decay_list = [0, 1e-3,1e-6,1e-9,1e-12] # 1e-9 is the best
 
-    w1.set_value(init_weights(36, no_hidden))
-    b1.set_value(init_bias(no_hidden)) #weights and biases from input to hidden layer
+# the runs are independent, spread them over the cores; finished runs are
+# kept in sweeps/, a rerun only trains new or changed decays
+settings = {'epochs': epochs, 'patience': patience, 'batch_size': batch_size, 'learning_rate': learning_rate,
+            'no_hidden': no_hidden}
+results = sweep.run(run_decay, sweep.grid(decay_value=decay_list), [trainX, trainY, validX, validY, testX, testY],
+                    sweep.Store('sweeps/decays'), settings)
 
-    w2.set_value(init_weights(no_hidden, 6, logistic=False))
-    b2.set_value(init_bias(6)) #weights and biases from hidden to output layer
+result = dict()
+result["train_cost"] = [r[0] for r in results]
+result["test_accuracy"] = [r[1] for r in results]
+result["test_ci"] = [(r[2], r[3]) for r in results]
+result["stop_epoch"] = [int(r[4]) for r in results]
 
-    result["test_accuracy"].append(test_accuracy)
-    result["train_cost"].append(train_cost)
+print("stop epochs: ", result["stop_epoch"])
 
 #Plots
-plt.figure()
-for label, curve in zip(decay_list, result["train_cost"]):
-    plt.plot(range(epochs), curve, label="decay size = " + str(label))
-plt.legend(loc = 'upper right')
-plt.xlabel('iterations')
-plt.ylabel('cross-entropy')
-plt.title('training cost')
-plt.savefig('p2a_sample_cost.png')
-
-plt.figure()
-for label, curve in zip(decay_list, result["test_accuracy"]):
-    plt.plot(range(epochs), curve, label="decay size = " + str(label))
-plt.legend(loc = 'lower right')
-plt.xlabel('iterations')
-plt.ylabel('accuracy')
-plt.title('test accuracy')
-plt.savefig('p2a_sample_accuracy.png')
-
-
-plt.show()
+figures.plot('p2a_sample_cost.png',
+             [(range(epochs), curve, "decay size = " + str(label)) for label, curve in zip(decay_list, result["train_cost"])],
+             xlabel='iterations', ylabel='cross-entropy', title='training cost', legend='upper right')
+
+figures.plot('p2a_sample_accuracy.png',
+             [(range(epochs), curve, "decay size = " + str(label), ci)
+              for label, curve, ci in zip(decay_list, result["test_accuracy"], result["test_ci"])],
+             xlabel='iterations', ylabel='accuracy', title='test accuracy', legend='lower right')
+
+figures.close()
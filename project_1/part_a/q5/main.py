@@ -1,10 +1,17 @@
 import numpy as np
 import theano
 import theano.tensor as T
-import matplotlib.pyplot as plt
+
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, precision, losses, earlystop, resident, plots, inference
+from nnutils.earlystop import EarlyStopping
+
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
 
 def init_bias(n = 1):
-    return(theano.shared(np.zeros(n), theano.config.floatX))
+    return(theano.shared(np.zeros(n, dtype=theano.config.floatX), borrow=True))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.asarray(
@@ -18,10 +25,6 @@ def init_weights(n_in=1, n_out=1, logistic=True):
         W_values *= 4
     return (theano.shared(value=W_values, name='W', borrow=True))
 
-# scale data
-def scale(X, X_min, X_max):
-    return (X - X_min)/(X_max-np.min(X, axis=0))
-
 # update parameters
 def sgd(cost, params, lr=0.01):
     grads = T.grad(cost=cost, wrt=params)
@@ -30,22 +33,16 @@ def sgd(cost, params, lr=0.01):
         updates.append([p, p - g * lr])
     return updates
 
-def shuffle_data (samples, labels):
-    idx = np.arange(samples.shape[0])
-    np.random.shuffle(idx)
-    #print  (samples.shape, labels.shape)
-    samples, labels = samples[idx], labels[idx]
-    return samples, labels
-
 
 decay = 1e-6
 learning_rate = 0.01
 epochs = 1000
+patience = 100 # epochs without a better validation accuracy before training stops
 batch_size = 32
 
 # theano expressions
 X = T.matrix() #features
-Y = T.matrix() #output
+Y = T.ivector() #class labels
 
 w1, b1 = init_weights(36, 10), init_bias(10) #weights and biases from input to hidden layer
 w2, b2 = init_weights(10, 10), init_bias(10) #weights and biases from hidden layer to hidden layer
@@ -53,72 +50,64 @@ w3, b3 = init_weights(10, 6, logistic=False), init_bias(6) #weights and biases f
 
 h1 = T.nnet.sigmoid(T.dot(X, w1) + b1)
 h2 = T.nnet.sigmoid(T.dot(h1, w2) + b2)
-py = T.nnet.softmax(T.dot(h2, w3) + b3)
+logits = T.dot(h2, w3) + b3 # softmax is folded into the loss
 
-y_x = T.argmax(py, axis=1)
+y_x = T.argmax(logits, axis=1)
 #dont know if this is right
-cost = T.mean(T.nnet.categorical_crossentropy(py, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))+T.sum(T.sqr(w3))))
+cost = T.mean(losses.softmax_cross_entropy(logits, Y)) + decay*(T.sum(T.sqr(w1)+T.sum(T.sqr(w2))+T.sum(T.sqr(w3))))
 params = [w1, b1, w2, b2, w3, b3]
 updates = sgd(cost, params, learning_rate)
 
-# compile
-train = theano.function(inputs=[X, Y], outputs=cost, updates=updates, allow_input_downcast=True)
-predict = theano.function(inputs=[X], outputs=y_x, allow_input_downcast=True)
-
-
-#read train data
-train_input = np.loadtxt('../../data/sat_train.txt',delimiter=' ')
-trainX, train_Y = train_input[:,:36], train_input[:,-1].astype(int)
-trainX_min, trainX_max = np.min(trainX, axis=0), np.max(trainX, axis=0)
-trainX = scale(trainX, trainX_min, trainX_max)
-
-train_Y[train_Y == 7] = 6
-trainY = np.zeros((train_Y.shape[0], 6))
-trainY[np.arange(train_Y.shape[0]), train_Y-1] = 1
+#read train and test data
+trainX, trainY = datasets.sat('../../data/sat_train.txt', 'scale', onehot=False)
+testX, testY = datasets.sat('../../data/sat_test.txt', 'scale', onehot=False)
+# training stops on a fifth of the training set held out for validation, never on the test set
+train_rows, valid_rows = earlystop.holdout(len(trainX))
+trainX, trainY, validX, validY = trainX[train_rows], trainY[train_rows], trainX[valid_rows], trainY[valid_rows]
 
-
-#read test data
-test_input = np.loadtxt('../../data/sat_test.txt',delimiter=' ')
-testX, test_Y = test_input[:,:36], test_input[:,-1].astype(int)
-
-testX_min, testX_max = np.min(testX, axis=0), np.max(testX, axis=0)
-testX = scale(testX, testX_min, testX_max)
-
-test_Y[test_Y == 7] = 6
-testY = np.zeros((test_Y.shape[0], 6))
-testY[np.arange(test_Y.shape[0]), test_Y-1] = 1
+# compile, the data sets stay in theano storage and train only receives row indices
+trainX_s, trainY_s, testX_s = resident.to_shared(trainX), resident.to_shared(trainY, 'int32'), resident.to_shared(testX)
+validX_s = resident.to_shared(validX)
+train = resident.index_function([X, Y], [trainX_s, trainY_s], cost, updates)
+predict = resident.full_function([X], [testX_s], y_x)
+predict_valid = resident.full_function([X], [validX_s], y_x)
 
 # train and test
 n = len(trainX)
+no_batches = -(-n // batch_size)
 test_accuracy = []
 train_cost = []
+stopper = EarlyStopping(params, patience, mode='max')
 for i in range(epochs):
     if i % 1000 == 0:
         print(i)
 
-    trainX, trainY = shuffle_data(trainX, trainY)
+    perm = resident.permutation(n)
     cost = 0.0
-    for start, end in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-        cost += train(trainX[start:end], trainY[start:end])
-    train_cost = np.append(train_cost, cost/(n // batch_size))
-
-    test_accuracy = np.append(test_accuracy, np.mean(np.argmax(testY, axis=1) == predict(testX)))
+    for start in range(0, n, batch_size):
+        cost += train(perm[start:start+batch_size])
+    train_cost = np.append(train_cost, cost/no_batches)
+
+    test_accuracy = np.append(test_accuracy, np.mean(testY == predict()))
+
+    if stopper.step(i, np.mean(validY == predict_valid())):
+        break
+stopper.restore()
+print('stopped after %d epochs, best validation accuracy %.1f at %d iterations'
+      % (stopper.stop_epoch, stopper.best*100, stopper.best_epoch+1))
+print('%.1f test accuracy with the restored weights' % (np.mean(testY == predict())*100))
+# for scoring without theano via inference.load_mlp
+inference.save('weights.npz', [p.get_value() for p in params])
+train_cost = earlystop.fill(train_cost, epochs)
+test_accuracy = earlystop.fill(test_accuracy, epochs)
 
 print('%.1f accuracy at %d iterations'%(np.max(test_accuracy)*100, np.argmax(test_accuracy)+1))
 
 #Plots
-plt.figure()
-plt.plot(range(epochs), train_cost)
-plt.xlabel('iterations')
-plt.ylabel('cross-entropy')
-plt.title('training cost')
-plt.savefig('p1a_sample_cost.png')
-
-plt.figure()
-plt.plot(range(epochs), test_accuracy)
-plt.xlabel('iterations')
-plt.ylabel('accuracy')
-plt.title('test accuracy')
-plt.savefig('p1a_sample_accuracy.png')
-
-plt.show()
+figures.plot('p1a_sample_cost.png', [(range(epochs), train_cost, None)],
+             xlabel='iterations', ylabel='cross-entropy', title='training cost')
+
+figures.plot('p1a_sample_accuracy.png', [(range(epochs), test_accuracy, None)],
+             xlabel='iterations', ylabel='accuracy', title='test accuracy')
+
+figures.close()
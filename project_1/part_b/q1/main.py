@@ -5,14 +5,20 @@ import numpy as np
 import theano
 import theano.tensor as T
 
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, crossval, earlystop, precision, plots, resident
+from nnutils.earlystop import EarlyStopping
 
 from sklearn.model_selection import KFold
 
 np.random.seed(10)
 
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
 epochs = 1000
+patience = 100 # epochs without a better validation cost before a run stops
 batch_size = 256
 no_hidden1 = 30
 learning_rate = 0.0001
@@ -39,7 +45,7 @@ def shuffle_data (samples, labels):
     return samples, labels
 
 def init_bias(n = 1):
-    return(theano.shared(np.zeros(n), theano.config.floatX))
+    return(precision.shared(np.zeros(n)))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.random.uniform(low=-np.sqrt(6. / (n_in + n_out)),
@@ -47,10 +53,10 @@ def init_weights(n_in=1, n_out=1, logistic=True):
                                  size=(n_in, n_out))
     if logistic == True:
         W_values *= 4
-    return(theano.shared(W_values, theano.config.floatX))
+    return(precision.shared(W_values))
 
 def set_bias(b, n = 1):
-    b.set_value(np.zeros(n))
+    precision.set_value(b, np.zeros(n))
 
 def set_weights(w, n_in=1, n_out=1, logistic=True):
     W_values = np.random.uniform(low=-np.sqrt(6. / (n_in + n_out)),
@@ -58,28 +64,26 @@ def set_weights(w, n_in=1, n_out=1, logistic=True):
                                  size=(n_in, n_out))
     if logistic == True:
         W_values *= 4
-    w.set_value(W_values)
+    precision.set_value(w, W_values)
 
 #read and divide data into test and train sets 
-cal_housing = np.loadtxt('../../data/cal_housing.data', delimiter=',')
-X_data, Y_data = cal_housing[:,:8], cal_housing[:,-1]
-Y_data = (np.asmatrix(Y_data)).transpose()
+X_data, Y_data = datasets.cal_housing('../../data/cal_housing.data')
 
 fold_size = X_data.shape[0] // noFolds
 
 no_features = X_data.shape[1] 
 x = T.matrix('x') # data sample
-d = T.matrix('d') # desired output
+d = T.vector('d') # desired output
 no_samples = T.scalar('no_samples')
 
 # # learning rate
-alpha = theano.shared(learning_rate, floatX)
+alpha = precision.shared(learning_rate)
 
 # initialize weights and biases for hidden layer(s) and output layer
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX ) 
-b_o = theano.shared(np.random.randn()*.01, floatX)
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX )
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+w_o = precision.shared(np.random.randn(no_hidden1)*.01) 
+b_o = precision.shared(np.random.randn()*.01)
+w_h1 = precision.shared(np.random.randn(no_features, no_hidden1)*.01)
+b_h1 = precision.shared(np.random.randn(no_hidden1)*0.01)
 
 #Define mathematical expression:
 h1_out = T.nnet.sigmoid(T.dot(x, w_h1) + b_h1)
@@ -91,65 +95,66 @@ accuracy = T.mean(d - y)
 #define gradients
 dw_o, db_o, dw_h, db_h = T.grad(cost, [w_o, b_o, w_h1, b_h1])
 
-train = theano.function(
-        inputs = [x, d],
-        outputs = cost,
+# the current fold stays in theano storage and train only receives a minibatch
+# index; every fold copies its rows into the same shared variables
+trainX_s, trainY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+testX_s, testY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+validX_s, validY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+
+train = resident.batch_function(
+        [x, d], [trainX_s, trainY_s], cost, batch_size,
         updates = [[w_o, w_o - alpha*dw_o],
                    [b_o, b_o - alpha*db_o],
                    [w_h1, w_h1 - alpha*dw_h],
-                   [b_h1, b_h1 - alpha*db_h]],
-        allow_input_downcast=True
+                   [b_h1, b_h1 - alpha*db_h]]
         )
 
-test = theano.function(
-    inputs = [x, d],
-    outputs = [y, cost, accuracy],
-    allow_input_downcast=True
-    )
-
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX ) 
-b_o = theano.shared(np.random.randn()*.01, floatX)
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX )
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+test = resident.full_function([x, d], [testX_s, testY_s], [y, cost, accuracy])
+valid = resident.full_function([x, d], [validX_s, validY_s], cost)
 
 best_learning_rate = 0.0001
-alpha.set_value(best_learning_rate)
+precision.set_value(alpha, best_learning_rate)
 print(alpha.get_value())
 
-fold_test_cost_min = []
-fold_test_cost = []
-fold_train_cost = []
-fold_test_accuracy = []
-for fold in range(noFolds):
+# one training run, called in a worker process with the data in crossval.data
+def run_fold(fold):
+    X_data, Y_data = crossval.data
+    np.random.seed(crossval.job_seed(10, fold))
     print("        Folder number: ", fold+1)
 
     start, end = fold*fold_size, (fold +1)*fold_size
     testX, testY = X_data[start:end], Y_data[start:end]
     trainX, trainY = np.append(X_data[:start], X_data[end:], axis=0), np.append(Y_data[:start], Y_data[end:], axis=0)
+    # stop on a fifth of the training folds, the test fold is only reported
+    train_rows, valid_rows = earlystop.holdout(len(trainX), seed=fold)
+    trainX, trainY, validX, validY = trainX[train_rows], trainY[train_rows], trainX[valid_rows], trainY[valid_rows]
 
     trainX = normalize(trainX)
+    validX = normalize(validX)
     testX = normalize(testX)
+    resident.set_data([trainX_s, trainY_s, validX_s, validY_s, testX_s, testY_s],
+                      [trainX, trainY, validX, validY, testX, testY])
 
     print("            testX shape: ", testX.shape)
     print("            testY shape: ", testY.shape)
 
-    w_o.set_value(np.random.randn(no_hidden1)*.01)
-    b_o.set_value(np.random.randn()*.01)
-    w_h1.set_value(np.random.randn(no_features, no_hidden1)*.01)
-    b_h1.set_value(np.random.randn(no_hidden1)*0.01)
+    precision.set_value(w_o, np.random.randn(no_hidden1)*.01)
+    precision.set_value(b_o, np.random.randn()*.01)
+    precision.set_value(w_h1, np.random.randn(no_features, no_hidden1)*.01)
+    precision.set_value(b_h1, np.random.randn(no_hidden1)*0.01)
 
+    stopper = EarlyStopping([w_o, b_o, w_h1, b_h1], patience)
     min_cost = 1e+15
     min_accuracy = 1e+15
-    epochs_test_cost_min = []
     epochs_test_cost = []
     epochs_train_cost = []
     epochs_test_accuracy = []
     for epoch in range(epochs):
         n = trainX.shape[0]
         train_cost = 0
-        for start_batch, end_batch in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            train_cost += train(trainX[start_batch:end_batch], np.transpose(trainY[start_batch:end_batch]))
-        pred, test_cost, test_accuracy = test(testX, np.transpose(testY))
+        for index in range(n // batch_size):
+            train_cost += train(index)
+        pred, test_cost, test_accuracy = test()
         epochs_test_cost.append(test_cost)
         epochs_test_accuracy.append(test_accuracy)
         epochs_train_cost.append(train_cost/(n // batch_size))
@@ -159,10 +164,22 @@ for fold in range(noFolds):
         if test_accuracy < min_accuracy:
             min_accuracy = test_accuracy
 
-    fold_test_cost_min.append(min_cost)
-    fold_test_cost.append(epochs_test_cost)
-    fold_train_cost.append(epochs_train_cost)
-    fold_test_accuracy.append(epochs_test_accuracy)
+        if stopper.step(epoch, valid()):
+            break
+    stopper.restore()
+
+    epochs_test_cost = earlystop.fill(epochs_test_cost, epochs)
+    epochs_train_cost = earlystop.fill(epochs_train_cost, epochs)
+    epochs_test_accuracy = earlystop.fill(epochs_test_accuracy, epochs)
+    return min_cost, epochs_test_cost, epochs_train_cost, epochs_test_accuracy, stopper.stop_epoch
+
+# the folds are independent, train them in parallel
+results = crossval.run(run_fold, [(fold,) for fold in range(noFolds)], [X_data, Y_data])
+fold_test_cost_min = [r[0] for r in results]
+fold_test_cost = [r[1] for r in results]
+fold_train_cost = [r[2] for r in results]
+fold_test_accuracy = [r[3] for r in results]
+print("stop epochs: ", [r[4] for r in results])
 
 fold_test_cost = np.mean(fold_test_cost, axis=0)
 print("fold_test_cost")
@@ -175,19 +192,12 @@ print("fold_train_cost")
 pprint.pprint(fold_test_accuracy)
 
 #Plots
-plt.figure()
-plt.plot(range(epochs), fold_train_cost, label='train error')
-plt.xlabel('Epochs')
-plt.ylabel('Mean Squared Error')
-plt.title('Training Errors at Alpha = %.4f'%learning_rate)
-plt.legend()
-plt.savefig('p_1b_sample_mse.png')
-plt.show()
-
-plt.figure()
-plt.plot(range(epochs), fold_test_accuracy)
-plt.xlabel('Epochs')
-plt.ylabel('Accuracy')
-plt.title('Test Accuracy')
-plt.savefig('p_1b_sample_accuracy.png')
-plt.show()
\ No newline at end of file
+figures.plot('p_1b_sample_mse.png', [(range(epochs), fold_train_cost, 'train error')],
+             xlabel='Epochs', ylabel='Mean Squared Error',
+             title='Training Errors at Alpha = %.4f'%learning_rate, legend='best')
+
+figures.plot('p_1b_sample_accuracy.png', [(range(epochs), fold_test_accuracy, None)],
+             xlabel='Epochs', ylabel='Accuracy',
+             title='Test Accuracy')
+
+figures.close()
@@ -5,19 +5,29 @@ import numpy as np
 import theano
 import theano.tensor as T
 
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, crossval, earlystop, stacked, precision, plots, sweep, lrfind, warmstart, resident
+from nnutils.earlystop import EarlyStopping
 
 from sklearn.model_selection import KFold
 
 np.random.seed(10)
 
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
 epochs = 1000
 batch_size = 256
 no_hidden1 = 30
 learning_rates = [0.001, 0.005, 0.0001, 0.0005, 0.00001]
 learning_rate = 0.001
 noExps = 10
+search = 'grid' # or 'halving': train every rate for halving_epochs[0], keep the better half for the next budget
+                # or 'warm': train the rates of a fold from large to small, each from the weights of the one before
+patience = 100 # epochs without a better validation cost before a grid or warm-started run stops
+halving_epochs = [50, 200, 1000]
+lr_range_test = False # run a learning-rate range test on alpha and print the suggested rate before the sweep
 
 floatX = theano.config.floatX
 
@@ -40,7 +50,7 @@ def shuffle_data (samples, labels):
     return samples, labels
 
 def init_bias(n = 1):
-    return(theano.shared(np.zeros(n), theano.config.floatX))
+    return(precision.shared(np.zeros(n)))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.random.uniform(low=-np.sqrt(6. / (n_in + n_out)),
@@ -48,10 +58,10 @@ def init_weights(n_in=1, n_out=1, logistic=True):
                                  size=(n_in, n_out))
     if logistic == True:
         W_values *= 4
-    return(theano.shared(W_values, theano.config.floatX))
+    return(precision.shared(W_values))
 
 def set_bias(b, n = 1):
-    b.set_value(np.zeros(n))
+    precision.set_value(b, np.zeros(n))
 
 def set_weights(w, n_in=1, n_out=1, logistic=True):
     W_values = np.random.uniform(low=-np.sqrt(6. / (n_in + n_out)),
@@ -59,26 +69,24 @@ def set_weights(w, n_in=1, n_out=1, logistic=True):
                                  size=(n_in, n_out))
     if logistic == True:
         W_values *= 4
-    w.set_value(W_values)
+    precision.set_value(w, W_values)
 
 #read and divide data into test and train sets 
-cal_housing = np.loadtxt('../../data/cal_housing.data', delimiter=',')
-X_data, Y_data = cal_housing[:,:8], cal_housing[:,-1]
-Y_data = (np.asmatrix(Y_data)).transpose()
+X_data, Y_data = datasets.cal_housing('../../data/cal_housing.data')
 
 no_features = X_data.shape[1] 
 x = T.matrix('x') # data sample
-d = T.matrix('d') # desired output
+d = T.vector('d') # desired output
 no_samples = T.scalar('no_samples')
 
 # # learning rate
-alpha = theano.shared(learning_rate, floatX)
+alpha = precision.shared(learning_rate)
 
 # initialize weights and biases for hidden layer(s) and output layer
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX ) 
-b_o = theano.shared(np.random.randn()*.01, floatX)
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX )
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+w_o = precision.shared(np.random.randn(no_hidden1)*.01) 
+b_o = precision.shared(np.random.randn()*.01)
+w_h1 = precision.shared(np.random.randn(no_features, no_hidden1)*.01)
+b_h1 = precision.shared(np.random.randn(no_hidden1)*0.01)
 
 #Define mathematical expression:
 h1_out = T.nnet.sigmoid(T.dot(x, w_h1) + b_h1)
@@ -90,27 +98,32 @@ accuracy = T.mean(d - y)
 #define gradients
 dw_o, db_o, dw_h, db_h = T.grad(cost, [w_o, b_o, w_h1, b_h1])
 
-train = theano.function(
-        inputs = [x, d],
-        outputs = cost,
+# the current fold stays in theano storage and train only receives a minibatch
+# index; every fold copies its rows into the same shared variables
+trainX_s, trainY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+testX_s, testY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+
+train = resident.batch_function(
+        [x, d], [trainX_s, trainY_s], cost, batch_size,
         updates = [[w_o, w_o - alpha*dw_o],
                    [b_o, b_o - alpha*db_o],
                    [w_h1, w_h1 - alpha*dw_h],
-                   [b_h1, b_h1 - alpha*db_h]],
-        allow_input_downcast=True
+                   [b_h1, b_h1 - alpha*db_h]]
         )
 
-test = theano.function(
-    inputs = [x, d],
-    outputs = [y, cost, accuracy],
-    allow_input_downcast=True
-    )
+test = resident.full_function([x, d], [testX_s, testY_s], [y, cost, accuracy])
 
 min_error = 1e+15
 
-alpha.set_value(learning_rate)
+precision.set_value(alpha, learning_rate)
 print(alpha.get_value())
 
+# one pass with alpha growing every batch answers in seconds what the sweep below takes hours for
+if lr_range_test:
+    resident.set_data([trainX_s, trainY_s], [normalize(X_data), Y_data])
+    lr_batches = [(index,) for index in range(X_data.shape[0] // batch_size)]
+    lrfind.range_test(train, alpha, lr_batches, [w_o, b_o, w_h1, b_h1], lo=1e-7, hi=1e-1, steps=300).report()
+
 noFolds = 5
 print("X shape: ", X_data.shape)
 print("Y shape: ", Y_data.shape)
@@ -120,76 +133,196 @@ print("nb of features: ", no_features)
 
 print("---------------------")
 
-opt_learningrate = []
-exp_test_cost_min = []
-exp_test_cost = []
-exp_train_cost = []
-for exp in range(noExps):
-    start_time = time.time()
-    print(datetime.datetime.now().time(), '- Exp: ', exp+1)
-    X_data, Y_data = shuffle_data(X_data, Y_data)
-    
-    param_test_cost_min = []
-    param_test_cost = []
-    param_train_cost = []
-    for learning_rate in learning_rates:
-        print("    Learning rate: ", learning_rate)
-        alpha.set_value(learning_rate)
-
-        fold_test_cost_min = []
-        fold_test_cost = []
-        fold_train_cost = []
-        for fold in range(noFolds):
-            print("        Folder number: ", fold+1)
-
-            start, end = fold*fold_size, (fold +1)*fold_size
-            testX, testY = X_data[start:end], Y_data[start:end]
-            trainX, trainY = np.append(X_data[:start], X_data[end:], axis=0), np.append(Y_data[:start], Y_data[end:], axis=0)
-
-            trainX = normalize(trainX)
-            testX = normalize(testX)
-
-            print("            testX shape: ", testX.shape)
-            print("            testY shape: ", testY.shape)
-
-            w_o.set_value(np.random.randn(no_hidden1)*.01)
-            b_o.set_value(np.random.randn()*.01)
-            w_h1.set_value(np.random.randn(no_features, no_hidden1)*.01)
-            b_h1.set_value(np.random.randn(no_hidden1)*0.01)
-
-            min_cost = 1e+15
-            min_accuracy = 1e+15
-            epochs_test_cost_min = []
-            epochs_test_cost = []
-            epochs_train_cost = []
-            for epoch in range(epochs):
-                n = trainX.shape[0]
-                train_cost = 0
-                for start_batch, end_batch in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-                    train_cost += train(trainX[start_batch:end_batch], np.transpose(trainY[start_batch:end_batch]))
-                pred, test_cost, test_accuracy = test(testX, np.transpose(testY))
-                epochs_test_cost.append(test_cost)
-                epochs_train_cost.append(train_cost/(n // batch_size))
-
-                if test_cost < min_cost:
-                    min_cost = test_cost
-                if test_accuracy < min_accuracy:
-                    min_accuracy = test_accuracy
-
-            fold_test_cost_min.append(min_cost)
-            fold_test_cost.append(epochs_test_cost)
-            fold_train_cost.append(epochs_train_cost)
-
-        param_test_cost_min.append(np.mean(fold_test_cost_min))
-        param_test_cost.append(np.mean(fold_test_cost, axis=0))
-        param_train_cost.append(np.mean(fold_train_cost, axis=0))
-
-    exp_test_cost.append(param_test_cost)
-    exp_train_cost.append(param_train_cost)
-
-    opt_learningrate = np.append(opt_learningrate, np.argmin(param_test_cost_min))
-    elapsed_time = time.time() - start_time
-    print("    Elapsed time:", elapsed_time)
+# every learning rate is one model of a stacked network, one train call advances all of them
+no_models = len(learning_rates)
+alphas = theano.shared(np.asarray(learning_rates, dtype=floatX), 'alphas')
+sw_o = stacked.shared_stack([np.random.randn(no_hidden1)*.01]*no_models)
+sb_o = stacked.shared_stack([np.random.randn()*.01]*no_models)
+sw_h1 = stacked.shared_stack([np.random.randn(no_features, no_hidden1)*.01]*no_models)
+sb_h1 = stacked.shared_stack([np.random.randn(no_hidden1)*0.01]*no_models)
+
+sh1_out = T.nnet.sigmoid(stacked.dot(x, sw_h1) + stacked.bias(sb_h1))
+sy = stacked.dot(sh1_out, sw_o) + stacked.bias(sb_o)
+scost = T.mean(T.sqr(d - sy), axis=1)
+
+strain = resident.batch_function([x, d], [trainX_s, trainY_s], scost, batch_size,
+                                 updates=stacked.sgd(scost, [sw_o, sb_o, sw_h1, sb_h1], alphas))
+
+stest = resident.full_function([x, d], [testX_s, testY_s], scost)
+
+# train and test split of one fold, every run of an experiment sees the same shuffle of the data;
+# the fold is copied into the shared data and its number of training rows returned
+def fold_data(exp, fold):
+    X_data, Y_data = crossval.data
+    idx = np.random.RandomState(crossval.job_seed(10, exp)).permutation(X_data.shape[0])
+    X_data, Y_data = X_data[idx], Y_data[idx]
+
+    start, end = fold*fold_size, (fold +1)*fold_size
+    testX, testY = X_data[start:end], Y_data[start:end]
+    trainX, trainY = np.append(X_data[:start], X_data[end:], axis=0), np.append(Y_data[:start], Y_data[end:], axis=0)
+
+    trainX = normalize(trainX)
+    testX = normalize(testX)
+    resident.set_data([trainX_s, trainY_s, testX_s, testY_s], [trainX, trainY, testX, testY])
+    return trainX.shape[0]
+
+def init_values(rng=np.random):
+    return [rng.randn(no_hidden1)*.01, rng.randn()*.01,
+            rng.randn(no_features, no_hidden1)*.01, rng.randn(no_hidden1)*0.01]
+
+# every model of the stack starts from weights seeded by its own rate, so a
+# rate trains the same whichever other rates share the stack
+def init_stacks(exp, fold, learning_rates):
+    alphas.set_value(np.asarray(learning_rates, dtype=floatX))
+    values = [init_values(np.random.RandomState(crossval.job_seed(10, exp, fold, int(np.float64(lr).view(np.uint64)))))
+              for lr in learning_rates]
+    for p, v in zip([sw_o, sb_o, sw_h1, sb_h1], zip(*values)):
+        stacked.set_stack(p, v)
+
+def train_epoch(n, train_fn=strain):
+    train_cost = 0
+    for index in range(n // batch_size):
+        train_cost += train_fn(index)
+    return train_cost/(n // batch_size)
+
+# trains the given learning rates on one fold as one stacked model, called in a
+# worker process with the data in crossval.data; every model stops early on its
+# own, a stopped model gets a zero learning rate so the stacked train call
+# leaves it at its weights
+def run_fold(exp, fold, learning_rates):
+    np.random.seed(crossval.job_seed(10, exp, fold))
+    n = fold_data(exp, fold)
+
+    print(datetime.datetime.now().time(), '- Exp: ', exp+1, "Folder number: ", fold+1, "Learning rates: ", learning_rates)
+
+    init_stacks(exp, fold, learning_rates)
+
+    stopper = earlystop.StackedEarlyStopping([sw_o, sb_o, sw_h1, sb_h1], len(learning_rates), patience)
+    epochs_test_cost = []
+    epochs_train_cost = []
+    for epoch in range(epochs):
+        epochs_train_cost.append(train_epoch(n))
+        epochs_test_cost.append(stest())
+        if stopper.step(epoch, epochs_test_cost[-1]):
+            break
+        alphas.set_value(np.asarray(np.where(stopper.stopped, 0., learning_rates), dtype=floatX))
+    stopper.restore()
+
+    # each model's curves end at its own stop epoch: (rates,) and (rates, epochs)
+    test_curves = [earlystop.fill(c[:e], epochs) for c, e in zip(np.transpose(epochs_test_cost), stopper.stop_epoch)]
+    train_curves = [earlystop.fill(c[:e], epochs) for c, e in zip(np.transpose(epochs_train_cost), stopper.stop_epoch)]
+    return stopper.best, np.array(test_curves), np.array(train_curves), stopper.stop_epoch
+
+# successive halving on one fold: the stack shrinks to the kept models after
+# each rung, so a train call only pays for the learning rates still in the
+# running; a dropped rate keeps the best cost it reached
+def run_fold_halving(exp, fold, learning_rates):
+    np.random.seed(crossval.job_seed(10, exp, fold))
+    n = fold_data(exp, fold)
+
+    print(datetime.datetime.now().time(), '- Exp: ', exp+1, "Folder number: ", fold+1)
+
+    init_stacks(exp, fold, learning_rates)
+    stacks = [sw_o, sb_o, sw_h1, sb_h1]
+    test_cost = [[] for lr in learning_rates]
+    train_cost = [[] for lr in learning_rates]
+    in_stack = list(range(len(learning_rates)))
+
+    def advance(alive, rung_epochs):
+        rows = [in_stack.index(m) for m in alive]
+        for p in stacks:
+            stacked.set_stack(p, p.get_value()[rows])
+        alphas.set_value(np.asarray([learning_rates[m] for m in alive], dtype=floatX))
+        in_stack[:] = alive
+        while len(test_cost[alive[0]]) < rung_epochs:
+            for m, tr, te in zip(alive, train_epoch(n), stest()):
+                train_cost[m].append(tr)
+                test_cost[m].append(te)
+        return [np.min(test_cost[m]) for m in alive]
+
+    min_cost, budgets = sweep.successive_halving(len(learning_rates), advance, halving_epochs)
+    return (min_cost, np.array([earlystop.fill(c, epochs) for c in test_cost]),
+            np.array([earlystop.fill(c, epochs) for c in train_cost]), budgets)
+
+# the learning rates of one fold one after another with the single model,
+# each starting from the best weights of the next larger rate and stopping
+# early; the folds stay cold, the weights of one fold were trained on the
+# validation rows of the others
+def run_fold_warm(exp, fold, learning_rates):
+    np.random.seed(crossval.job_seed(10, exp, fold))
+    n = fold_data(exp, fold)
+
+    params = [w_o, b_o, w_h1, b_h1]
+    for p, v in zip(params, init_values()):
+        precision.set_value(p, v)
+
+    n = len(learning_rates)
+    min_cost = np.zeros(n)
+    test_curves, train_curves = np.zeros((n, epochs)), np.zeros((n, epochs))
+    stop_epochs = np.zeros(n, dtype=int)
+    provenance = [None]*n
+    source = None
+    for m in sorted(range(n), key=lambda m: -learning_rates[m]):
+        print(datetime.datetime.now().time(), '- Exp: ', exp+1, "Learning rate: ", learning_rates[m], "Folder number: ", fold+1)
+        precision.set_value(alpha, learning_rates[m])
+        if source is None:
+            provenance[m] = warmstart.provenance('cold')
+        else:
+            provenance[m] = warmstart.provenance('warm', source)
+
+        stopper = EarlyStopping(params, patience)
+        test_cost, train_cost = [], []
+        for epoch in range(epochs):
+            train_cost.append(train_epoch(n, train))
+            test_cost.append(test()[1])
+            if stopper.step(epoch, test_cost[-1]):
+                break
+        stopper.restore()
+
+        min_cost[m], stop_epochs[m] = stopper.best, stopper.stop_epoch
+        test_curves[m], train_curves[m] = earlystop.fill(test_cost, epochs), earlystop.fill(train_cost, epochs)
+        source = learning_rates[m]
+
+    return min_cost, test_curves, train_curves, stop_epochs, warmstart.encode(provenance)
+
+# the noExps x noFolds runs are independent, spread them over all cores;
+# finished runs are kept in sweeps/, a rerun only trains new or changed configs.
+# A grid run stores every learning rate on its own, so adding a rate or an
+# experiment only trains the new ones; halving and warm compare or chain the
+# rates of a fold, so their runs are keyed by the whole list.
+start_time = time.time()
+settings = {'epochs': epochs, 'batch_size': batch_size, 'no_hidden1': no_hidden1,
+            'noFolds': noFolds, 'patience': patience, 'search': search}
+store = sweep.Store('sweeps/learning_rates')
+if search in ('halving', 'warm'):
+    configs = sweep.grid(exp=range(noExps), fold=range(noFolds), learning_rates=[learning_rates])
+    if search == 'halving':
+        settings['halving_epochs'] = halving_epochs
+        results = sweep.run(run_fold_halving, configs, [X_data, Y_data], store, settings)
+        print("mean epochs per learning rate: ", np.mean([r[3] for r in results], axis=0))
+    else:
+        results = sweep.run(run_fold_warm, configs, [X_data, Y_data], store, settings)
+        print("mean stop epoch per learning rate: ", np.mean([r[3] for r in results], axis=0))
+        print("warm start of exp 1, fold 1: ", warmstart.decode(results[0][4]))
+    # (noExps, noFolds) jobs of all rates -> one result per (exp, rate, fold) as in the grid
+    results = [tuple(r[i][m] for i in range(4)) for exp in range(noExps) for m in range(no_models)
+               for r in results[exp*noFolds:(exp+1)*noFolds]]
+else:
+    configs = sweep.grid(exp=range(noExps), learning_rate=learning_rates, fold=range(noFolds))
+    results = sweep.run(run_fold, configs, [X_data, Y_data], store, settings,
+                        stack=('learning_rate', 'learning_rates'))
+    print("mean stop epoch per learning rate: ",
+          np.mean(np.reshape([r[3] for r in results], (noExps, no_models, noFolds)), axis=(0, 2)))
+print("Elapsed time:", time.time() - start_time)
+
+fold_test_cost_min = np.reshape([r[0] for r in results], (noExps, no_models, noFolds))
+fold_test_cost = np.reshape([r[1] for r in results], (noExps, no_models, noFolds, epochs))
+fold_train_cost = np.reshape([r[2] for r in results], (noExps, no_models, noFolds, epochs))
+
+param_test_cost_min = np.mean(fold_test_cost_min, axis=2)
+exp_test_cost = np.mean(fold_test_cost, axis=2)
+exp_train_cost = np.mean(fold_train_cost, axis=2)
+opt_learningrate = np.argmin(param_test_cost_min, axis=1)
 
 print("opt_learningrate: ", opt_learningrate)
 
@@ -200,34 +333,27 @@ exp_train_cost = np.mean(exp_train_cost, axis=0)
 print("exp_train_cost")
 pprint.pprint(exp_train_cost)
 
-plt.figure()
 counts = []
 for n in range(len(learning_rates)):
     counts = np.append(counts, np.sum(opt_learningrate == n))
 print("counts: ", counts)
-plt.bar(np.arange(1, len(learning_rates)+1), counts)
-plt.xticks(np.arange(1, len(learning_rates)+1), learning_rates)
-plt.xlabel('learning rates')
-plt.ylabel('number of experiments')
-plt.title('distribution of optimal learning rate')
-plt.savefig('figure_t6.q1b_2.png')
-plt.show()
+figures.bar('figure_t6.q1b_2.png', np.arange(1, len(learning_rates)+1), counts,
+            xticks=(np.arange(1, len(learning_rates)+1), learning_rates),
+            xlabel='learning rates', ylabel='number of experiments',
+            title='distribution of optimal learning rate')
 
 #Plots
-plt.figure()
+series = []
 for idx, learning_rate in enumerate(learning_rates):
     print("exp_train_cost", idx)
     pprint.pprint(exp_train_cost[idx])
     print("exp_test_cost", idx)
     pprint.pprint(exp_test_cost[idx])
-    plt.plot(range(epochs), exp_train_cost[idx], label=('train error '+str(learning_rate)))
-    plt.plot(range(epochs), exp_test_cost[idx], label=('validation error '+str(learning_rate)))
-plt.xlabel('Epochs')
-plt.ylabel('Mean Squared Error')
-plt.title('Training and Validation Errors')
-plt.legend()
-plt.savefig('p_1b_sample_mse.png')
-plt.show()
+    series.append((range(epochs), exp_train_cost[idx], 'train error '+str(learning_rate)))
+    series.append((range(epochs), exp_test_cost[idx], 'validation error '+str(learning_rate)))
+figures.plot('p_1b_sample_mse.png', series,
+             xlabel='Epochs', ylabel='Mean Squared Error',
+             title='Training and Validation Errors', legend='best')
 
 # --------------------------------------------------------------------------------------------------------
 
@@ -236,13 +362,15 @@ print("X shape: ", X_data.shape)
 print("Y shape: ", Y_data.shape)
 fold_size = X_data.shape[0] // noFolds
 
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX ) 
-b_o = theano.shared(np.random.randn()*.01, floatX)
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX )
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+w_o = precision.shared(np.random.randn(no_hidden1)*.01) 
+b_o = precision.shared(np.random.randn()*.01)
+w_h1 = precision.shared(np.random.randn(no_features, no_hidden1)*.01)
+b_h1 = precision.shared(np.random.randn(no_hidden1)*0.01)
+
+X_data, Y_data = shuffle_data(X_data, Y_data)
 
 best_learning_rate = 0.00001
-alpha.set_value(best_learning_rate)
+precision.set_value(alpha, best_learning_rate)
 print(alpha.get_value())
 
 fold_test_cost_min = []
@@ -258,14 +386,15 @@ for fold in range(noFolds):
 
     trainX = normalize(trainX)
     testX = normalize(testX)
+    resident.set_data([trainX_s, trainY_s, testX_s, testY_s], [trainX, trainY, testX, testY])
 
     print("            testX shape: ", testX.shape)
     print("            testY shape: ", testY.shape)
 
-    w_o.set_value(np.random.randn(no_hidden1)*.01)
-    b_o.set_value(np.random.randn()*.01)
-    w_h1.set_value(np.random.randn(no_features, no_hidden1)*.01)
-    b_h1.set_value(np.random.randn(no_hidden1)*0.01)
+    precision.set_value(w_o, np.random.randn(no_hidden1)*.01)
+    precision.set_value(b_o, np.random.randn()*.01)
+    precision.set_value(w_h1, np.random.randn(no_features, no_hidden1)*.01)
+    precision.set_value(b_h1, np.random.randn(no_hidden1)*0.01)
 
     min_cost = 1e+15
     min_accuracy = 1e+15
@@ -276,9 +405,9 @@ for fold in range(noFolds):
     for epoch in range(epochs):
         n = trainX.shape[0]
         train_cost = 0
-        for start_batch, end_batch in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            train_cost += train(trainX[start_batch:end_batch], np.transpose(trainY[start_batch:end_batch]))
-        pred, test_cost, test_accuracy = test(testX, np.transpose(testY))
+        for index in range(n // batch_size):
+            train_cost += train(index)
+        pred, test_cost, test_accuracy = test()
         epochs_test_cost.append(test_cost)
         epochs_test_accuracy.append(test_accuracy)
         epochs_train_cost.append(train_cost/(n // batch_size))
@@ -304,20 +433,13 @@ print("fold_train_cost")
 pprint.pprint(fold_test_accuracy)
 
 #Plots
-plt.figure()
-plt.plot(range(epochs), fold_train_cost, label='train error')
-plt.plot(range(epochs), fold_test_cost, label = 'test error')
-plt.xlabel('Epochs')
-plt.ylabel('Mean Squared Error')
-plt.title('Training and Test Errors at Alpha = %.5f'%best_learning_rate)
-plt.legend()
-plt.savefig('p_1b_sample_mse.png')
-plt.show()
-
-plt.figure()
-plt.plot(range(epochs), fold_test_accuracy)
-plt.xlabel('Epochs')
-plt.ylabel('Accuracy')
-plt.title('Test Accuracy')
-plt.savefig('p_1b_sample_accuracy.png')
-plt.show()
\ No newline at end of file
+figures.plot('p_1b_sample_mse.png', [(range(epochs), fold_train_cost, 'train error'),
+                                     (range(epochs), fold_test_cost, 'test error')],
+             xlabel='Epochs', ylabel='Mean Squared Error',
+             title='Training and Test Errors at Alpha = %.5f'%best_learning_rate, legend='best')
+
+figures.plot('p_1b_sample_accuracy.png', [(range(epochs), fold_test_accuracy, None)],
+             xlabel='Epochs', ylabel='Accuracy',
+             title='Test Accuracy')
+
+figures.close()
@@ -5,18 +5,27 @@ import numpy as np
 import theano
 import theano.tensor as T
 
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, crossval, earlystop, precision, plots, sweep, warmstart, resident
+from nnutils.earlystop import EarlyStopping
 
 from sklearn.model_selection import KFold
 
 np.random.seed(10)
 
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
 epochs = 1000
+patience = 100 # epochs without a better validation cost before a run stops
 batch_size = 256
 no_hidden1 = 20
 learning_rate = 0.00001 # Optimal learning rate
 noExps = 10
+search = 'grid' # or 'halving': train every size for halving_epochs[0], keep the better half for the next budget
+                # or 'warm': train the sizes of a fold from small to large, each widened from the one before
+halving_epochs = [50, 200, 1000]
 
 floatX = theano.config.floatX
 
@@ -38,7 +47,7 @@ def shuffle_data (samples, labels):
     return samples, labels
 
 def init_bias(n = 1):
-    return(theano.shared(np.zeros(n), theano.config.floatX))
+    return(precision.shared(np.zeros(n)))
 
 def init_weights(n_in=1, n_out=1, logistic=True):
     W_values = np.random.uniform(low=-np.sqrt(6. / (n_in + n_out)),
@@ -46,10 +55,10 @@ def init_weights(n_in=1, n_out=1, logistic=True):
                                  size=(n_in, n_out))
     if logistic == True:
         W_values *= 4
-    return(theano.shared(W_values, theano.config.floatX))
+    return(precision.shared(W_values))
 
 def set_bias(b, n = 1):
-    b.set_value(np.zeros(n))
+    precision.set_value(b, np.zeros(n))
 
 def set_weights(w, n_in=1, n_out=1, logistic=True):
     W_values = np.random.uniform(low=-np.sqrt(6. / (n_in + n_out)),
@@ -57,26 +66,24 @@ def set_weights(w, n_in=1, n_out=1, logistic=True):
                                  size=(n_in, n_out))
     if logistic == True:
         W_values *= 4
-    w.set_value(W_values)
+    precision.set_value(w, W_values)
 
 #read and divide data into test and train sets 
-cal_housing = np.loadtxt('../../data/cal_housing.data', delimiter=',')
-X_data, Y_data = cal_housing[:,:8], cal_housing[:,-1]
-Y_data = (np.asmatrix(Y_data)).transpose()
+X_data, Y_data = datasets.cal_housing('../../data/cal_housing.data')
 
 no_features = X_data.shape[1] 
 x = T.matrix('x') # data sample
-d = T.matrix('d') # desired output
+d = T.vector('d') # desired output
 no_samples = T.scalar('no_samples')
 
 # # learning rate
-alpha = theano.shared(learning_rate, floatX)
+alpha = precision.shared(learning_rate)
 
 # initialize weights and biases for hidden layer(s) and output layer
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX ) 
-b_o = theano.shared(np.random.randn()*.01, floatX)
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX )
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+w_o = precision.shared(np.random.randn(no_hidden1)*.01) 
+b_o = precision.shared(np.random.randn()*.01)
+w_h1 = precision.shared(np.random.randn(no_features, no_hidden1)*.01)
+b_h1 = precision.shared(np.random.randn(no_hidden1)*0.01)
 
 #Define mathematical expression:
 h1_out = T.nnet.sigmoid(T.dot(x, w_h1) + b_h1)
@@ -88,25 +95,24 @@ accuracy = T.mean(d - y)
 #define gradients
 dw_o, db_o, dw_h, db_h = T.grad(cost, [w_o, b_o, w_h1, b_h1])
 
-train = theano.function(
-        inputs = [x, d],
-        outputs = cost,
+# the current fold stays in theano storage and train only receives a minibatch
+# index; every fold copies its rows into the same shared variables
+trainX_s, trainY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+testX_s, testY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+
+train = resident.batch_function(
+        [x, d], [trainX_s, trainY_s], cost, batch_size,
         updates = [[w_o, w_o - alpha*dw_o],
                    [b_o, b_o - alpha*db_o],
                    [w_h1, w_h1 - alpha*dw_h],
-                   [b_h1, b_h1 - alpha*db_h]],
-        allow_input_downcast=True
+                   [b_h1, b_h1 - alpha*db_h]]
         )
 
-test = theano.function(
-    inputs = [x, d],
-    outputs = [y, cost, accuracy],
-    allow_input_downcast=True
-    )
+test = resident.full_function([x, d], [testX_s, testY_s], [y, cost, accuracy])
 
 min_error = 1e+15
 
-alpha.set_value(learning_rate)
+precision.set_value(alpha, learning_rate)
 print(alpha.get_value())
 
 no_hiddens = [20, 30, 40, 50, 60]
@@ -120,75 +126,169 @@ print("nb of features: ", no_features)
 
 print("---------------------")
 
-opt_hidden = []
-exp_test_cost_min = []
-exp_test_cost = []
-exp_train_cost = []
-for exp in range(noExps):
-    start_time = time.time()
-    print(datetime.datetime.now().time(), '- Exp: ', exp+1)
-    X_data, Y_data = shuffle_data(X_data, Y_data)
-    
-    param_test_cost_min = []
-    param_test_cost = []
-    param_train_cost = []
-    for no_hidden1 in no_hiddens:
-        print("    Number of neurons: ", no_hidden1)
-
-        fold_test_cost_min = []
-        fold_test_cost = []
-        fold_train_cost = []
-        for fold in range(noFolds):
-            print("        Folder number: ", fold+1)
-
-            start, end = fold*fold_size, (fold +1)*fold_size
-            testX, testY = X_data[start:end], Y_data[start:end]
-            trainX, trainY = np.append(X_data[:start], X_data[end:], axis=0), np.append(Y_data[:start], Y_data[end:], axis=0)
-
-            trainX = normalize(trainX)
-            testX = normalize(testX)
-
-            print("            testX shape: ", testX.shape)
-            print("            testY shape: ", testY.shape)
-
-            w_o.set_value(np.random.randn(no_hidden1)*.01)
-            b_o.set_value(np.random.randn()*.01)
-            w_h1.set_value(np.random.randn(no_features, no_hidden1)*.01)
-            b_h1.set_value(np.random.randn(no_hidden1)*0.01)
-
-            min_cost = 1e+15
-            min_accuracy = 1e+15
-            epochs_test_cost_min = []
-            epochs_test_cost = []
-            epochs_train_cost = []
-            for epoch in range(epochs):
-                n = trainX.shape[0]
-                train_cost = 0
-                for start_batch, end_batch in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-                    train_cost += train(trainX[start_batch:end_batch], np.transpose(trainY[start_batch:end_batch]))
-                pred, test_cost, test_accuracy = test(testX, np.transpose(testY))
-                epochs_test_cost.append(test_cost)
-                epochs_train_cost.append(train_cost/(n // batch_size))
-
-                if test_cost < min_cost:
-                    min_cost = test_cost
-                if test_accuracy < min_accuracy:
-                    min_accuracy = test_accuracy
-
-            fold_test_cost_min.append(min_cost)
-            fold_test_cost.append(epochs_test_cost)
-            fold_train_cost.append(epochs_train_cost)
-
-        param_test_cost_min.append(np.mean(fold_test_cost_min))
-        param_test_cost.append(np.mean(fold_test_cost, axis=0))
-        param_train_cost.append(np.mean(fold_train_cost, axis=0))
-
-    exp_test_cost.append(param_test_cost)
-    exp_train_cost.append(param_train_cost)
-
-    opt_hidden = np.append(opt_hidden, np.argmin(param_test_cost_min))
-    elapsed_time = time.time() - start_time
-    print("    Elapsed time:", elapsed_time)
+# train and test split of one fold, every run of an experiment sees the same shuffle of the data;
+# the fold is copied into the shared data and its number of training rows returned
+def fold_data(exp, fold):
+    X_data, Y_data = crossval.data
+    idx = np.random.RandomState(crossval.job_seed(10, exp)).permutation(X_data.shape[0])
+    X_data, Y_data = X_data[idx], Y_data[idx]
+
+    start, end = fold*fold_size, (fold +1)*fold_size
+    testX, testY = X_data[start:end], Y_data[start:end]
+    trainX, trainY = np.append(X_data[:start], X_data[end:], axis=0), np.append(Y_data[:start], Y_data[end:], axis=0)
+
+    trainX = normalize(trainX)
+    testX = normalize(testX)
+    resident.set_data([trainX_s, trainY_s, testX_s, testY_s], [trainX, trainY, testX, testY])
+    return trainX.shape[0]
+
+def init_values(no_hidden1):
+    return [np.random.randn(no_hidden1)*.01, np.random.randn()*.01,
+            np.random.randn(no_features, no_hidden1)*.01, np.random.randn(no_hidden1)*0.01]
+
+def train_epoch(n):
+    train_cost = 0
+    for index in range(n // batch_size):
+        train_cost += train(index)
+    return train_cost/(n // batch_size)
+
+# one training run, called in a worker process with the data in crossval.data
+def run_fold(exp, no_hidden1, fold):
+    np.random.seed(crossval.job_seed(10, exp, no_hidden1, fold))
+    n = fold_data(exp, fold)
+
+    print(datetime.datetime.now().time(), '- Exp: ', exp+1, "Number of neurons: ", no_hidden1, "Folder number: ", fold+1)
+
+    for p, v in zip([w_o, b_o, w_h1, b_h1], init_values(no_hidden1)):
+        precision.set_value(p, v)
+
+    stopper = EarlyStopping([w_o, b_o, w_h1, b_h1], patience)
+    min_cost = 1e+15
+    min_accuracy = 1e+15
+    epochs_test_cost = []
+    epochs_train_cost = []
+    for epoch in range(epochs):
+        epochs_train_cost.append(train_epoch(n))
+        pred, test_cost, test_accuracy = test()
+        epochs_test_cost.append(test_cost)
+
+        if test_cost < min_cost:
+            min_cost = test_cost
+        if test_accuracy < min_accuracy:
+            min_accuracy = test_accuracy
+
+        if stopper.step(epoch, test_cost):
+            break
+    stopper.restore()
+
+    epochs_test_cost = earlystop.fill(epochs_test_cost, epochs)
+    epochs_train_cost = earlystop.fill(epochs_train_cost, epochs)
+    return min_cost, epochs_test_cost, epochs_train_cost, stopper.stop_epoch
+
+# all hidden sizes on one fold by successive halving: each model keeps its
+# weights and early stopping state between rungs and only the better half
+# is trained on; a dropped size keeps the best cost it reached
+def run_fold_halving(exp, fold, no_hiddens):
+    np.random.seed(crossval.job_seed(10, exp, fold))
+    n = fold_data(exp, fold)
+
+    print(datetime.datetime.now().time(), '- Exp: ', exp+1, "Folder number: ", fold+1)
+
+    params = [w_o, b_o, w_h1, b_h1]
+    values = [init_values(no_hidden1) for no_hidden1 in no_hiddens]
+    stoppers = [EarlyStopping(params, patience) for no_hidden1 in no_hiddens]
+    test_cost = [[] for no_hidden1 in no_hiddens]
+    train_cost = [[] for no_hidden1 in no_hiddens]
+
+    def advance(alive, rung_epochs):
+        for m in alive:
+            for p, v in zip(params, values[m]):
+                precision.set_value(p, v)
+            while len(test_cost[m]) < rung_epochs and not stoppers[m].stopped:
+                train_cost[m].append(train_epoch(n))
+                test_cost[m].append(test()[1])
+                stoppers[m].step(len(test_cost[m]) - 1, test_cost[m][-1])
+            values[m] = [p.get_value() for p in params]
+        return [stoppers[m].best for m in alive]
+
+    min_cost, budgets = sweep.successive_halving(len(no_hiddens), advance, halving_epochs)
+    return (min_cost, np.array([earlystop.fill(c, epochs) for c in test_cost]),
+            np.array([earlystop.fill(c, epochs) for c in train_cost]),
+            np.array([stopper.stop_epoch for stopper in stoppers]))
+
+# all hidden sizes on one fold, smallest first; every larger network starts
+# as a function-preserving widening of the converged smaller one
+def run_fold_warm(exp, fold, no_hiddens):
+    np.random.seed(crossval.job_seed(10, exp, fold))
+    n = fold_data(exp, fold)
+
+    params = [w_o, b_o, w_h1, b_h1]
+    min_cost, test_curves, train_curves, stop_epochs, provenance = {}, {}, {}, {}, {}
+    source = None
+    for no_hidden1 in sorted(no_hiddens):
+        print(datetime.datetime.now().time(), '- Exp: ', exp+1, "Number of neurons: ", no_hidden1, "Folder number: ", fold+1)
+        if source is None:
+            values = init_values(no_hidden1)
+            provenance[no_hidden1] = warmstart.provenance('cold')
+        else:
+            new_h1, new_b_h1, new_o = warmstart.widen(w_h1.get_value(), b_h1.get_value(), w_o.get_value(), no_hidden1)
+            values = [new_o, b_o.get_value(), new_h1, new_b_h1]
+            provenance[no_hidden1] = warmstart.provenance('widened', source, width=no_hidden1)
+        for p, v in zip(params, values):
+            precision.set_value(p, v)
+
+        stopper = EarlyStopping(params, patience)
+        test_cost, train_cost = [], []
+        for epoch in range(epochs):
+            train_cost.append(train_epoch(n))
+            test_cost.append(test()[1])
+            if stopper.step(epoch, test_cost[-1]):
+                break
+        stopper.restore()
+
+        min_cost[no_hidden1], stop_epochs[no_hidden1] = stopper.best, stopper.stop_epoch
+        test_curves[no_hidden1] = earlystop.fill(test_cost, epochs)
+        train_curves[no_hidden1] = earlystop.fill(train_cost, epochs)
+        source = no_hidden1
+
+    return (np.array([min_cost[h] for h in no_hiddens]), np.array([test_curves[h] for h in no_hiddens]),
+            np.array([train_curves[h] for h in no_hiddens]), np.array([stop_epochs[h] for h in no_hiddens]),
+            warmstart.encode([provenance[h] for h in no_hiddens]))
+
+# the noExps x no_hiddens x noFolds runs are independent, spread them over all cores;
+# finished runs are kept in sweeps/, a rerun only trains new or changed configs.
+# A grid run is one size, so adding a size or an experiment only trains the
+# new ones; halving and warm compare or chain the sizes of a fold, so their
+# runs are keyed by the whole list.
+start_time = time.time()
+settings = {'epochs': epochs, 'patience': patience, 'batch_size': batch_size,
+            'learning_rate': learning_rate, 'noFolds': noFolds, 'search': search}
+if search in ('halving', 'warm'):
+    configs = sweep.grid(exp=range(noExps), fold=range(noFolds), no_hiddens=[no_hiddens])
+    if search == 'halving':
+        settings['halving_epochs'] = halving_epochs
+        results = sweep.run(run_fold_halving, configs, [X_data, Y_data], sweep.Store('sweeps/no_hiddens'), settings)
+    else:
+        results = sweep.run(run_fold_warm, configs, [X_data, Y_data], sweep.Store('sweeps/no_hiddens'), settings)
+        print("warm start of exp 1, fold 1: ", warmstart.decode(results[0][4]))
+    # (noExps, noFolds) jobs of all sizes -> one result per (exp, size, fold) as in a grid search
+    results = [tuple(r[i][param] for i in range(4)) for exp in range(noExps) for param in range(len(no_hiddens))
+               for r in results[exp*noFolds:(exp+1)*noFolds]]
+else:
+    configs = sweep.grid(exp=range(noExps), no_hidden1=no_hiddens, fold=range(noFolds))
+    results = sweep.run(run_fold, configs, [X_data, Y_data], sweep.Store('sweeps/no_hiddens'), settings)
+print("Elapsed time:", time.time() - start_time)
+
+fold_test_cost_min = np.reshape([r[0] for r in results], (noExps, len(no_hiddens), noFolds))
+fold_test_cost = np.reshape([r[1] for r in results], (noExps, len(no_hiddens), noFolds, epochs))
+fold_train_cost = np.reshape([r[2] for r in results], (noExps, len(no_hiddens), noFolds, epochs))
+
+param_test_cost_min = np.mean(fold_test_cost_min, axis=2)
+exp_test_cost = np.mean(fold_test_cost, axis=2)
+exp_train_cost = np.mean(fold_train_cost, axis=2)
+opt_hidden = np.argmin(param_test_cost_min, axis=1)
+stop_epochs = np.reshape([r[3] for r in results], (noExps, len(no_hiddens), noFolds))
+print("mean stop epoch per no of hidden neurons: ", np.mean(stop_epochs, axis=(0, 2)))
 
 print("opt_hidden: ", opt_hidden)
 
@@ -199,41 +299,36 @@ exp_train_cost = np.mean(exp_train_cost, axis=0)
 print("exp_train_cost")
 pprint.pprint(exp_train_cost)
 
-plt.figure()
 counts = []
 for n in range(len(no_hiddens)):
     counts = np.append(counts, np.sum(opt_hidden == n))
 print("counts: ", counts)
-plt.bar(np.arange(1, len(no_hiddens)+1), counts)
-plt.xticks(np.arange(1, len(no_hiddens)+1), no_hiddens)
-plt.xlabel('number of hidden neurons')
-plt.ylabel('number of experiments')
-plt.title('distribution of optimal no of hidden neurons')
-plt.savefig('figure_t6.q1b_2.png')
-plt.show()
+figures.bar('figure_t6.q1b_2.png', np.arange(1, len(no_hiddens)+1), counts,
+            xticks=(np.arange(1, len(no_hiddens)+1), no_hiddens),
+            xlabel='number of hidden neurons', ylabel='number of experiments',
+            title='distribution of optimal no of hidden neurons')
 
 #Plots
-plt.figure()
+series = []
 for idx, no_hidden1 in enumerate(no_hiddens):
-    plt.plot(range(epochs), exp_train_cost[idx], label=('train error '+str(no_hidden1)))
-plt.xlabel('Epochs')
-plt.ylabel('Mean Squared Error')
-plt.title('Training Errors')
-plt.legend()
-plt.savefig('p_1b_sample_mse.png')
-plt.show()
+    series.append((range(epochs), exp_train_cost[idx], 'train error '+str(no_hidden1)))
+figures.plot('p_1b_sample_mse.png', series,
+             xlabel='Epochs', ylabel='Mean Squared Error',
+             title='Training Errors', legend='best')
 
 # --------------------------------------------------------------------------------------------------------
 
+X_data, Y_data = shuffle_data(X_data, Y_data)
+
 no_hidden1 = 60 # Optimal no of hidden
 best_learning_rate = 0.00001 # Optimal learning rate
-alpha.set_value(best_learning_rate)
+precision.set_value(alpha, best_learning_rate)
 print(alpha.get_value())
 
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX ) 
-b_o = theano.shared(np.random.randn()*.01, floatX)
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX )
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+w_o = precision.shared(np.random.randn(no_hidden1)*.01) 
+b_o = precision.shared(np.random.randn()*.01)
+w_h1 = precision.shared(np.random.randn(no_features, no_hidden1)*.01)
+b_h1 = precision.shared(np.random.randn(no_hidden1)*0.01)
 
 fold_test_cost_min = []
 fold_test_cost = []
@@ -248,14 +343,15 @@ for fold in range(noFolds):
 
     trainX = normalize(trainX)
     testX = normalize(testX)
+    resident.set_data([trainX_s, trainY_s, testX_s, testY_s], [trainX, trainY, testX, testY])
 
     print("            testX shape: ", testX.shape)
     print("            testY shape: ", testY.shape)
 
-    w_o.set_value(np.random.randn(no_hidden1)*.01)
-    b_o.set_value(np.random.randn()*.01)
-    w_h1.set_value(np.random.randn(no_features, no_hidden1)*.01)
-    b_h1.set_value(np.random.randn(no_hidden1)*0.01)
+    precision.set_value(w_o, np.random.randn(no_hidden1)*.01)
+    precision.set_value(b_o, np.random.randn()*.01)
+    precision.set_value(w_h1, np.random.randn(no_features, no_hidden1)*.01)
+    precision.set_value(b_h1, np.random.randn(no_hidden1)*0.01)
 
     min_cost = 1e+15
     min_accuracy = 1e+15
@@ -266,9 +362,9 @@ for fold in range(noFolds):
     for epoch in range(epochs):
         n = trainX.shape[0]
         train_cost = 0
-        for start_batch, end_batch in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            train_cost += train(trainX[start_batch:end_batch], np.transpose(trainY[start_batch:end_batch]))
-        pred, test_cost, test_accuracy = test(testX, np.transpose(testY))
+        for index in range(n // batch_size):
+            train_cost += train(index)
+        pred, test_cost, test_accuracy = test()
         epochs_test_cost.append(test_cost)
         epochs_test_accuracy.append(test_accuracy)
         epochs_train_cost.append(train_cost/(n // batch_size))
@@ -294,20 +390,13 @@ print("fold_train_cost")
 pprint.pprint(fold_test_accuracy)
 
 #Plots
-plt.figure()
-plt.plot(range(epochs), fold_train_cost, label='train error')
-plt.plot(range(epochs), fold_test_cost, label='test error')
-plt.xlabel('Epochs')
-plt.ylabel('Mean Squared Error')
-plt.title('Training and Test Errors at no hidden = %d'%no_hidden1)
-plt.legend()
-plt.savefig('p_1b_sample_mse.png')
-plt.show()
-
-plt.figure()
-plt.plot(range(epochs), fold_test_accuracy)
-plt.xlabel('Epochs')
-plt.ylabel('Accuracy')
-plt.title('Test Accuracy')
-plt.savefig('p_1b_sample_accuracy.png')
-plt.show()
\ No newline at end of file
+figures.plot('p_1b_sample_mse.png', [(range(epochs), fold_train_cost, 'train error'),
+                                     (range(epochs), fold_test_cost, 'test error')],
+             xlabel='Epochs', ylabel='Mean Squared Error',
+             title='Training and Test Errors at no hidden = %d'%no_hidden1, legend='best')
+
+figures.plot('p_1b_sample_accuracy.png', [(range(epochs), fold_test_accuracy, None)],
+             xlabel='Epochs', ylabel='Accuracy',
+             title='Test Accuracy')
+
+figures.close()
@@ -4,13 +4,19 @@ import numpy as np
 import theano
 import theano.tensor as T
 
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+import sys
+sys.path.insert(0, '../../..')
+from nnutils import datasets, precision, earlystop, resident, plots
+from nnutils.earlystop import EarlyStopping
 
 
 np.random.seed(10)
 
+# figures are rendered in worker processes forked before training starts
+figures = plots.Sink()
+
 epochs = 1000
+patience = 100 # epochs without a better validation cost before a fold stops
 batch_size = 256
 no_hidden1 = 60
 learning_rate = 0.0001
@@ -36,26 +42,24 @@ def shuffle_data (samples, labels):
     return samples, labels
 
 #read and divide data into test and train sets
-cal_housing = np.loadtxt('../../data/cal_housing.data', delimiter=',')
-X_data, Y_data = cal_housing[:,:8], cal_housing[:,-1]
-Y_data = (np.asmatrix(Y_data)).transpose()
+X_data, Y_data = datasets.cal_housing('../../data/cal_housing.data')
 
 X_data, Y_data = shuffle_data(X_data, Y_data)
 
 no_features = X_data.shape[1] 
 x = T.matrix('x') # data sample
-d = T.matrix('d') # desired output
+d = T.vector('d') # desired output
 no_samples = T.scalar('no_samples')
 
 # initialize weights and biases for hidden layer(s) and output layer
-w_h1 = theano.shared(np.random.randn(no_features, no_hidden1)*.01, floatX)
-b_h1 = theano.shared(np.random.randn(no_hidden1)*0.01, floatX)
+w_h1 = precision.shared(np.random.randn(no_features, no_hidden1)*.01)
+b_h1 = precision.shared(np.random.randn(no_hidden1)*0.01)
 
-w_o = theano.shared(np.random.randn(no_hidden1)*.01, floatX)
-b_o = theano.shared(np.random.randn()*.01, floatX)
+w_o = precision.shared(np.random.randn(no_hidden1)*.01)
+b_o = precision.shared(np.random.randn()*.01)
 
 # learning rate
-alpha = theano.shared(learning_rate, floatX)
+alpha = precision.shared(learning_rate)
 
 #Define mathematical expression:
 h1_out = T.nnet.sigmoid(T.dot(x, w_h1) + b_h1)
@@ -68,25 +72,26 @@ accuracy = T.mean(d - y)
 #define gradients
 dw_o, db_o, dw_h1, db_h1 = T.grad(cost, [w_o, b_o, w_h1, b_h1]) # 3-layer
 
-train = theano.function(
-        inputs = [x, d],
-        outputs = cost,
+# the current fold stays in theano storage and train only receives a minibatch
+# index; every fold copies its rows into the same shared variables
+trainX_s, trainY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+testX_s, testY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+validX_s, validY_s = resident.to_shared(np.zeros((0, no_features))), resident.to_shared(np.zeros(0))
+
+train = resident.batch_function(
+        [x, d], [trainX_s, trainY_s], cost, batch_size,
         updates = [[w_o, w_o - alpha*dw_o],
                    [b_o, b_o - alpha*db_o],
                    [w_h1, w_h1 - alpha*dw_h1],
-                   [b_h1, b_h1 - alpha*db_h1]],
-        allow_input_downcast=True
+                   [b_h1, b_h1 - alpha*db_h1]]
         ) # 3-layer
 
-test = theano.function(
-    inputs = [x, d],
-    outputs = [y, cost, accuracy],
-    allow_input_downcast=True
-    )
+test = resident.full_function([x, d], [testX_s, testY_s], [y, cost, accuracy])
+valid = resident.full_function([x, d], [validX_s, validY_s], cost)
 
 min_error = 1e+15
 
-alpha.set_value(learning_rate)
+precision.set_value(alpha, learning_rate)
 print(alpha.get_value())
 
 noFolds = 5
@@ -98,24 +103,32 @@ fold_test_cost_min = []
 fold_test_cost = []
 fold_train_cost = []
 fold_test_accuracy = []
+stop_epochs = []
 for fold in range(noFolds):
     print("        Folder number: ", fold+1)
 
     start, end = fold*fold_size, (fold +1)*fold_size
     testX, testY = X_data[start:end], Y_data[start:end]
     trainX, trainY = np.append(X_data[:start], X_data[end:], axis=0), np.append(Y_data[:start], Y_data[end:], axis=0)
+    # stop on a fifth of the training folds, the test fold is only reported
+    train_rows, valid_rows = earlystop.holdout(len(trainX), seed=fold)
+    trainX, trainY, validX, validY = trainX[train_rows], trainY[train_rows], trainX[valid_rows], trainY[valid_rows]
 
     trainX = normalize(trainX)
+    validX = normalize(validX)
     testX = normalize(testX)
+    resident.set_data([trainX_s, trainY_s, validX_s, validY_s, testX_s, testY_s],
+                      [trainX, trainY, validX, validY, testX, testY])
 
     print("            testX shape: ", testX.shape)
     print("            testY shape: ", testY.shape)
 
-    w_o.set_value(np.random.randn(no_hidden1)*.01)
-    b_o.set_value(np.random.randn()*.01)
-    w_h1.set_value(np.random.randn(no_features, no_hidden1)*.01)
-    b_h1.set_value(np.random.randn(no_hidden1)*0.01)
+    precision.set_value(w_o, np.random.randn(no_hidden1)*.01)
+    precision.set_value(b_o, np.random.randn()*.01)
+    precision.set_value(w_h1, np.random.randn(no_features, no_hidden1)*.01)
+    precision.set_value(b_h1, np.random.randn(no_hidden1)*0.01)
 
+    stopper = EarlyStopping([w_h1, b_h1, w_o, b_o], patience)
     min_cost = 1e+15
     min_accuracy = 1e+15
     epochs_test_cost_min = []
@@ -125,9 +138,9 @@ for fold in range(noFolds):
     for epoch in range(epochs):
         n = trainX.shape[0]
         train_cost = 0
-        for start_batch, end_batch in zip(range(0, n, batch_size), range(batch_size, n, batch_size)):
-            train_cost += train(trainX[start_batch:end_batch], np.transpose(trainY[start_batch:end_batch]))
-        pred, test_cost, test_accuracy = test(testX, np.transpose(testY))
+        for index in range(n // batch_size):
+            train_cost += train(index)
+        pred, test_cost, test_accuracy = test()
         epochs_test_cost.append(test_cost)
         epochs_test_accuracy.append(test_accuracy)
         epochs_train_cost.append(train_cost/(n // batch_size))
@@ -137,11 +150,20 @@ for fold in range(noFolds):
         if test_accuracy < min_accuracy:
             min_accuracy = test_accuracy
 
+        if stopper.step(epoch, valid()):
+            break
+    stopper.restore()
+    stop_epochs.append(stopper.stop_epoch)
+    epochs_test_cost = earlystop.fill(epochs_test_cost, epochs)
+    epochs_train_cost = earlystop.fill(epochs_train_cost, epochs)
+    epochs_test_accuracy = earlystop.fill(epochs_test_accuracy, epochs)
+
     fold_test_cost_min.append(min_cost)
     fold_test_cost.append(epochs_test_cost)
     fold_train_cost.append(epochs_train_cost)
     fold_test_accuracy.append(epochs_test_accuracy)
 
+print("stop epochs: ", stop_epochs)
 fold_test_cost = np.mean(fold_test_cost, axis=0)
 print("fold_test_cost")
 pprint.pprint(fold_test_cost)
@@ -152,10 +174,7 @@ fold_test_accuracy = np.mean(fold_test_accuracy, axis=0)
 print("fold_train_cost")
 pprint.pprint(fold_test_accuracy)
 
-plt.figure()
-plt.plot(range(epochs), fold_test_accuracy)
-plt.xlabel('Epochs')
-plt.ylabel('Accuracy')
-plt.title('Test Accuracy for 3 layers')
-plt.savefig('p_1b_sample_accuracy.png')
-plt.show()
+figures.plot('p_1b_sample_accuracy.png', [(range(epochs), fold_test_accuracy, None)],
+             xlabel='Epochs', ylabel='Accuracy', title='Test Accuracy for 3 layers')
+
+figures.close()
@@ -1,48 +1,11 @@
-import numpy as np
-import os
+import sys
+sys.path.insert(0, '../../..')
 
-datasets_dir = '../../data/'
-
-def one_hot(x, n):
-	if type(x) == list:
-		x = np.array(x)
-	x = x.flatten()
-	o_h = np.zeros((len(x),n))
-	o_h[np.arange(len(x)),x] = 1
-	return o_h
-
-def mnist(ntrain=60000, ntest=10000, onehot=True):
-	data_dir = os.path.join(datasets_dir,'mnist/')
-	fd = open(os.path.join(data_dir,'train-images.idx3-ubyte'))
-	loaded = np.fromfile(file=fd,dtype=np.uint8)
-	trX = loaded[16:].reshape((60000,28*28)).astype(float)
-
-	fd = open(os.path.join(data_dir,'train-labels.idx1-ubyte'))
-	loaded = np.fromfile(file=fd,dtype=np.uint8)
-	trY = loaded[8:].reshape((60000))
-
-	fd = open(os.path.join(data_dir,'t10k-images.idx3-ubyte'))
-	loaded = np.fromfile(file=fd,dtype=np.uint8)
-	teX = loaded[16:].reshape((10000,28*28)).astype(float)
+from nnutils import idx
 
-	fd = open(os.path.join(data_dir,'t10k-labels.idx1-ubyte'))
-	loaded = np.fromfile(file=fd,dtype=np.uint8)
-	teY = loaded[8:].reshape((10000))
-
-	trX = trX/255.
-	teX = teX/255.
-
-	trX = trX[:ntrain]
-	trY = trY[:ntrain]
-
-	teX = teX[:ntest]
-	teY = teY[:ntest]
+datasets_dir = '../../data/'
 
-	if onehot:
-		trY = one_hot(trY, 10)
-		teY = one_hot(teY, 10)
-	else:
-		trY = np.asarray(trY)
-		teY = np.asarray(teY)
+one_hot = idx.one_hot
 
-	return trX,teX,trY,teY
+def mnist(ntrain=None, ntest=None, onehot=True):
+	return idx.mnist(datasets_dir, ntrain, ntest, onehot)
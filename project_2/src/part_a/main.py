@@ -1,6 +1,10 @@
 from load import mnist
+from nnutils import compiled, plots, inference, evaluation, checkpoint, timing, montage, precision, lrfind, losses, crossval, sweep
+from nnutils.batches import Minibatches
+from nnutils.prefetch import Prefetcher, cast
+import os
+import time
 import numpy as np
-import pylab
 
 import theano
 from theano import tensor as T
@@ -19,6 +23,7 @@ decayparameterRMS = 1e-4
 p = 0.9
 ebs = 1e-6
 learningrateRMS = 0.001
+lr_range_test = False # run a learning-rate range test for each optimizer and print the suggested rates
 
 
 def init_weights_bias4(filter_shape, d_type):
@@ -77,9 +82,10 @@ def model(X, w1, b1, w2, b2, w3, b3, w4, b4):
     o3 = T.flatten(o2, outdim=2)
 
     y3 = T.nnet.sigmoid(T.dot(o3, w3) + b3)
-    pyx = T.nnet.softmax(T.dot(y3, w4) + b4)
+    # softmax is folded into the loss
+    logits = T.dot(y3, w4) + b4
 
-    return y1, o1, y2, o2, pyx
+    return y1, o1, y2, o2, logits
 
 def sgd(cost, params, lr=0.05, decay=0.0001):
     grads = T.grad(cost=cost, wrt=params)
@@ -110,22 +116,19 @@ def RMSprop(cost, params, lr=0.001, decay=0.0001, rho=0.9, epsilon=1e-6):
         updates.append((p, p - lr * (g+ decay*p)))
     return updates
 
-def shuffle_data (samples, labels):
-    idx = np.arange(samples.shape[0])
-    np.random.shuffle(idx)
-    samples, labels = samples[idx], labels[idx]
-    return samples, labels
+trX, teX, trY, teY = mnist(ntrain=12000, ntest=2000, onehot=False)
 
-trX, teX, trY, teY = mnist(onehot=True)
+# figures are rendered headless in worker processes while training continues
+figures = plots.Sink()
 
 trX = trX.reshape(-1, 1, 28, 28)
 teX = teX.reshape(-1, 1, 28, 28)
 
-trX, trY = trX[:12000], trY[:12000]
-teX, teY = teX[:2000], teY[:2000]
+# batches are gathered and cast to floatX in a background thread while train runs
+batches = Prefetcher(Minibatches([trX, trY], batch_size), depth=4, transform=cast(theano.config.floatX))
 
 X = T.tensor4('X')
-Y = T.matrix('Y')
+Y = T.ivector('Y') # class labels
 print('xd200')
 num_filters1 = 15
 num_filters2 = 20
@@ -134,129 +137,146 @@ w2, b2 = init_weights_bias4((num_filters2, num_filters1, 5, 5), X.dtype)
 w3, b3 = init_weights_bias2((num_filters2*3*3, 100), X.dtype)
 w4, b4 = init_weights_bias2((100, 10), X.dtype)
 
-y1, o1, y2, o2, py_x  = model(X, w1, b1, w2, b2, w3, b3, w4, b4)
+y1, o1, y2, o2, logits = model(X, w1, b1, w2, b2, w3, b3, w4, b4)
 
-y_x = T.argmax(py_x, axis=1)
+y_x = T.argmax(logits, axis=1)
 
-cost = T.mean(T.nnet.categorical_crossentropy(py_x, Y))
+cost = T.mean(losses.softmax_cross_entropy(logits, Y))
 params = [w1, b1, w2, b2, w3, b3, w4, b4]
 
-updates = sgd(cost, params, learningrate, decayparameter)
-updates2 = sgd_momentum(cost, params, learningrate, decayparameter, momentum)
-updates3 = RMSprop(cost, params, learningrateRMS, decayparameterRMS, p, ebs)
-
-train = theano.function(inputs=[X, Y], outputs=cost, updates=updates, allow_input_downcast=True)
-train2 = theano.function(inputs=[X, Y], outputs=cost, updates=updates2, allow_input_downcast=True)
-train3 = theano.function(inputs=[X, Y], outputs=cost, updates=updates3, allow_input_downcast=True)
-
-predict = theano.function(inputs=[X], outputs=y_x, allow_input_downcast=True)
-test = theano.function(inputs = [X], outputs=[y1, o1, y2, o2], allow_input_downcast=True)
-
-
-a = []
-trainCost = []
-a2 = []
-trainCost2 = []
-a3 = []
-trainCost3 = []
-
-for i in range(noIters):
-    trX, trY = shuffle_data (trX, trY)
-    teX, teY = shuffle_data (teX, teY)
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train(trX[start:end], trY[start:end])
-    a.append(np.mean(np.argmax(teY, axis=1) == predict(teX)))
-    trainCost.append(cost/(len(trX) // batch_size))
-    print(a[i])
-
-
-
-print('sgd with momentum ..')
-set_weights_bias4((num_filters1, 1, 9, 9), X.dtype, w1, b1)
-set_weights_bias4((num_filters2, num_filters1, 5, 5), X.dtype, w2, b2)
-set_weights_bias2((num_filters2*3*3, 100), X.dtype, w3, b3)
-set_weights_bias2((100, 10), X.dtype, w4, b4)
-
-for i in range(noIters):
-    trX, trY = shuffle_data (trX, trY)
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train2(trX[start:end], trY[start:end])
-    a2.append(np.mean(np.argmax(teY, axis=1) == predict(teX)))
-    trainCost2.append(cost/(len(trX) // batch_size))
-    print(a[i])
-
-
-print('RMSprop ..')
-set_weights_bias4((num_filters1, 1, 9, 9), X.dtype, w1, b1)
-set_weights_bias4((num_filters2, num_filters1, 5, 5), X.dtype, w2, b2)
-set_weights_bias2((num_filters2*3*3, 100), X.dtype, w3, b3)
-set_weights_bias2((100, 10), X.dtype, w4, b4)
-
-for i in range(noIters):
-    trX, trY = shuffle_data (trX, trY)
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train3(trX[start:end], trY[start:end])
-    a3.append(np.mean(np.argmax(teY, axis=1) == predict(teX)))
-    trainCost3.append(cost/(len(trX) // batch_size))
-    print(a[i])
-
-pylab.figure()
-pylab.plot(range(noIters), a, label='SGD')
-pylab.plot(range(noIters), a2, label='SGD with momentum')
-pylab.plot(range(noIters), a3, label='RMSprop')
-pylab.xlabel('epochs')
-pylab.ylabel('test accuracy')
-pylab.legend(loc='lower right')
-pylab.title('test accuracy ')
-pylab.savefig('testAccuracy')
-
-pylab.figure()
-pylab.plot(range(noIters), trainCost, label='SGD')
-pylab.plot(range(noIters), trainCost2, label='SGD with momentum')
-pylab.plot(range(noIters), trainCost3, label='RMSprop')
-pylab.xlabel('epochs')
-pylab.ylabel('training cost')
-pylab.legend(loc='upper right')
-pylab.title('training cost')
-pylab.savefig('trainingCost')
-
-w = w1.get_value('filters learned')
-pylab.figure()
-pylab.gray()
-for i in range(num_filters1):
-    pylab.subplot(5, 5, i+1); pylab.axis('off'); pylab.imshow(w[i,:,:,:].reshape(9,9))
-pylab.savefig('filtersLearned')
+# shared, so the range test can change the rates of the compiled functions
+lr = precision.shared(learningrate, 'lr')
+lrRMS = precision.shared(learningrateRMS, 'lrRMS')
+updates = sgd(cost, params, lr, decayparameter)
+updates2 = sgd_momentum(cost, params, lr, decayparameter, momentum)
+updates3 = RMSprop(cost, params, lrRMS, decayparameterRMS, p, ebs)
+
+train_mode = compiled.mode_for(noIters*len(batches))
+train = compiled.function(inputs=[X, Y], outputs=cost, updates=updates, mode=train_mode,
+                          profile=timing.profile('train'), allow_input_downcast=True)
+train2 = compiled.function(inputs=[X, Y], outputs=cost, updates=updates2, mode=train_mode,
+                           profile=timing.profile('train2'), allow_input_downcast=True)
+train3 = compiled.function(inputs=[X, Y], outputs=cost, updates=updates3, mode=train_mode,
+                           profile=timing.profile('train3'), allow_input_downcast=True)
+
+predict = compiled.function(inputs=[X], outputs=y_x, profile=timing.profile('predict'), allow_input_downcast=True)
+test = compiled.function(inputs = [X], outputs=[y1, o1, y2, o2], allow_input_downcast=True)
+
+
+print("compile time: %.1fs" % compiled.compile_time)
+
+# a couple of epochs with a growing rate; the weights and optimizer state are put back afterwards
+if lr_range_test:
+    for name, fn, fn_updates, rate in [('sgd', train, updates, lr), ('momentum', train2, updates2, lr),
+                                     ('rmsprop', train3, updates3, lrRMS)]:
+        print(name)
+        lrfind.range_test(fn, rate, batches, params, checkpoint.slots(fn_updates, params),
+                          lo=1e-6, hi=1., steps=200).report()
+start_time = time.time()
+# NNUTILS_TIMING=1 reports the time per phase, NNUTILS_PROFILE=train,... the top ops
+phases = timing.Phases()
+
+# test accuracy on a fixed stratified subsample of 500 images, with a full pass
+# over the 2000 test images whenever the estimate improves and after the last
+# epoch; each run reports both and the plot shades the subsample's 95% CI
+eval_rows = evaluation.stratified_subsample(teY, 500)
+evaluator = evaluation.Evaluator(lambda rows: teY[rows] == predict(teX[rows]),
+                                 noIters, subsample=eval_rows, full_on_improve=True)
+
+# each optimizer run is checkpointed to checkpoints/<name> every few epochs
+# and continues from there when the script is started again
+checkpoint_every = 10
+writer = checkpoint.Writer()
+
+def resume(name, updates, accuracy, costs):
+    path = os.path.join('checkpoints', name)
+    if not checkpoint.exists(path):
+        return 0
+    ckpt = checkpoint.load(path)
+    ckpt.restore(params, checkpoint.slots(updates, params))
+    accuracy.extend(ckpt.history['accuracy'])
+    costs.extend(ckpt.history['cost'])
+    print('resuming %s after epoch %d' % (name, ckpt.epoch + 1))
+    return ckpt.epoch + 1
+
+def save(name, updates, epoch, accuracy, costs):
+    if (epoch + 1) % checkpoint_every == 0 or epoch == noIters - 1:
+        writer.save(os.path.join('checkpoints', name), params, checkpoint.slots(updates, params),
+                    epoch=epoch, history={'accuracy': accuracy, 'cost': costs})
+
+# one optimizer run from freshly initialized weights; returns the test
+# accuracy and training cost per epoch and the accuracy's 95% band
+optimizers = {'sgd': (train, updates), 'momentum': (train2, updates2), 'rmsprop': (train3, updates3)}
+
+def run_optimizer(name):
+    print(name + ' ..')
+    train_fn, name_updates = optimizers[name]
+    np.random.seed(crossval.job_seed(10, sorted(optimizers).index(name)))
+    set_weights_bias4((num_filters1, 1, 9, 9), X.dtype, w1, b1)
+    set_weights_bias4((num_filters2, num_filters1, 5, 5), X.dtype, w2, b2)
+    set_weights_bias2((num_filters2*3*3, 100), X.dtype, w3, b3)
+    set_weights_bias2((100, 10), X.dtype, w4, b4)
+    for s in checkpoint.slots(name_updates, params):
+        s.set_value(np.zeros_like(s.get_value()))
+
+    accuracy = []
+    costs = []
+    evaluator.reset()
+    for i in range(resume(name, name_updates, accuracy, costs), noIters):
+        for batchX, batchY in phases.iterate('data', batches):
+            with phases('train'):
+                cost = train_fn(batchX, batchY)
+        with phases('eval'):
+            accuracy.append(evaluator.step(i))
+        costs.append(cost/len(batches))
+        print(accuracy[i])
+        with phases('checkpoint'):
+            save(name, name_updates, i, accuracy, costs)
+    evaluator.report(name)
+    # one file per optimizer, for scoring without theano via inference.load_convnet
+    inference.save('weights_%s.npz' % name, [p.get_value() for p in params])
+    # a run restored whole from its last checkpoint evaluated nothing here
+    lo, hi = evaluator.band() if evaluator.evaluated else (accuracy, accuracy)
+    return np.asarray(accuracy), np.asarray(costs), lo, hi
+
+# finished runs are kept in sweeps/, a rerun only trains new or changed
+# optimizers; one process so the runs share the cores the same way
+settings = {'noIters': noIters, 'batch_size': batch_size, 'learningrate': learningrate,
+            'decayparameter': decayparameter, 'momentum': momentum, 'decayparameterRMS': decayparameterRMS,
+            'p': p, 'ebs': ebs, 'learningrateRMS': learningrateRMS}
+(a, trainCost, lo, hi), (a2, trainCost2, lo2, hi2), (a3, trainCost3, lo3, hi3) = sweep.run(
+    run_optimizer, sweep.grid(name=['sgd', 'momentum', 'rmsprop']), [trX, trY, teX, teY],
+    sweep.Store('sweeps/optimizers'), settings, processes=1)
+bands = [(lo, hi), (lo2, hi2), (lo3, hi3)]
+
+writer.close()
+print("training time: %.1fs" % (time.time() - start_time))
+
+plot_start = time.time()
+figures.plot('testAccuracy', [(range(noIters), curve, label, band) for curve, label, band
+                              in zip([a, a2, a3], ['SGD', 'SGD with momentum', 'RMSprop'], bands)],
+             xlabel='epochs', ylabel='test accuracy', title='test accuracy ', legend='lower right')
+
+figures.plot('trainingCost', [(range(noIters), trainCost, 'SGD'),
+                              (range(noIters), trainCost2, 'SGD with momentum'),
+                              (range(noIters), trainCost3, 'RMSprop')],
+             xlabel='epochs', ylabel='training cost', title='training cost', legend='upper right')
+
+w = w1.get_value()
+figures.image('filtersLearned', montage.tile(w[:num_filters1], (9, 9)))
 
 ind = np.random.randint(low=0, high=2000)
 convolved, pooled, convolved2, pooled2 = test(teX[ind:ind+1,:])
 
-pylab.figure('input image')
-pylab.gray()
-pylab.axis('off'); pylab.imshow(teX[ind,:].reshape(28,28))
-pylab.savefig('inputImage')
-
-pylab.figure('first convolved feature maps')
-pylab.gray()
-for i in range(num_filters1):
-    pylab.subplot(5, 5, i+1); pylab.axis('off'); pylab.imshow(convolved[0,i,:].reshape(20,20))
-pylab.savefig('1stConv_layer')
-
-pylab.figure('first pooled feature maps')
-pylab.gray()
-for i in range(5):
-    pylab.subplot(5, 5, i+1); pylab.axis('off'); pylab.imshow(pooled[0,i,:].reshape(10,10))
-pylab.savefig('1stPool_layer')
-
-pylab.figure('second convolved feature maps')
-pylab.gray()
-for i in range(num_filters2):
-    pylab.subplot(5, 5, i+1); pylab.axis('off'); pylab.imshow(convolved2[0,i,:].reshape(6,6))
-pylab.savefig('2stConv_layer')
-
-pylab.figure('second pooled feature maps')
-pylab.gray()
-for i in range(5):
-    pylab.subplot(5, 5, i+1); pylab.axis('off'); pylab.imshow(pooled2[0,i,:].reshape(3,3))
-pylab.savefig('2stPool_layer')
-
-pylab.show()
+figures.image('inputImage', montage.tile(teX[ind:ind+1], (28, 28)), title='input image')
+figures.image('1stConv_layer', montage.tile(convolved[0, :num_filters1], (20, 20)), title='first convolved feature maps')
+figures.image('1stPool_layer', montage.tile(pooled[0, :5], (10, 10)), title='first pooled feature maps')
+figures.image('2stConv_layer', montage.tile(convolved2[0, :num_filters2], (6, 6)), title='second convolved feature maps')
+figures.image('2stPool_layer', montage.tile(pooled2[0, :5], (3, 3)), title='second pooled feature maps')
+phases.add('plot', time.time() - plot_start)
+
+phases.report()
+for fn in [train, train2, train3, predict]:
+    timing.profile_summary(fn)
+
+figures.close()
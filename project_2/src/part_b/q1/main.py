@@ -1,8 +1,10 @@
 from load import mnist
+from nnutils import compiled, features, montage, plots, losses
+from nnutils.batches import Minibatches
+from nnutils.prefetch import Prefetcher, cast
+import time
 import numpy as np
 
-import pylab
-
 import theano
 import theano.tensor as T
 from theano.sandbox.rng_mrg import MRG_RandomStreams as RandomStreams
@@ -21,10 +23,10 @@ def init_weights(n_visible, n_hidden):
 def init_bias(n):
     return theano.shared(value=np.zeros(n,dtype=theano.config.floatX),borrow=True)
 
-trX, teX, trY, teY = mnist()
+trX, teX, trY, teY = mnist(ntrain=12000, ntest=2000)
 
-trX, trY = trX[:12000], trY[:12000]
-teX, teY = teX[:2000], teY[:2000]
+# figures are rendered headless in worker processes while training continues
+figures = plots.Sink()
 
 x = T.fmatrix('x')
 
@@ -36,6 +38,9 @@ training_epochs = 30
 learning_rate = 0.1
 batch_size = 128
 
+# batches are gathered and cast to floatX in a background thread while train runs
+batches = Prefetcher(Minibatches([trX], batch_size, shuffle=False), transform=cast(theano.config.floatX))
+
 #first layer
 W1 = init_weights(28*28, 900)
 b1 = init_bias(900)
@@ -69,163 +74,137 @@ print("lmao familicious fam")
 tilde_x = theano_rng.binomial(size=x.shape, n=1, p=1 - corruption_level,
                               dtype=theano.config.floatX)*x
 y1 = T.nnet.sigmoid(T.dot(tilde_x, W1) + b1)
-z1_1 = T.nnet.sigmoid(T.dot(y1, W1_prime) + b1_prime)
-cost1 = - T.mean(T.sum(x * T.log(z1_1) + (1 - x) * T.log(1 - z1_1), axis=1))
+z1_1_logits = T.dot(y1, W1_prime) + b1_prime
+z1_1 = T.nnet.sigmoid(z1_1_logits)
+cost1 = T.mean(losses.sigmoid_cross_entropy(z1_1_logits, x))
 
-# yy1 = T.fmatrix('yy1')
 y2 = T.nnet.sigmoid(T.dot(y1, W2) + b2)
 z2_2 = T.nnet.sigmoid(T.dot(y2, W2_prime) + b2_prime)
 z1_2 = T.nnet.sigmoid(T.dot(z2_2, W1_prime) + b1_prime)
-cost2 = - T.mean(T.sum(x * T.log(z1_2) + (1 - x) * T.log(1 - z1_2), axis=1))
 
-# yy2 = T.fmatrix('yy2')
 y3 = T.nnet.sigmoid(T.dot(y2, W3) + b3)
 z3_3 = T.nnet.sigmoid(T.dot(y3, W3_prime) + b3_prime)
 z2_3 = T.nnet.sigmoid(T.dot(z3_3, W2_prime) + b2_prime)
 z1_3 = T.nnet.sigmoid(T.dot(z2_3, W1_prime) + b1_prime)
-cost3 = - T.mean(T.sum(x * T.log(z1_3) + (1 - x) * T.log(1 - z1_3), axis=1))
+
+# layers 2 and 3 train on cached outputs of the frozen layers below,
+# corrupted at their own input; each reconstructs that input, the
+# features of the layer below, as in greedy stacked DAE pretraining
+f1 = T.fmatrix('f1')
+tilde_f1 = theano_rng.binomial(size=f1.shape, n=1, p=1 - corruption_level,
+                               dtype=theano.config.floatX)*f1
+y2_f = T.nnet.sigmoid(T.dot(tilde_f1, W2) + b2)
+z2_f_logits = T.dot(y2_f, W2_prime) + b2_prime
+cost2 = T.mean(losses.sigmoid_cross_entropy(z2_f_logits, f1))
+
+f2 = T.fmatrix('f2')
+tilde_f2 = theano_rng.binomial(size=f2.shape, n=1, p=1 - corruption_level,
+                               dtype=theano.config.floatX)*f2
+y3_f = T.nnet.sigmoid(T.dot(tilde_f2, W3) + b3)
+z3_f_logits = T.dot(y3_f, W3_prime) + b3_prime
+cost3 = T.mean(losses.sigmoid_cross_entropy(z3_f_logits, f2))
+
+train_mode = compiled.mode_for(training_epochs*len(batches))
 
 #first layer
 params1 = [W1, b1, b1_prime]
 grads1 = T.grad(cost1, params1)
 updates1 = [(param1, param1 - learning_rate * grad1)
            for param1, grad1 in zip(params1, grads1)]
-train_da1 = theano.function(inputs=[x], outputs=cost1, updates=updates1, allow_input_downcast=True)
-test_da1 = theano.function(inputs=[x], outputs=[tilde_x, y1, z1_1], updates=None, allow_input_downcast=True)
+train_da1 = compiled.function(inputs=[x], outputs=cost1, updates=updates1, mode=train_mode, allow_input_downcast=True)
+test_da1 = compiled.function(inputs=[x], outputs=[tilde_x, y1, z1_1], updates=None, allow_input_downcast=True)
 
 #second layer
 params2 = [W2, b2, b2_prime]
 grads2 = T.grad(cost2, params2)
 updates2 = [(param2, param2 - learning_rate * grad2)
            for param2, grad2 in zip(params2, grads2)]
-train_da2 = theano.function(inputs=[x], outputs=cost2, updates=updates2, allow_input_downcast=True)
-test_da2 = theano.function(inputs=[x], outputs=[y2, z1_2], updates=None, allow_input_downcast=True)
+train_da2 = compiled.function(inputs=[f1], outputs=cost2, updates=updates2, mode=train_mode, allow_input_downcast=True)
+test_da2 = compiled.function(inputs=[x], outputs=[y2, z1_2], updates=None, allow_input_downcast=True)
 
 #third layer
 params3 = [W3, b3, b3_prime]
 grads3 = T.grad(cost3, params3)
 updates3 = [(param3, param3 - learning_rate * grad3)
            for param3, grad3 in zip(params3, grads3)]
-train_da3 = theano.function(inputs=[x], outputs = cost3, updates = updates3, allow_input_downcast = True)
-test_da3 = theano.function(inputs=[x], outputs = [y3, z1_3], updates = None, allow_input_downcast = True)
+train_da3 = compiled.function(inputs=[f2], outputs = cost3, updates = updates3, mode=train_mode, allow_input_downcast = True)
+test_da3 = compiled.function(inputs=[x], outputs = [y3, z1_3], updates = None, allow_input_downcast = True)
+
+#clean encoders of the frozen layers, run once to fill the feature stores
+encode1 = compiled.function(inputs=[x], outputs=T.nnet.sigmoid(T.dot(x, W1) + b1), allow_input_downcast=True)
+encode2 = compiled.function(inputs=[f1], outputs=T.nnet.sigmoid(T.dot(f1, W2) + b2), allow_input_downcast=True)
+
+print("compile time: %.1fs" % compiled.compile_time)
+start_time = time.time()
 
 print('training dae1 ...')
 d1 = []
 for epoch in range(training_epochs):
     # go through trainng set
     c = []
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_da1(trX[start:end])
+    for (batchX,) in batches:
+        cost = train_da1(batchX)
         c.append(cost)
     d1.append(np.mean(c, dtype='float64'))
     print(d1[epoch])
 
 print('training dae2 ...')
+features1 = features.encode_to_store(encode1, trX, 'dae1')
+batches2 = Prefetcher(Minibatches([features1], batch_size, shuffle=False), transform=cast(theano.config.floatX))
 d2 = []
 for epoch in range(training_epochs):
     # go through trainng set
     c = []
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_da2(trX[start:end])
+    for (batchF,) in batches2:
+        cost = train_da2(batchF)
         c.append(cost)
     d2.append(np.mean(c, dtype='float64'))
     print(d2[epoch])
 
 print('training dae3 ...')
+features2 = features.encode_to_store(encode2, features1, 'dae2')
+features.release(features1)
+batches3 = Prefetcher(Minibatches([features2], batch_size, shuffle=False), transform=cast(theano.config.floatX))
 d3 = []
 for epoch in range(training_epochs):
     # go through trainng set
     c = []
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_da3(trX[start:end])
+    for (batchF,) in batches3:
+        cost = train_da3(batchF)
         c.append(cost)
     d3.append(np.mean(c, dtype='float64'))
     print(d3[epoch])
+features.release(features2)
+
+print("training time: %.1fs" % (time.time() - start_time))
 
 #learning curves
-pylab.figure()
-pylab.plot(range(training_epochs), d1, label="first layer")
-pylab.plot(range(training_epochs), d2, label="second layer")
-pylab.plot(range(training_epochs), d3, label="third layer")
-pylab.xlabel('iterations')
-pylab.ylabel('cross-entropy')
-pylab.legend(loc="upper right")
-pylab.title('Learning curves')
-pylab.savefig('learning_curves')
+figures.plot('learning_curves', [(range(training_epochs), d1, "first layer"),
+                                 (range(training_epochs), d2, "second layer"),
+                                 (range(training_epochs), d3, "third layer")],
+             xlabel='iterations', ylabel='cross-entropy', title='Learning curves', legend="upper right")
 
 # weights
 w1 = W1.get_value()
-pylab.figure('first layer weights')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(w1[:,i].reshape(28,28))
-pylab.savefig('firstLayerWeights')
-
+figures.image('firstLayerWeights', montage.tile(w1[:, :100].T, (28, 28)))
 w2 = W2.get_value()
-pylab.figure('second layer weights')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(w2[:,i].reshape(30,30))
-pylab.savefig('secondLayerWeights')
-
+figures.image('secondLayerWeights', montage.tile(w2[:, :100].T, (30, 30)))
 w3 = W3.get_value()
-pylab.figure('third layer weights')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(w3[:,i].reshape(25,25))
-pylab.savefig('thirdLayerWeights')
+figures.image('thirdLayerWeights', montage.tile(w3[:, :100].T, (25, 25)))
 
 # reconstructed images
 tilde_x, yy1, zz1 = test_da1(teX[:100])
 yy2, zz2 = test_da2(teX[:100])
 yy3, zz3 = test_da3(teX[:100])
-
-pylab.figure('original images')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(teX[i,:].reshape(28,28))
-pylab.savefig('inp_image_original')
-
-pylab.figure('noise image input')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(tilde_x[i,:].reshape(28,28))
-pylab.savefig('inp_image_noise')
-
-pylab.figure('reconstructed image first layer')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(zz1[i,:].reshape(28,28))
-pylab.savefig('inp_image_firstLayer')
-
-pylab.figure('reconstructed image second layer')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(zz2[i,:].reshape(28,28))
-pylab.savefig('inp_image_secondLayer')
-
-pylab.figure('reconstructed image third layer')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(zz3[i,:].reshape(28,28))
-pylab.savefig('inp_image_thirdLayer')
+figures.image('inp_image_original', montage.tile(teX[:100], (28, 28)))
+figures.image('inp_image_noise', montage.tile(tilde_x[:100], (28, 28)))
+figures.image('inp_image_firstLayer', montage.tile(zz1[:100], (28, 28)))
+figures.image('inp_image_secondLayer', montage.tile(zz2[:100], (28, 28)))
+figures.image('inp_image_thirdLayer', montage.tile(zz3[:100], (28, 28)))
 
 # hidden layers activation
-pylab.figure('first hidden activation')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(yy1[i,:].reshape(30,30))
-pylab.savefig('activation_firstLayer')
-
-pylab.figure('second hidden activation')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(yy2[i,:].reshape(25,25))
-pylab.savefig('activation_secondLayer')
-
-pylab.figure('third hidden activation')
-pylab.gray()
-for i in range(100):
-    pylab.subplot(10, 10, i+1); pylab.axis('off'); pylab.imshow(yy3[i,:].reshape(20,20))
-pylab.savefig('activation_thirdLayer')
-pylab.show()
+figures.image('activation_firstLayer', montage.tile(yy1[:100], (30, 30)))
+figures.image('activation_secondLayer', montage.tile(yy2[:100], (25, 25)))
+figures.image('activation_thirdLayer', montage.tile(yy3[:100], (20, 20)))
+
+figures.close()
@@ -1,7 +1,10 @@
 from load import mnist
+from nnutils import compiled, plots, features, inference, losses
+from nnutils.batches import Minibatches
+from nnutils.prefetch import Prefetcher, cast
+import time
 import numpy as np
 
-import pylab
 
 import theano
 import theano.tensor as T
@@ -31,13 +34,13 @@ def sgd_momentum(cost, params, lr=0.05, decay=0.0001, momentum=0.1):
         updates.append([v, v_new])
     return updates
 
-trX, teX, trY, teY = mnist()
+trX, teX, trY, teY = mnist(ntrain=12000, ntest=2000, onehot=False)
 
-trX, trY = trX[:12000], trY[:12000]
-teX, teY = teX[:2000], teY[:2000]
+# figures are rendered headless in worker processes while training continues
+figures = plots.Sink()
 
 x = T.fmatrix('x')
-d = T.fmatrix('d')
+d = T.ivector('d') # class labels
 
 rng = np.random.RandomState(123)
 theano_rng = RandomStreams(rng.randint(2 ** 30))
@@ -46,6 +49,10 @@ corruption_level = 0.1
 training_epochs = 30
 learning_rate = 0.1
 batch_size = 128
+
+# batches are gathered and cast to floatX in a background thread while train runs
+batches = Prefetcher(Minibatches([trX], batch_size, shuffle=False), transform=cast(theano.config.floatX))
+batches_ffn = Prefetcher(Minibatches([trX, trY], batch_size, shuffle=False), transform=cast(theano.config.floatX))
 beta = 0.5
 rho = 0.05
 
@@ -78,89 +85,114 @@ print("lmao familicious fam")
 
 tilde_x = theano_rng.binomial(size=x.shape, n=1, p=1 - corruption_level,
                               dtype=theano.config.floatX)*x
-y1 = T.nnet.sigmoid(T.dot(tilde_x, W1) + b1)
-z1_1 = T.nnet.sigmoid(T.dot(y1, W1_prime) + b1_prime)
-cost1 = - T.mean(T.sum(x * T.log(z1_1) + (1 - x) * T.log(1 - z1_1), axis=1)) \
-				+ beta*T.shape(y1)[1]*(rho*T.log(rho) + (1-rho)*T.log(1-rho)) \
-				- beta*rho*T.sum(T.log(T.mean(y1, axis=0)+1e-6)) \
-				- beta*(1-rho)*T.sum(T.log(1-T.mean(y1, axis=0)+1e-6))
+y1_logits = T.dot(tilde_x, W1) + b1
+y1 = T.nnet.sigmoid(y1_logits)
+z1_1_logits = T.dot(y1, W1_prime) + b1_prime
+z1_1 = T.nnet.sigmoid(z1_1_logits)
+cost1 = T.mean(losses.sigmoid_cross_entropy(z1_1_logits, x)) + beta*losses.kl_sparsity(y1_logits, rho)
 
 y2 = T.nnet.sigmoid(T.dot(y1, W2) + b2)
 z2_2 = T.nnet.sigmoid(T.dot(y2, W2_prime) + b2_prime)
 z1_2 = T.nnet.sigmoid(T.dot(z2_2, W1_prime) + b1_prime)
-cost2 = - T.mean(T.sum(x * T.log(z1_2) + (1 - x) * T.log(1 - z1_2), axis=1)) \
-				+ beta*T.shape(y2)[1]*(rho*T.log(rho) + (1-rho)*T.log(1-rho)) \
-				- beta*rho*T.sum(T.log(T.mean(y2, axis=0)+1e-6)) \
-				- beta*(1-rho)*T.sum(T.log(1-T.mean(y2, axis=0)+1e-6))
 
 y3 = T.nnet.sigmoid(T.dot(y2, W3) + b3)
 z3_3 = T.nnet.sigmoid(T.dot(y3, W3_prime) + b3_prime)
 z2_3 = T.nnet.sigmoid(T.dot(z3_3, W2_prime) + b2_prime)
 z1_3 = T.nnet.sigmoid(T.dot(z2_3, W1_prime) + b1_prime)
-cost3 = - T.mean(T.sum(x * T.log(z1_3) + (1 - x) * T.log(1 - z1_3), axis=1)) \
-				+ beta*T.shape(y3)[1]*(rho*T.log(rho) + (1-rho)*T.log(1-rho)) \
-				- beta*rho*T.sum(T.log(T.mean(y3, axis=0)+1e-6)) \
-				- beta*(1-rho)*T.sum(T.log(1-T.mean(y3, axis=0)+1e-6))
+
+# layers 2 and 3 train on cached outputs of the frozen layers below,
+# corrupted at their own input; each reconstructs that input, the
+# features of the layer below, as in greedy stacked DAE pretraining
+f1 = T.fmatrix('f1')
+tilde_f1 = theano_rng.binomial(size=f1.shape, n=1, p=1 - corruption_level,
+                               dtype=theano.config.floatX)*f1
+y2_f_logits = T.dot(tilde_f1, W2) + b2
+y2_f = T.nnet.sigmoid(y2_f_logits)
+z2_f_logits = T.dot(y2_f, W2_prime) + b2_prime
+cost2 = T.mean(losses.sigmoid_cross_entropy(z2_f_logits, f1)) + beta*losses.kl_sparsity(y2_f_logits, rho)
+
+f2 = T.fmatrix('f2')
+tilde_f2 = theano_rng.binomial(size=f2.shape, n=1, p=1 - corruption_level,
+                               dtype=theano.config.floatX)*f2
+y3_f_logits = T.dot(tilde_f2, W3) + b3
+y3_f = T.nnet.sigmoid(y3_f_logits)
+z3_f_logits = T.dot(y3_f, W3_prime) + b3_prime
+cost3 = T.mean(losses.sigmoid_cross_entropy(z3_f_logits, f2)) + beta*losses.kl_sparsity(y3_f_logits, rho)
+
+train_mode = compiled.mode_for(training_epochs*len(batches))
 
 #first layer
 params1 = [W1, b1, b1_prime]
 updates1 = sgd_momentum(cost1, params1)
-train_da1 = theano.function(inputs=[x], outputs=cost1, updates=updates1, allow_input_downcast=True)
-test_da1 = theano.function(inputs=[x], outputs=[y1, z1_1], updates=None, allow_input_downcast=True)
+train_da1 = compiled.function(inputs=[x], outputs=cost1, updates=updates1, mode=train_mode, allow_input_downcast=True)
+test_da1 = compiled.function(inputs=[x], outputs=[y1, z1_1], updates=None, allow_input_downcast=True)
 
 #second layer
 params2 = [W2, b2, b2_prime]
 updates2 = sgd_momentum(cost2, params2)
-train_da2 = theano.function(inputs=[x], outputs=cost2, updates=updates2, allow_input_downcast=True)
-test_da2 = theano.function(inputs=[x], outputs=[y2, z1_2], updates=None, allow_input_downcast=True)
+train_da2 = compiled.function(inputs=[f1], outputs=cost2, updates=updates2, mode=train_mode, allow_input_downcast=True)
+test_da2 = compiled.function(inputs=[x], outputs=[y2, z1_2], updates=None, allow_input_downcast=True)
 
 #third layer
 params3 = [W3, b3, b3_prime]
 updates3 = sgd_momentum(cost3, params3)
-train_da3 = theano.function(inputs=[x], outputs=cost3, updates=updates3, allow_input_downcast=True)
-test_da3 = theano.function(inputs=[x], outputs=[y3, z1_3], updates=None, allow_input_downcast=True)
+train_da3 = compiled.function(inputs=[f2], outputs=cost3, updates=updates3, mode=train_mode, allow_input_downcast=True)
+test_da3 = compiled.function(inputs=[x], outputs=[y3, z1_3], updates=None, allow_input_downcast=True)
+
+#clean encoders of the frozen layers, run once to fill the feature stores
+encode1 = compiled.function(inputs=[x], outputs=T.nnet.sigmoid(T.dot(x, W1) + b1), allow_input_downcast=True)
+encode2 = compiled.function(inputs=[f1], outputs=T.nnet.sigmoid(T.dot(f1, W2) + b2), allow_input_downcast=True)
 
 #softmax layer
-p_y_ffn = T.nnet.softmax(T.dot(y3, W_ffn) + b_ffn)
-y_ffn = T.argmax(p_y_ffn, axis=1)
-cost_ffn = T.mean(T.nnet.categorical_crossentropy(p_y_ffn, d))
+logits_ffn = T.dot(y3, W_ffn) + b_ffn
+y_ffn = T.argmax(logits_ffn, axis=1)
+cost_ffn = T.mean(losses.softmax_cross_entropy(logits_ffn, d))
 params_ffn = [W1, b1, W2, b2, W3, b3, W_ffn, b_ffn]
 updates_ffn = sgd_momentum(cost_ffn, params_ffn)
-train_ffn = theano.function(inputs=[x, d], outputs=cost_ffn, updates=updates_ffn, allow_input_downcast=True)
-test_ffn = theano.function(inputs=[x], outputs=y_ffn, allow_input_downcast=True)
+train_ffn = compiled.function(inputs=[x, d], outputs=cost_ffn, updates=updates_ffn, mode=train_mode, allow_input_downcast=True)
+test_ffn = compiled.function(inputs=[x], outputs=y_ffn, allow_input_downcast=True)
+
+print("compile time: %.1fs" % compiled.compile_time)
+start_time = time.time()
 
 print('training dae1 ...')
 d1 = []
 for epoch in range(training_epochs):
     # go through trainng set
     c = []
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_da1(trX[start:end])
+    for (batchX,) in batches:
+        cost = train_da1(batchX)
         c.append(cost)
     d1.append(np.mean(c, dtype='float64'))
     print(d1[epoch])
 
 print('training dae2 ...')
+features1 = features.encode_to_store(encode1, trX, 'dae1')
+batches2 = Prefetcher(Minibatches([features1], batch_size, shuffle=False), transform=cast(theano.config.floatX))
 d2 = []
 for epoch in range(training_epochs):
     # go through trainng set
     c = []
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_da2(trX[start:end])
+    for (batchF,) in batches2:
+        cost = train_da2(batchF)
         c.append(cost)
     d2.append(np.mean(c, dtype='float64'))
     print(d2[epoch])
 
 print('training dae3 ...')
+features2 = features.encode_to_store(encode2, features1, 'dae2')
+features.release(features1)
+batches3 = Prefetcher(Minibatches([features2], batch_size, shuffle=False), transform=cast(theano.config.floatX))
 d3 = []
 for epoch in range(training_epochs):
     # go through trainng set
     c = []
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_da3(trX[start:end])
+    for (batchF,) in batches3:
+        cost = train_da3(batchF)
         c.append(cost)
     d3.append(np.mean(c, dtype='float64'))
     print(d3[epoch])
+features.release(features2)
 
 #softmax
 print('\ntraining ffn ...')
@@ -168,25 +200,22 @@ testAccuracy = []
 trainCost = []
 for epoch in range(training_epochs):
     # go through trainng set
-    for start, end in zip(range(0, len(trX), batch_size), range(batch_size, len(trX), batch_size)):
-        cost = train_ffn(trX[start:end], trY[start:end])
-    testAccuracy.append(np.mean(np.argmax(teY, axis=1) == test_ffn(teX)))
-    trainCost.append(cost/(len(trX) // batch_size))
+    for batchX, batchY in batches_ffn:
+        cost = train_ffn(batchX, batchY)
+    testAccuracy.append(np.mean(teY == test_ffn(teX)))
+    trainCost.append(cost/len(batches_ffn))
     print(testAccuracy[epoch])
 
+print("training time: %.1fs" % (time.time() - start_time))
+
+# encoder + softmax weights, for scoring without theano via inference.load_mlp
+inference.save('weights.npz', [param.get_value() for param in params_ffn])
+
 # test acc and cost curves
-pylab.figure()
-pylab.plot(range(training_epochs), testAccuracy)
-pylab.xlabel('iterations')
-pylab.ylabel('test accuracy')
-pylab.title('test accuracy')
-pylab.savefig('testAcc')
-
-pylab.figure()
-pylab.plot(range(training_epochs), trainCost)
-pylab.xlabel('iterations')
-pylab.ylabel('training cost')
-pylab.title('training cost')
-pylab.savefig('trainC')
-
-pylab.show()
+figures.plot('testAcc', [(range(training_epochs), testAccuracy, None)],
+             xlabel='iterations', ylabel='test accuracy', title='test accuracy')
+
+figures.plot('trainC', [(range(training_epochs), trainCost, None)],
+             xlabel='iterations', ylabel='training cost', title='training cost')
+
+figures.close()
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from nnutils.batches import Minibatches
+
+def epoch(batches):
+    # copies, a batch is only valid until the next one is drawn
+    return [[a.copy() for a in batch] for batch in batches]
+
+def test_keep_yields_a_short_tail():
+    X, Y = np.arange(10).reshape(10, 1), np.arange(10)
+    batches = Minibatches([X, Y], 4, tail='keep')
+    drawn = epoch(batches)
+    assert len(batches) == len(drawn) == 3
+    assert [len(y) for x, y in drawn] == [4, 4, 2]
+    assert sorted(np.concatenate([y for x, y in drawn])) == list(range(10))
+    for x, y in drawn:
+        assert list(x[:, 0]) == list(y)
+
+def test_drop_skips_the_tail():
+    batches = Minibatches([np.arange(10)], 4, tail='drop')
+    drawn = epoch(batches)
+    assert len(batches) == len(drawn) == 2
+    assert all(len(b) == 4 for b, in drawn)
+    assert len(set(np.concatenate([b for b, in drawn]))) == 8
+
+def test_pad_fills_the_tail_from_the_start_of_the_permutation():
+    batches = Minibatches([np.arange(10)], 4, tail='pad', shuffle=False)
+    drawn = epoch(batches)
+    assert len(batches) == len(drawn) == 3
+    assert list(drawn[-1][0]) == [8, 9, 0, 1]
+
+def test_every_epoch_is_a_new_permutation_of_all_rows():
+    np.random.seed(0)
+    batches = Minibatches([np.arange(20)], 8)
+    first = np.concatenate([b for b, in epoch(batches)])
+    second = np.concatenate([b for b, in epoch(batches)])
+    assert sorted(first) == sorted(second) == list(range(20))
+    assert list(first) != list(second)
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        Minibatches([np.arange(4)], 2, tail='wrap')
+    with pytest.raises(ValueError):
+        Minibatches([np.arange(4), np.arange(5)], 2)
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+
+from nnutils import cache
+
+def test_cached_recomputes_when_the_source_changes(tmp_path):
+    src = tmp_path / 'data.txt'
+    src.write_text('1 2\n3 4\n')
+    store = str(tmp_path / 'cache')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.loadtxt(str(src))
+
+    first = cache.cached(str(src), 'raw', compute, store)
+    again = cache.cached(str(src), 'raw', compute, store)
+    assert len(calls) == 1
+    assert np.array_equal(first, again)
+
+    # same size, only the modification time moves
+    st = os.stat(str(src))
+    os.utime(str(src), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    cache.cached(str(src), 'raw', compute, store)
+    assert len(calls) == 2
+
+    # the entry of the old version is gone, the current one is kept
+    entries = sorted(os.listdir(store))
+    assert entries == [os.path.basename(cache.cache_file(str(src), 'raw', store))]
+
+def test_entries_of_other_names_are_kept(tmp_path):
+    src = tmp_path / 'data.txt'
+    src.write_text('1 2\n')
+    store = str(tmp_path / 'cache')
+    cache.cached(str(src), 'raw', lambda: np.zeros(2), store)
+    cache.cached(str(src), 'scaled', lambda: np.ones(2), store)
+    assert len(os.listdir(store)) == 2
+    assert np.array_equal(cache.cached(str(src), 'raw', lambda: np.ones(2), store), np.zeros(2))
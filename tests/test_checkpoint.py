@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from nnutils import checkpoint
+
+# stands in for a theano shared variable
+class Shared(object):
+
+    def __init__(self, value):
+        self.value = np.array(value)
+        self.dtype = self.value.dtype
+
+    def get_value(self):
+        return self.value.copy()
+
+    def set_value(self, value):
+        self.value = np.array(value)
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'ckpt')
+    params = [Shared(np.arange(6, dtype=np.float32).reshape(2, 3)), Shared(np.ones(3, dtype=np.float32))]
+    slots = [Shared(np.full(3, .5))]
+    np.random.seed(3)
+    checkpoint.save(path, params, slots, epoch=7, history={'valid': [.5, .25]}, meta={'lr': .1})
+    expected = np.random.rand(4)
+    assert checkpoint.exists(path)
+
+    ckpt = checkpoint.load(path)
+    assert (ckpt.epoch, ckpt.history, ckpt.meta) == (7, {'valid': [.5, .25]}, {'lr': .1})
+    live = [Shared(np.zeros((2, 3), dtype=np.float32)), Shared(np.zeros(3, dtype=np.float32))]
+    live_slots = [Shared(np.zeros(3))]
+    np.random.seed(99)
+    ckpt.restore(live, live_slots)
+    for p, q in zip(live + live_slots, params + slots):
+        assert p.value.dtype == q.dtype
+        assert np.array_equal(p.value, q.value)
+    # the numpy RNG continues where it was when saved
+    assert np.array_equal(np.random.rand(4), expected)
+
+    with pytest.raises(ValueError):
+        ckpt.restore(live[:1], live_slots)
+
+def test_overwrite_leaves_no_temporaries(tmp_path):
+    path = str(tmp_path / 'ckpt')
+    checkpoint.save(path, [Shared(np.zeros(2))], epoch=1)
+    checkpoint.save(path, [Shared(np.ones(2))], epoch=2)
+    assert os.listdir(str(tmp_path)) == ['ckpt']
+    ckpt = checkpoint.load(path)
+    assert ckpt.epoch == 2
+    assert np.array_equal(ckpt.params[0], np.ones(2))
+
+def test_failed_write_keeps_the_previous_checkpoint(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ckpt')
+    checkpoint.save(path, [Shared(np.zeros(2))], epoch=1)
+
+    def fail(*args):
+        raise IOError('disk full')
+    monkeypatch.setattr(checkpoint.np, 'save', fail)
+    with pytest.raises(IOError):
+        checkpoint.save(path, [Shared(np.ones(2))], epoch=2)
+    monkeypatch.undo()
+
+    ckpt = checkpoint.load(path)
+    assert ckpt.epoch == 1
+    assert np.array_equal(ckpt.params[0], np.zeros(2))
+
+def test_writer_saves_in_the_background(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ckpt')
+    p = Shared(np.zeros(2))
+    writer = checkpoint.Writer()
+    writer.save(path, [p], epoch=1)
+    # the snapshot is taken before save returns
+    p.set_value(np.ones(2))
+    writer.save(path, [p], epoch=2)
+    writer.wait()
+    assert checkpoint.load(path).epoch == 2
+
+    def fail(*args):
+        raise IOError('disk full')
+    monkeypatch.setattr(checkpoint.np, 'save', fail)
+    writer.save(path, [p], epoch=3)
+    with pytest.raises(IOError):
+        writer.close()
+    monkeypatch.undo()
+    assert checkpoint.load(path).epoch == 2
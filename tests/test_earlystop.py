@@ -0,0 +1,36 @@
+import numpy as np
+
+from nnutils import earlystop
+
+# stands in for a theano shared variable
+class Shared(object):
+
+    def __init__(self, value):
+        self.value = np.array(value, dtype=float)
+
+    def get_value(self):
+        return self.value.copy()
+
+    def set_value(self, value):
+        self.value = np.array(value)
+
+def test_stacked_models_stop_on_their_own():
+    # model 0 stops improving after epoch 2, model 1 after epoch 1, model 2 keeps improving
+    costs = np.array([[3, 2, 1, 1, 1, 1], [3, 2, 2.5, 2.6, 0, 0], [5, 4, 3, 2, 1, 0]]).T
+    w = Shared(np.zeros((3, 2)))
+    stopper = earlystop.StackedEarlyStopping([w], 3, patience=2)
+    for epoch, cost in enumerate(costs):
+        w.value += 1
+        done = stopper.step(epoch, cost)
+    assert not done
+    assert list(stopper.stopped) == [True, True, False]
+    assert list(stopper.stop_epoch) == [5, 4, 6]
+    assert list(stopper.best) == [1, 2, 0]
+    stopper.restore()
+    # weights of the best epoch of each model
+    assert list(w.get_value()[:, 0]) == [3, 2, 6]
+
+def test_holdout_splits_all_rows():
+    train, valid = earlystop.holdout(100, 0.2)
+    assert len(valid) == 20
+    assert sorted(np.concatenate([train, valid])) == list(range(100))
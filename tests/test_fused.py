@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('theano')
+
+from nnutils import fused
+
+@pytest.mark.parametrize('n, batch_size', [(10, 3), (9, 3), (3, 3), (2, 3), (0, 4)])
+def test_batch_rows_matches_the_script_loops(n, batch_size):
+    perm = np.random.RandomState(n).permutation(n)
+    rows = fused.batch_rows(perm, batch_size)
+    expected = [perm[start:end] for start, end in zip(range(0, n, batch_size), range(batch_size, n, batch_size))]
+    assert rows.dtype == np.int32
+    assert rows.shape == (len(expected), batch_size)
+    for row, batch in zip(rows, expected):
+        assert list(row) == list(batch)
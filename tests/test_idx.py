@@ -0,0 +1,53 @@
+import struct
+
+import numpy as np
+import pytest
+
+from nnutils import idx
+
+def write_idx(path, a, code, magic=None):
+    header = magic if magic is not None else bytes([0, 0, code, a.ndim])
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(struct.pack('>%dI' % a.ndim, *a.shape))
+        f.write(a.tobytes())
+    return str(path)
+
+def test_load_idx_reads_header_and_payload(tmp_path):
+    a = np.arange(2*3*4, dtype=np.uint8).reshape(2, 3, 4)
+    path = write_idx(tmp_path / 'images.idx3', a, 0x08)
+    dtype, shape, offset = idx.read_header(path)
+    assert (dtype, shape, offset) == (np.dtype(np.uint8), (2, 3, 4), 16)
+    assert np.array_equal(idx.load_idx(path), a)
+    flat = idx.load_idx(path, n=1, dtype=np.float32, scale=2., flatten=True)
+    assert flat.dtype == np.float32
+    assert np.array_equal(flat, a[:1].reshape(1, -1) / 2.)
+
+def test_big_endian_payload_comes_back_in_native_order(tmp_path):
+    a = np.array([1, -2, 70000], dtype='>i4')
+    path = write_idx(tmp_path / 'labels.idx1', a, 0x0C)
+    out = idx.load_idx(path)
+    assert out.dtype.isnative
+    assert list(out) == [1, -2, 70000]
+
+@pytest.mark.parametrize('magic', [b'\x01\x00\x08\x01', b'\x00\x00\x07\x01', b'\x00\x00'])
+def test_bad_magic_is_rejected(tmp_path, magic):
+    path = write_idx(tmp_path / 'bad', np.zeros(3, dtype=np.uint8), 0x08, magic=magic)
+    with pytest.raises(ValueError, match='magic'):
+        idx.read_header(path)
+
+def test_truncated_header_and_payload_are_rejected(tmp_path):
+    path = tmp_path / 'header'
+    path.write_bytes(bytes([0, 0, 0x08, 3]) + struct.pack('>I', 5))
+    with pytest.raises(ValueError, match='truncated'):
+        idx.read_header(str(path))
+    path = write_idx(tmp_path / 'payload', np.zeros((4, 2), dtype=np.uint8), 0x08)
+    with open(path, 'r+b') as f:
+        f.truncate(16 - 1)
+    with pytest.raises(ValueError, match='shorter'):
+        idx.read_header(path)
+
+def test_more_rows_than_the_file_has(tmp_path):
+    path = write_idx(tmp_path / 'rows', np.zeros((3, 2), dtype=np.uint8), 0x08)
+    with pytest.raises(ValueError, match='asked for 4 rows'):
+        idx.load_idx(path, n=4)
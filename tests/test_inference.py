@@ -0,0 +1,74 @@
+import numpy as np
+
+from nnutils import inference
+
+def sigmoid(a):
+    return 1. / (1. + np.exp(-a))
+
+def softmax(a):
+    e = np.exp(a - a.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+# theano's conv2d in 'valid' mode: a true convolution, the filters flipped
+def conv2d(x, W):
+    k, c, h, w = x.shape
+    F, C, kh, kw = W.shape
+    out = np.zeros((k, F, h - kh + 1, w - kw + 1))
+    flipped = W[:, :, ::-1, ::-1]
+    for i in range(h - kh + 1):
+        for j in range(w - kw + 1):
+            out[:, :, i, j] = np.tensordot(x[:, :, i:i+kh, j:j+kw], flipped, axes=([1, 2, 3], [1, 2, 3]))
+    return out
+
+# pool_2d with ignore_border=True drops the rows and columns a window does not fill
+def max_pool(x, ph, pw):
+    k, c, h, w = x.shape
+    out = np.zeros((k, c, h // ph, w // pw))
+    for i in range(h // ph):
+        for j in range(w // pw):
+            out[:, :, i, j] = x[:, :, i*ph:(i+1)*ph, j*pw:(j+1)*pw].max(axis=(2, 3))
+    return out
+
+# model() of project_2/src/part_a on NCHW images
+def reference_convnet(X, convs, weights, biases):
+    h = X
+    for W, b in convs:
+        h = max_pool(np.maximum(conv2d(h, W) + b[None, :, None, None], 0), 2, 2)
+    h = h.reshape(len(h), -1)
+    for i, (W, b) in enumerate(zip(weights, biases)):
+        h = np.dot(h, W) + b
+        h = softmax(h) if i == len(weights) - 1 else sigmoid(h)
+    return h
+
+def test_convnet_matches_theano_layout():
+    rng = np.random.RandomState(0)
+    # odd map sizes, so both pools drop a border: 11 -> 9 -> 4 and 4 -> 3 -> 1
+    convs = [(rng.randn(4, 2, 3, 3), rng.randn(4)), (rng.randn(5, 4, 2, 2), rng.randn(5))]
+    weights = [rng.randn(5, 6), rng.randn(6, 3)]
+    biases = [rng.randn(6), rng.randn(3)]
+    X = rng.rand(7, 2, 11, 11)
+    net = inference.ConvNet(convs, weights, biases, image_shape=(2, 11, 11), dtype=np.float64)
+    expected = reference_convnet(X, convs, weights, biases)
+    assert np.allclose(net.predict_proba(X, chunk=3), expected)
+    assert list(net.predict(X.reshape(7, -1))) == list(np.argmax(expected, axis=1))
+
+def test_convnet_flattens_channels_first():
+    # several channels in a 2x2 map, so a wrong order of the first dense layer shows up
+    rng = np.random.RandomState(1)
+    convs = [(rng.randn(3, 1, 3, 3), rng.randn(3))]
+    weights = [rng.randn(3*2*2, 4)]
+    biases = [rng.randn(4)]
+    X = rng.rand(5, 1, 6, 6)
+    net = inference.ConvNet(convs, weights, biases, image_shape=(1, 6, 6), dtype=np.float64)
+    assert np.allclose(net.predict_proba(X), reference_convnet(X, convs, weights, biases))
+
+def test_mlp_round_trip(tmp_path):
+    rng = np.random.RandomState(2)
+    arrays = [rng.randn(36, 10), rng.randn(10), rng.randn(10, 6), rng.randn(6)]
+    path = str(tmp_path / 'weights.npz')
+    inference.save(path, arrays)
+    net = inference.load_mlp(path, dtype=np.float64)
+    X = rng.rand(50, 36)
+    expected = softmax(np.dot(sigmoid(np.dot(X, arrays[0]) + arrays[1]), arrays[2]) + arrays[3])
+    assert np.allclose(net.predict_proba(X, chunk=16), expected)
+    assert list(net.predict(X, chunk=16)) == list(np.argmax(expected, axis=1))
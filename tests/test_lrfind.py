@@ -0,0 +1,56 @@
+import numpy as np
+
+from nnutils import lrfind
+
+# stands in for a theano shared variable
+class Shared(object):
+
+    def __init__(self, value):
+        self.value = np.asarray(value, dtype='float32')
+        self.dtype = self.value.dtype
+
+    def get_value(self):
+        return self.value.copy()
+
+    def set_value(self, value):
+        self.value = np.asarray(value, dtype=self.dtype)
+
+# loss falls from 2 to 1 as lr goes from 1e-3 to 1e-1, then blows up to bad
+def trainer(lr, bad):
+    def train():
+        rate = float(lr.get_value())
+        if rate > 0.1:
+            return bad
+        return 2 - 0.5*np.clip(np.log10(rate) + 3, 0, 2)
+    return train
+
+def run(bad):
+    lr, w = Shared(0.01), Shared(np.ones(3))
+    test = lrfind.range_test(trainer(lr, bad), lr, [()], [w], lo=1e-5, hi=1., steps=100)
+    assert float(lr.get_value()) == np.float32(0.01)
+    assert np.all(w.get_value() == 1)
+    return test
+
+def check(test, capsys):
+    assert test.diverged
+    assert np.all(np.isfinite(test.smoothed))
+    assert test.lrs[-1] <= 0.1
+    assert np.min(test.smoothed) > 0.9
+    lr, (low, high) = test.suggest()
+    assert 1e-3 <= lr <= 0.1
+    assert low <= high <= 0.1
+    test.report()
+    assert 'nan' not in capsys.readouterr().out
+
+def test_stops_before_nan_loss(capsys):
+    check(run(np.nan), capsys)
+
+def test_stops_before_finite_blow_up(capsys):
+    check(run(1e3), capsys)
+
+def test_suggest_skips_non_finite_points():
+    lrs = np.logspace(-5, 0, 20)
+    smoothed = np.linspace(2, 1, 20)
+    smoothed[-1] = np.nan
+    lr, (low, high) = lrfind.RangeTest(lrs, smoothed, smoothed, True).suggest()
+    assert np.isfinite(lr) and lr < lrs[-1]
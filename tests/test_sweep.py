@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from nnutils import crossval, sweep
+
+calls = []
+
+def scale(a):
+    return a * crossval.data[0].sum()
+
+def job(lr, fold):
+    calls.append((lr, fold))
+    return scale(np.array([lr, fold])), np.float64(lr)
+
+def stacked_job(seeds, fold):
+    calls.append((tuple(seeds), fold))
+    return np.array([[s, fold] for s in seeds]), np.array(seeds) * 10
+
+def test_store_round_trip(tmp_path):
+    store = sweep.Store(str(tmp_path / 'store'))
+    assert not store.done('a')
+    store.put('a', {'config': 1}, np.arange(3))
+    store.put('b', {'config': 2}, (np.ones(2), 5))
+    assert store.done('a') and store.done('b')
+    a, = store.get('a')
+    assert np.array_equal(a, np.arange(3))
+    ones, five = store.get('b')
+    assert np.array_equal(ones, np.ones(2)) and five == 5
+    # the .npz is the marker, no temporaries are left
+    assert sorted((tmp_path / 'store').iterdir()) == sorted(
+        tmp_path / 'store' / n for n in ['a.json', 'a.npz', 'b.json', 'b.npz'])
+
+def test_grid_order():
+    assert sweep.grid(a=[1, 2], b='xy') == [{'a': 1, 'b': 'x'}, {'a': 1, 'b': 'y'},
+                                            {'a': 2, 'b': 'x'}, {'a': 2, 'b': 'y'}]
+
+def test_run_only_trains_what_is_not_stored(tmp_path):
+    store = sweep.Store(str(tmp_path / 'store'))
+    arrays = [np.full(4, .5)]
+    del calls[:]
+    first = sweep.run(job, sweep.grid(lr=[.1], fold=[0, 1]), arrays, store, processes=1)
+    assert calls == [(.1, 0), (.1, 1)]
+    assert np.allclose(first[1][0], [.2, 2.]) and first[1][1] == .1
+
+    results = sweep.run(job, sweep.grid(lr=[.1, .2], fold=[0, 1]), arrays, store, processes=1)
+    assert calls[2:] == [(.2, 0), (.2, 1)]
+    assert len(results) == 4
+    assert np.array_equal(results[1][0], first[1][0])
+
+    # other settings, data or code make new keys
+    sweep.run(job, [{'lr': .1, 'fold': 0}], arrays, store, settings={'hidden': 10}, processes=1)
+    sweep.run(job, [{'lr': .1, 'fold': 0}], [np.ones(4)], store, processes=1)
+    sweep.run(job, [{'lr': .1, 'fold': 0}], arrays, store, code='edited', processes=1)
+    assert len(calls) == 7
+
+def test_code_version_follows_callees():
+    assert sweep.code_version(job) == sweep.code_version(job)
+    assert sweep.code_version(job) != sweep.code_version(stacked_job)
+    assert scale in sweep._callees(job)
+
+def test_stacked_results_are_stored_per_config(tmp_path):
+    store = sweep.Store(str(tmp_path / 'store'))
+    arrays = [np.zeros(1)]
+    del calls[:]
+    results = sweep.run(stacked_job, sweep.grid(fold=[0, 1], seed=[1, 2]), arrays, store,
+                        processes=1, stack=('seed', 'seeds'))
+    assert sorted(calls) == [((1, 2), 0), ((1, 2), 1)]
+    assert [list(r[0]) for r in results] == [[1, 0], [2, 0], [1, 1], [2, 1]]
+    assert [int(r[1]) for r in results] == [10, 20, 10, 20]
+
+    # a new seed is trained on its own
+    results = sweep.run(stacked_job, sweep.grid(fold=[0], seed=[1, 2, 3]), arrays, store,
+                        processes=1, stack=('seed', 'seeds'))
+    assert calls[2:] == [((3,), 0)]
+    assert [int(r[1]) for r in results] == [10, 20, 30]
+
+def test_successive_halving_budgets():
+    quality = np.array([.5, .1, .4, .2, .3, .6, .05, .7])
+    rounds = []
+
+    # a candidate's cost falls with the epochs it has had
+    def advance(alive, epochs):
+        rounds.append((list(alive), epochs))
+        return quality[alive] / epochs
+
+    costs, budgets = sweep.successive_halving(8, advance, [1, 2, 4])
+    assert rounds == [(list(range(8)), 1), ([6, 1, 3, 4], 2), ([6, 1], 4)]
+    assert list(budgets) == [1, 4, 1, 2, 2, 1, 4, 1]
+    assert np.allclose(costs, quality / budgets)
+    assert np.argmin(costs) == 6
+
+def test_successive_halving_eta_and_ties():
+    costs, budgets = sweep.successive_halving(9, lambda alive, epochs: np.zeros(len(alive)), [1, 3, 9], eta=3)
+    # equal costs keep the lower indices
+    assert list(budgets) == [9, 3, 3, 1, 1, 1, 1, 1, 1]
+    costs, budgets = sweep.successive_halving(3, lambda alive, epochs: np.ones(len(alive)), [1, 2, 4], eta=4)
+    assert list(budgets) == [4, 1, 1]
+
+def test_successive_halving_rejects_bad_rungs():
+    for rungs in ([], [2, 1], [1, 1, 2]):
+        with pytest.raises(ValueError):
+            sweep.successive_halving(4, lambda alive, epochs: np.zeros(len(alive)), rungs)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from nnutils import warmstart
+
+def sigmoid(a):
+    return 1. / (1. + np.exp(-a))
+
+@pytest.mark.parametrize('outputs', [None, 3])
+def test_widen_without_noise_keeps_the_function(outputs):
+    rng = np.random.RandomState(0)
+    w_in, b_in = rng.randn(5, 4), rng.randn(4)
+    w_out = rng.randn(4) if outputs is None else rng.randn(4, outputs)
+    X = rng.randn(10, 5)
+    new_in, new_b, new_out = warmstart.widen(w_in, b_in, w_out, 9, rng=rng, noise=0)
+    assert new_in.shape == (5, 9) and new_b.shape == (9,) and new_out.shape[0] == 9
+    assert np.allclose(np.dot(sigmoid(np.dot(X, new_in) + new_b), new_out),
+                       np.dot(sigmoid(np.dot(X, w_in) + b_in), w_out))
+    # the original units come first and keep their incoming weights
+    assert np.array_equal(new_in[:, :4], w_in)
+
+def test_widen_noise_only_touches_the_copies():
+    rng = np.random.RandomState(1)
+    w_in = rng.randn(5, 4).astype(np.float32)
+    new_in, new_b, new_out = warmstart.widen(w_in, np.zeros(4, np.float32), np.ones(4, np.float32), 6, rng=rng)
+    assert new_in.dtype == np.float32
+    assert np.array_equal(new_in[:, :4], w_in)
+    assert np.isclose(new_out.sum(), 4)
+
+def test_widen_cannot_shrink():
+    with pytest.raises(ValueError):
+        warmstart.widen(np.zeros((5, 4)), np.zeros(4), np.zeros(4), 3)
+
+def test_provenance_round_trip():
+    records = [warmstart.provenance('cold'), warmstart.provenance('widened', source='h25', width=50)]
+    assert warmstart.decode(warmstart.encode(records)) == records
+    with pytest.raises(ValueError):
+        warmstart.provenance('hot')